@@ -0,0 +1,74 @@
+"""
+Recall versus latency of the IVF index against brute-force cosine similarity.
+
+Usage: python -m benchmarks.bench_ann --size 100000 --queries 50
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from news_data_extractor.source.ann_index import IVFIndex
+
+DIMENSION = 96  # en_core_web_sm token vectors
+
+
+def cosine_similarity(vector_a, vector_b):
+    # Same formula as NewsDataExtractor.nlp_cosine_similarity, copied so spaCy isn't needed here.
+    return np.dot(vector_a, vector_b) / (np.linalg.norm(vector_a) * np.linalg.norm(vector_b))
+
+
+def clustered_embeddings(generator, size, topics=200):
+    # Articles cluster around topics, like real news embeddings do.
+    centers = generator.standard_normal((topics, DIMENSION)).astype(np.float32)
+    labels = generator.integers(0, topics, size=size)
+    return centers[labels] + 0.6 * generator.standard_normal((size, DIMENSION)).astype(np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--lists', type=int, default=256)
+    args = parser.parse_args()
+
+    generator = np.random.default_rng(7)
+    embeddings = clustered_embeddings(generator, args.size)
+    queries = clustered_embeddings(generator, args.queries)
+    ids = [f"https://example.com/article/{number}" for number in range(args.size)]
+
+    index = IVFIndex(n_lists=args.lists)
+    started_at = time.perf_counter()
+    for start in range(0, args.size, 10000):
+        index.add(ids[start:start + 10000], embeddings[start:start + 10000])
+    print(f"incremental insert of {args.size} vectors: {time.perf_counter() - started_at:.2f}s")
+
+    with tempfile.TemporaryDirectory() as folder:
+        started_at = time.perf_counter()
+        index.save(Path(folder) / 'ann_index.npz')
+        index = IVFIndex.load(Path(folder) / 'ann_index.npz')
+        print(f"save + load: {time.perf_counter() - started_at:.2f}s")
+
+    started_at = time.perf_counter()
+    [cosine_similarity(queries[0], embedding) for embedding in embeddings]
+    print(f"per-row nlp_cosine_similarity, 1 query: {(time.perf_counter() - started_at) * 1000:.1f}ms")
+
+    started_at = time.perf_counter()
+    exact = index.exact_search(queries, k=args.k)
+    exact_time = (time.perf_counter() - started_at) / args.queries
+    print(f"exact matrix search: {exact_time * 1000:.2f}ms/query")
+
+    for n_probe in [1, 2, 4, 8, 16, 32]:
+        started_at = time.perf_counter()
+        approximate = index.search(queries, k=args.k, n_probe=n_probe)
+        elapsed = (time.perf_counter() - started_at) / args.queries
+        recall = np.mean([len({article for article, _ in found} & {article for article, _ in expected}) / args.k
+                          for found, expected in zip(approximate, exact)])
+        print(f"n_probe={n_probe:>2} recall@{args.k}={recall:.3f} latency={elapsed * 1000:.2f}ms/query")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Size and speed of the step 1 -> step 2 hand-off, JSON payload against the Parquet artifact.
+
+Usage: python -m benchmarks.bench_artifacts --rows 5000
+"""
+import argparse
+import json
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from news_data_extractor.source.artifacts import read_rows_artifact, write_rows_artifact
+from news_data_extractor.source.extraction_plan import ExtractionPlan
+from news_data_extractor.source.main import NewsDataExtractor
+
+FIXTURES_FOLDER = Path(__file__).resolve().parent / 'fixtures'
+
+
+def fixture_rows(count):
+    sources = NewsDataExtractor._get_sources(only_active=True)
+    rows = []
+    for source, config in sources.items():
+        article_path = FIXTURES_FOLDER / source / 'article.html'
+        if article_path.exists():
+            row = ExtractionPlan(source, config).parse_article('url', article_path.read_bytes())
+            if row is not None:
+                rows.append(row)
+    return [dict(rows[number % len(rows)], url=f"https://example.com/story-{number}") for number in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=5000)
+    args = parser.parse_args()
+    rows = fixture_rows(args.rows)
+
+    folder = Path(tempfile.mkdtemp())
+    try:
+        started_at = time.perf_counter()
+        (folder / 'step_1_content.json').write_text(json.dumps({'result_step_1': rows}), encoding='utf-8')
+        json_write = time.perf_counter() - started_at
+        started_at = time.perf_counter()
+        json_rows = json.loads((folder / 'step_1_content.json').read_text(encoding='utf-8'))['result_step_1']
+        json_read = time.perf_counter() - started_at
+
+        started_at = time.perf_counter()
+        reference = write_rows_artifact(rows, folder / 'step_1_rows.parquet')
+        parquet_write = time.perf_counter() - started_at
+        started_at = time.perf_counter()
+        parquet_rows = read_rows_artifact(reference)
+        parquet_read = time.perf_counter() - started_at
+        assert parquet_rows == json_rows
+
+        print(f"rows: {len(rows)}")
+        print(f"json    | payload {(folder / 'step_1_content.json').stat().st_size / 1e6:7.2f} MB | "
+              f"write {json_write:.3f}s | read {json_read:.3f}s")
+        print(f"parquet | payload {len(json.dumps(reference)) / 1e6:7.4f} MB + file "
+              f"{(folder / 'step_1_rows.parquet').stat().st_size / 1e6:.2f} MB | "
+              f"write {parquet_write:.3f}s | read {parquet_read:.3f}s")
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    main()
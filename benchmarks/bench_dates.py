@@ -0,0 +1,100 @@
+"""
+Speed of the date parsing of step 2, the former per-row parse_date against DateParser.parse_column.
+
+results.json keeps the dates already parsed, so they are written back in the shape every source scrapes them
+(apnews "August 17, 2024", gothamist "Published Jul 18, 2024Modified Jul 19, 2024", yahoo
+"Sat, August 17, 2024 at 6:23 PM·3 min read") before being parsed again.
+
+Usage: python -m benchmarks.bench_dates --rows 20000
+"""
+import argparse
+import datetime
+import re
+import time
+from pathlib import Path
+
+from news_data_extractor.source.date_parser import DateParser
+
+RESULTS_FILE = Path(__file__).resolve().parent.parent / 'results.json'
+
+SOURCE_SHAPES = {
+    'apnews': lambda date: date.strftime('%B %d, %Y').replace(' 0', ' '),
+    'gothamist': lambda date: (f"Published {date.strftime('%b %d, %Y')}"
+                               f"Modified {(date + datetime.timedelta(days=1)).strftime('%b %d, %Y')}"),
+    'yahoo': lambda date: f"{date.strftime('%a, %B %d, %Y at %I:%M %p').replace(' 0', ' ')}·3 min read",
+}
+
+
+def results_dates():
+    text = RESULTS_FILE.read_text(encoding='utf-8')
+    return [datetime.datetime(*(int(part) for part in match.split(',')))
+            for match in re.findall(r"datetime\.datetime\(([0-9, ]+)\)", text)]
+
+
+def reference_parse(date_value):
+    """Date handling of normalize_all_data before DateParser, kept here to check the results."""
+    def parse_date(date_str):
+        try:
+            if date_str.isdigit():
+                return datetime.datetime.fromtimestamp(int(date_str) / 1000)
+            formats = ["%B %d, %Y at %I:%M %p", "%Y-%m-%d", "%A, %B %d, %Y, %I:%M %p", "%b %d, %Y", "%B %d, %Y",
+                       "%b %d, %YModified %b %d, %Y"]
+            for fmt in formats:
+                try:
+                    return datetime.datetime.strptime(date_str, fmt)
+                except ValueError:
+                    continue
+            if "Published" in date_str or "Modified" in date_str:
+                return parse_date(re.sub(r"(Published|Modified)\s*", "", date_str))
+        except:
+            return None
+
+    if '·' in str(date_value):
+        date_value = str(date_value).split('·')[0].strip()
+    elif 'Published' in str(date_value):
+        date_value = str(date_value).split('Published')[1].strip()
+        if 'Modified' in str(date_value):
+            date_value = str(date_value).split('Modified')[0].strip()
+    for value_to_remove in ['SAT,', 'MON,', 'WED,', 'THU,', 'FRI', 'TUE,', 'SUN,']:
+        if value_to_remove in str(date_value).upper():
+            date_value = str(date_value).split(f"{str(date_value).split(',')[0]},")[1].strip()
+    return parse_date(str(date_value))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=20000)
+    args = parser.parse_args()
+
+    dates = results_dates()
+    sources = list(SOURCE_SHAPES.keys())
+    rows = []
+    for number in range(args.rows):
+        source = sources[number % len(sources)]
+        date = dates[number % len(dates)] + datetime.timedelta(days=number % 90)
+        rows.append((source, SOURCE_SHAPES[source](date)))
+
+    started_at = time.perf_counter()
+    expected = [reference_parse(value) for _, value in rows]
+    reference_time = time.perf_counter() - started_at
+
+    date_parser = DateParser()
+    started_at = time.perf_counter()
+    parsed = date_parser.parse_column([value for _, value in rows], [source for source, _ in rows])
+    parser_time = time.perf_counter() - started_at
+    assert parsed == expected
+
+    started_at = time.perf_counter()
+    date_parser.parse_column([value for _, value in rows], [source for source, _ in rows])
+    warm_time = time.perf_counter() - started_at
+
+    print(f"rows: {len(rows)} from {len(dates)} dates in {RESULTS_FILE.name}")
+    print(f"per-row parse_date      | {len(rows) / reference_time:9.0f} dates/s")
+    print(f"DateParser.parse_column | {len(rows) / parser_time:9.0f} dates/s | {reference_time / parser_time:.1f}x")
+    print(f"  second run, learned   | {len(rows) / warm_time:9.0f} dates/s | {reference_time / warm_time:.1f}x")
+    for source, source_stats in sorted(date_parser.stats().items()):
+        print(f"  {source:<10} {source_stats}")
+
+
+if __name__ == '__main__':
+    main()
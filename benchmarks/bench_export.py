@@ -0,0 +1,66 @@
+"""
+Time and peak memory of the final export, DataFrame.to_excel against the streaming exporters.
+
+Usage: python -m benchmarks.bench_export --rows 20000 --formats xlsx,jsonl,parquet,csv
+"""
+import argparse
+import datetime
+import shutil
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import pandas as pd
+
+from benchmarks.bench_artifacts import fixture_rows
+from news_data_extractor.source.exporters import export_dataframe, output_formats
+
+
+def result_frame(count):
+    rows = fixture_rows(count)
+    for number, row in enumerate(rows):
+        row.update({'date': datetime.datetime(2024, 8, 1) - datetime.timedelta(hours=number),
+                    'contains_monetary': number % 3 == 0, 'monetary_amount': float(number) if number % 3 == 0 else None,
+                    'picture_path': None})
+    return pd.DataFrame(rows)
+
+
+def measure(function):
+    """Seconds of one call, then peak traced memory of a second call."""
+    started_at = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - started_at
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--formats', default='xlsx,jsonl,parquet,csv')
+    args = parser.parse_args()
+    df = result_frame(args.rows)
+    df['date'] = df['date'].astype(str)
+
+    folder = Path(tempfile.mkdtemp())
+    try:
+        print(f"rows: {len(df)}")
+        elapsed, peak = measure(lambda: df.to_excel(folder / 'to_excel.xlsx'))
+        print(f"to_excel      | {elapsed:7.3f}s | peak {peak / 1e6:8.1f} MB | "
+              f"{(folder / 'to_excel.xlsx').stat().st_size / 1e6:.2f} MB")
+        for output_format in output_formats(args.formats):
+            elapsed, peak = measure(lambda: export_dataframe(df, folder, 'results', [output_format]))
+            print(f"{output_format:<13} | {elapsed:7.3f}s | peak {peak / 1e6:8.1f} MB | "
+                  f"{(folder / f'results.{output_format}').stat().st_size / 1e6:.2f} MB")
+        elapsed, peak = measure(lambda: export_dataframe(df, folder, 'results', output_formats(args.formats)))
+        print(f"{'one pass':<13} | {elapsed:7.3f}s | peak {peak / 1e6:8.1f} MB | {args.formats}")
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Wall-clock comparison between sequential and concurrent page downloads against the local stand-in.
+
+Usage: python -m benchmarks.bench_fetch --articles 40 --latency 0.2
+"""
+import argparse
+import time
+
+from benchmarks.local_server import LocalNewsServer
+from news_data_extractor.source.fetcher import FetchEngine
+from news_data_extractor.source.http_client import HttpClient
+
+SOURCES = ['apnews', 'aljazeera', 'gothamist', 'yahoo']
+
+
+http_client = HttpClient()
+
+
+def fetch_page(source, url):
+    response = http_client.get(url, source=source)
+    return {'source': source, 'url': url, 'status_code': response.status_code, 'html': response.content}
+
+
+def build_jobs(base_url, articles_per_source):
+    jobs = []
+    for source in SOURCES:
+        jobs.append({'source': source, 'url': f"{base_url}/{source}/search?q=Olympic Paris"})
+        if source != 'aljazeera':
+            for number in range(articles_per_source):
+                jobs.append({'source': source, 'url': f"{base_url}/{source}/article/story-{number}"})
+    return jobs
+
+
+def run(engine, jobs):
+    started_at = time.perf_counter()
+    results = engine.fetch_all(jobs)
+    elapsed = time.perf_counter() - started_at
+    failures = len([result for result in results if result['status_code'] != 200])
+    return elapsed, failures
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--articles', type=int, default=20, help='articles per source')
+    parser.add_argument('--latency', type=float, default=0.1, help='seconds added by the stand-in per request')
+    parser.add_argument('--max-in-flight', type=int, default=16)
+    parser.add_argument('--per-source', type=int, default=4)
+    args = parser.parse_args()
+
+    with LocalNewsServer(latency=args.latency) as server:
+        jobs = build_jobs(server.base_url, args.articles)
+        sequential = FetchEngine(fetch_page, max_in_flight=1, default_source_limit=1)
+        concurrent = FetchEngine(fetch_page, max_in_flight=args.max_in_flight,
+                                 default_source_limit=args.per_source)
+        sequential_time, sequential_failures = run(sequential, jobs)
+        concurrent_time, concurrent_failures = run(concurrent, jobs)
+
+    print(f"requests: {len(jobs)} | latency: {args.latency}s")
+    print(f"sequential: {sequential_time:.2f}s ({sequential_failures} failures)")
+    print(f"concurrent: {concurrent_time:.2f}s ({concurrent_failures} failures) "
+          f"max_in_flight={args.max_in_flight} per_source={args.per_source}")
+    print(f"speedup: {sequential_time / concurrent_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
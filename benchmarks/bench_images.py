@@ -0,0 +1,75 @@
+"""
+Wall-clock comparison between the old one-by-one image download and the concurrent ImageDownloader.
+
+Rows point to repeated urls, and to urls that only differ by their query string (same picture, other url),
+like the resized variants news websites link to.
+
+Usage: python -m benchmarks.bench_images --rows 120 --latency 0.1
+"""
+import argparse
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.local_server import LocalNewsServer
+from news_data_extractor.source.http_client import HttpClient
+from news_data_extractor.source.image_downloader import ImageDownloader
+
+SOURCES = ['apnews', 'gothamist', 'yahoo']
+
+
+def build_rows(base_url, count):
+    rows = []
+    for number in range(count):
+        picture = number % (count // 2 or 1)
+        source = SOURCES[(picture // 2) % len(SOURCES)]
+        rows.append({'source': source, 'url': f"{base_url}/{source}/article/story-{number}",
+                     'picture_url': f"{base_url}/{source}/images/picture-{picture // 2}.jpg?width={picture % 2}"})
+    return rows
+
+
+def serial_download(http_client, rows, folder):
+    Path(folder).mkdir(parents=True, exist_ok=True)
+    for row in rows:
+        response = http_client.get(row['picture_url'], source=row['source'], chunk_size=1024)
+        if response.ok:
+            image_path = Path(folder) / Path(row['picture_url'].split('?')[0]).name
+            image_path.write_bytes(response.content)
+            row['picture_path'] = str(image_path)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=120)
+    parser.add_argument('--latency', type=float, default=0.1, help='seconds added by the stand-in per request')
+    parser.add_argument('--max-in-flight', type=int, default=8)
+    args = parser.parse_args()
+
+    folder = Path(tempfile.mkdtemp())
+    try:
+        with LocalNewsServer(latency=args.latency) as server:
+            rows = build_rows(server.base_url, args.rows)
+            started_at = time.perf_counter()
+            serial_download(HttpClient(), [dict(row) for row in rows], folder / 'serial')
+            serial_time = time.perf_counter() - started_at
+            serial_requests = server.requests_served
+
+            downloader = ImageDownloader(HttpClient(), folder / 'concurrent', max_in_flight=args.max_in_flight)
+            started_at = time.perf_counter()
+            downloaded_rows = downloader.download_rows([dict(row) for row in rows])
+            concurrent_time = time.perf_counter() - started_at
+            concurrent_requests = server.requests_served - serial_requests
+
+        assert all(row['picture_path'] is not None for row in downloaded_rows)
+        print(f"rows: {len(rows)} | distinct urls: {len({row['picture_url'] for row in rows})} | "
+              f"files saved: {len(list((folder / 'concurrent').iterdir()))}")
+        print(f"serial     | {serial_time:6.2f}s | {serial_requests} requests")
+        print(f"concurrent | {concurrent_time:6.2f}s | {concurrent_requests} requests | "
+              f"{serial_time / concurrent_time:.1f}x | {downloader.stats}")
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    main()
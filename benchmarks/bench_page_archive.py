@@ -0,0 +1,66 @@
+"""
+Memory and speed of keeping article pages in the page archive instead of str(bytes) in news_to_collect_data.
+
+Usage: python -m benchmarks.bench_page_archive --pages 500
+"""
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from news_data_extractor.source.extraction_plan import ExtractionPlan
+from news_data_extractor.source.main import NewsDataExtractor
+from news_data_extractor.source.page_archive import PageArchive
+
+FIXTURES_FOLDER = Path(__file__).resolve().parent / 'fixtures'
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=500, help='archived article pages')
+    parser.add_argument('--compression-level', type=int, default=6)
+    args = parser.parse_args()
+
+    sources = NewsDataExtractor._get_sources(only_active=True)
+    fixtures = [(source, (FIXTURES_FOLDER / source / 'article.html').read_bytes()) for source in sources
+                if (FIXTURES_FOLDER / source / 'article.html').exists()]
+    pages = [(fixtures[number % len(fixtures)][0], f"https://example.com/story-{number}",
+              fixtures[number % len(fixtures)][1]) for number in range(args.pages)]
+
+    legacy_entries = [{'url': url, 'html': str(page)} for _, url, page in pages]
+    legacy_bytes = sum(sys.getsizeof(entry['html']) for entry in legacy_entries)
+    del legacy_entries
+
+    folder = Path(tempfile.mkdtemp())
+    try:
+        archive = PageArchive(folder, compression_level=args.compression_level)
+        started_at = time.perf_counter()
+        references = [(source, url, archive.append(url, page, source=source, status_code=200))
+                      for source, url, page in pages]
+        write_time = time.perf_counter() - started_at
+        reference_bytes = sum(sys.getsizeof(reference) + sum(sys.getsizeof(value) for value in reference.values())
+                              for _, _, reference in references)
+
+        started_at = time.perf_counter()
+        for _, _, reference in references:
+            archive.read(reference)
+        read_time = time.perf_counter() - started_at
+
+        plans = {source: ExtractionPlan(source, sources[source]) for source, _ in fixtures}
+        for (source, url, reference), (_, _, page) in zip(references, pages):
+            assert plans[source].parse_article(url, archive.read(reference)) == plans[source].parse_article(url, page)
+        archive.close()
+
+        raw_size = sum(len(page) for _, _, page in pages)
+        print(f"pages: {len(pages)} | raw: {raw_size / 1e6:.1f} MB | archive: {archive.size / 1e6:.1f} MB "
+              f"({raw_size / archive.size:.1f}x smaller)")
+        print(f"in memory | str(bytes): {legacy_bytes / 1e6:.1f} MB | archive refs: {reference_bytes / 1e6:.2f} MB")
+        print(f"write: {len(pages) / write_time:.0f} pages/s | read: {len(pages) / read_time:.0f} pages/s")
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    main()
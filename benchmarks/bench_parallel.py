@@ -0,0 +1,71 @@
+"""
+Scaling of the process pool on a saved-page corpus: the fixture articles are archived many times and parsed
+then normalized with 1, 2, 4... workers.
+
+Usage: python -m benchmarks.bench_parallel --pages 2000 --workers 1 2 4
+"""
+import argparse
+import copy
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from news_data_extractor.source.date_parser import DateParser
+from news_data_extractor.source.extraction_plan import compile_plans
+from news_data_extractor.source.main import NewsDataExtractor
+from news_data_extractor.source.page_archive import PageArchive
+from news_data_extractor.source.parallel import ProcessPool
+from news_data_extractor.source.text_normalization import normalize_raw_rows
+
+FIXTURES_FOLDER = Path(__file__).resolve().parent / 'fixtures'
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=2000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--chunk-size', type=int, default=32)
+    args = parser.parse_args()
+
+    sources = NewsDataExtractor._get_sources(only_active=True)
+    fixtures = [(source, (FIXTURES_FOLDER / source / 'article.html').read_bytes()) for source in sources
+                if (FIXTURES_FOLDER / source / 'article.html').exists()]
+    folder = Path(tempfile.mkdtemp())
+    try:
+        archive = PageArchive(folder)
+        jobs = []
+        for number in range(args.pages):
+            source, page = fixtures[number % len(fixtures)]
+            url = f"https://example.com/{source}/story-{number}"
+            jobs.append({'source': source, 'url': url, 'archive_ref': archive.append(url, page, source=source)})
+
+        plans = compile_plans(sources)
+        started_at = time.perf_counter()
+        expected_rows = [plans[job['source']].parse_article(job['url'], archive.read(job['archive_ref']))
+                         for job in jobs]
+        expected_normalized, _ = normalize_raw_rows(copy.deepcopy(expected_rows), DateParser())
+        single_time = time.perf_counter() - started_at
+        print(f"pages: {len(jobs)} | cpus: {os.cpu_count()}")
+        print(f"in process | {len(jobs) / single_time:7.0f} pages/s")
+
+        for workers in args.workers:
+            pool = ProcessPool(sources, archive_folder=folder, workers=workers, chunk_size=args.chunk_size)
+            # Starts the workers, so their start-up is not measured.
+            pool.parse_articles(jobs[:workers * args.chunk_size])
+            started_at = time.perf_counter()
+            rows, parse_errors = pool.parse_articles(jobs)
+            normalized_rows, normalize_errors = pool.normalize_rows(rows)
+            elapsed = time.perf_counter() - started_at
+            pool.close()
+            assert rows == expected_rows and normalized_rows == expected_normalized
+            assert len(parse_errors) == 0 and len(normalize_errors) == 0
+            print(f"{workers:2d} workers | {len(jobs) / elapsed:7.0f} pages/s | {single_time / elapsed:.2f}x | "
+                  f"efficiency {single_time / elapsed / workers:.0%}")
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    main()
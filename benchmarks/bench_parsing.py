@@ -0,0 +1,114 @@
+"""
+Per-source parsing throughput on saved pages: the original html.parser code versus compiled extraction plans.
+
+The original listing and article parsing is kept below as the reference, every plan result is checked
+against it before timing.
+
+Usage: python -m benchmarks.bench_parsing --repeat 200
+"""
+import argparse
+import time
+
+from bs4 import BeautifulSoup
+
+from benchmarks.local_server import FIXTURES_FOLDER
+from news_data_extractor.source.extraction_plan import ExtractionPlan
+from news_data_extractor.source.main import NewsDataExtractor
+
+
+def reference_listing(config, search_html):
+    news_url_found = []
+    listing_object_class_name = config['listing_steps'][0]['loc']['class']
+    listing_object_type = config['listing_steps'][0]['type']
+    listing_object_properties = config['listing_steps'][0]['loc']
+    source_domain = config['domain']
+    soup = BeautifulSoup(search_html, 'html.parser')
+    elements = soup.find_all(class_=lambda x: x and x.startswith(listing_object_class_name))
+    if len(elements) == 0:
+        elements = soup.find_all(f"{listing_object_type}", listing_object_properties)
+    for element in elements:
+        http_urls = [a['href'] for a in element.find_all('a', href=True) if a['href'].startswith('https')]
+        if len(http_urls) != 0:
+            news_url_found = news_url_found + http_urls
+        else:
+            for a in element.find_all('a', href=True):
+                divider = "" if str(a['href'])[0] == '/' else "/"
+                news_url_found.append(f"{source_domain}/{divider}{a['href']}")
+    return news_url_found
+
+
+def reference_article(source, config, url, search_html):
+    generated_row = {'url': url, 'source': source}
+    soup = BeautifulSoup(search_html, 'html.parser')
+    for step_dict in config['extraction_steps']:
+        column_name = step_dict['column_name']
+        object_param = step_dict['loc']
+        result = None
+        element = soup.find(f"{step_dict['type']}", object_param)
+        if element is None:
+            element = soup.find(class_=lambda x: x and x.startswith(object_param['class']))
+        if element is not None:
+            if column_name == "title":
+                result = element.text
+            elif column_name == "description":
+                result = element.find_next('p').text
+            elif column_name == "full_text":
+                full_text = ""
+                all_p = element.find_all('p')
+                if len(all_p) != 0:
+                    for p in all_p:
+                        full_text = f"{p.text}" if full_text == "" else f"{full_text}\n{p.text}"
+                else:
+                    full_text = element.text
+                result = full_text
+            elif column_name == "date":
+                try:
+                    result = str(element['datetime'])
+                    if len(result) == 0:
+                        result = str(element.text)
+                except KeyError:
+                    result = str(element.text)
+            elif column_name == "picture_url":
+                result = str(element['src'])
+            else:
+                result = str(element.text)
+        generated_row[column_name] = result
+    return generated_row
+
+
+def timed(function, repeat):
+    started_at = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - started_at) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=100)
+    args = parser.parse_args()
+
+    sources = NewsDataExtractor._get_sources(only_active=True)
+    for source, config in sources.items():
+        plan = ExtractionPlan(source, config)
+        search_html = (FIXTURES_FOLDER / source / 'search.html').read_bytes()
+        assert plan.parse_listing(search_html) == reference_listing(config, search_html), source
+        legacy_time = timed(lambda: reference_listing(config, search_html), args.repeat)
+        plan_time = timed(lambda: plan.parse_listing(search_html), args.repeat)
+        print(f"{source:<10} listing | html.parser: {1 / legacy_time:7.0f} pages/s | "
+              f"plan ({plan.parser}): {1 / plan_time:7.0f} pages/s | {legacy_time / plan_time:.1f}x")
+
+        article_path = FIXTURES_FOLDER / source / 'article.html'
+        if 'extraction_steps' not in config or not article_path.exists():
+            continue
+        article_bytes = article_path.read_bytes()
+        assert plan.parse_article('url', article_bytes) == reference_article(source, config, 'url',
+                                                                             article_bytes), source
+        legacy_time = timed(lambda: reference_article(source, config, 'url', article_bytes), args.repeat)
+        plan_time = timed(lambda: plan.parse_article('url', article_bytes), args.repeat)
+        print(f"{source:<10} article | html.parser: {1 / legacy_time:7.0f} pages/s | "
+              f"plan ({plan.parser}): {1 / plan_time:7.0f} pages/s | {legacy_time / plan_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
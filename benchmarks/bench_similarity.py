@@ -0,0 +1,73 @@
+"""
+Microbenchmark of similarity scoring and selection: per-row DataFrame.apply versus one matrix product.
+
+Usage: python -m benchmarks.bench_similarity --sizes 10000 100000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from news_data_extractor.source.similarity import (build_embedding_matrix, closest_mask, combine_query_scores,
+                                                   score_queries, top_k_indices)
+
+DIMENSION = 96  # en_core_web_sm token vectors
+
+
+def cosine_similarity(vector_a, vector_b):
+    # Same formula as NewsDataExtractor.nlp_cosine_similarity, copied so spaCy isn't needed here.
+    return np.dot(vector_a, vector_b) / (np.linalg.norm(vector_a) * np.linalg.norm(vector_b))
+
+
+def legacy(df, query, max_percentage):
+    df['similarities'] = df['embedding'].apply(lambda emb: cosine_similarity(query, emb).item())
+    df = df.sort_values(by='similarities', ascending=True)
+    cutoff = df['similarities'].max() * (1 - max_percentage)
+    return df[df['similarities'] >= cutoff].reset_index(drop=True)
+
+
+def vectorized(matrix, queries, max_percentage):
+    scores = combine_query_scores(score_queries(matrix, build_embedding_matrix(queries)))
+    return np.flatnonzero(closest_mask(scores, max_percentage)), scores
+
+
+def timed(function, *args, repeat=3):
+    best = None
+    result = None
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - started_at
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--max-percentage', type=float, default=0.6)
+    args = parser.parse_args()
+
+    generator = np.random.default_rng(42)
+    for size in args.sizes:
+        embeddings = generator.standard_normal((size, DIMENSION)).astype(np.float32)
+        queries = generator.standard_normal((2, DIMENSION)).astype(np.float32)
+        df = pd.DataFrame({'embedding': list(embeddings)})
+
+        legacy_time, legacy_result = timed(legacy, df, queries[0], args.max_percentage, repeat=1)
+        build_time, matrix = timed(build_embedding_matrix, embeddings)
+        single_time, (selected, _) = timed(vectorized, matrix, queries[:1], args.max_percentage)
+        multi_time, _ = timed(vectorized, matrix, queries, args.max_percentage)
+        _, (_, scores) = timed(vectorized, matrix, queries[:1], args.max_percentage, repeat=1)
+        top_k_time, _ = timed(top_k_indices, scores, 100)
+        assert len(selected) == len(legacy_result)
+
+        print(f"{size} articles | legacy apply+sort: {legacy_time * 1000:.1f}ms | "
+              f"matrix build (once): {build_time * 1000:.1f}ms | 1 query: {single_time * 1000:.2f}ms | "
+              f"2 queries: {multi_time * 1000:.2f}ms | top-100: {top_k_time * 1000:.2f}ms | "
+              f"speedup: {legacy_time / single_time:.0f}x")
+
+
+if __name__ == '__main__':
+    main()
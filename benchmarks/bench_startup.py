@@ -0,0 +1,72 @@
+"""
+Startup benchmark: import time of the main module and time-to-first-request of step_1.
+
+Each measurement runs in a fresh interpreter so nothing is already imported or loaded.
+
+Usage: python -m benchmarks.bench_startup --runs 5
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from benchmarks.local_server import LocalNewsServer
+
+ROOT_FOLDER = Path(__file__).resolve().parent.parent
+
+IMPORT_SCRIPT = "import news_data_extractor.source.main"
+
+STEP_1_SCRIPT = """
+import sys
+from benchmarks.local_server import make_local_extractor_class
+from news_data_extractor.source.models import loaded_models
+
+extractor_class = make_local_extractor_class(sys.argv[1])
+bot_class = extractor_class(search_parameters={'text_phrase': 'Olympic Paris', 'news_category': None,
+                                               'max_months': 2, 'use_http_cache': False,
+                                               'use_page_archive': False, 'use_date_pruning': False,
+                                               'use_rate_limiter': False})
+bot_class.search_news()
+bot_class.get_news_listing()
+bot_class.get_news_html()
+bot_class.parse_each_news()
+print('models loaded during step_1:', loaded_models())
+"""
+
+
+def run_script(script, *args):
+    started_at = time.perf_counter()
+    completed = subprocess.run([sys.executable, '-c', script, *args], cwd=ROOT_FOLDER,
+                               capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr)
+    return time.perf_counter() - started_at, completed.stdout
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    import_times = []
+    first_request_times = []
+    step_1_times = []
+    output = ''
+    for _ in range(args.runs):
+        import_times.append(run_script(IMPORT_SCRIPT)[0])
+        with LocalNewsServer() as server:
+            started_at = time.perf_counter()
+            elapsed, output = run_script(STEP_1_SCRIPT, server.base_url)
+            step_1_times.append(elapsed)
+            first_request_times.append(server.first_request_at - started_at)
+
+    print(f"import news_data_extractor.source.main: {statistics.median(import_times):.3f}s (median)")
+    print(f"step_1 time to first request: {statistics.median(first_request_times):.3f}s (median)")
+    print(f"step_1 total against the local stand-in: {statistics.median(step_1_times):.3f}s (median)")
+    print(output.strip().splitlines()[-1])
+
+
+if __name__ == '__main__':
+    main()
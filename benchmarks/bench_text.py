@@ -0,0 +1,61 @@
+"""
+Speed of the text cleaning and monetary detection of step 2, per row against per column.
+
+Usage: python -m benchmarks.bench_text --rows 5000
+"""
+import argparse
+import re
+import time
+
+from bs4 import BeautifulSoup
+
+from benchmarks.bench_artifacts import fixture_rows
+from news_data_extractor.source.text_normalization import TEXT_COLUMNS, clean_text_column, monetary_columns
+
+
+def reference_clean_text(text):
+    """clean_text of normalize_all_data before the columnar stage, kept here to check the results."""
+    if not isinstance(text, str):
+        return text
+    text = BeautifulSoup(text, "html.parser").get_text()
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def reference_contains_monetary_info(text):
+    if not isinstance(text, str):
+        return False
+    monetary_patterns = [r'\$\d+', r'€\d+', r'£\d+', r'\d+\s?(dollars|USD|euros|pounds)', r'\d+\s?(cents|pennies)',
+                         r'\d+\s?₹', r'¥\d+', r'\d+\s?(yen|RMB|yuan)']
+    return bool(re.search('|'.join(monetary_patterns), text, re.IGNORECASE))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=5000)
+    args = parser.parse_args()
+    rows = fixture_rows(args.rows)
+    for number, row in enumerate(rows):
+        if number % 7 == 0:
+            row['title'] = f"{row['title']} as prize money reaches ${number} million"
+
+    started_at = time.perf_counter()
+    expected = {column: [reference_clean_text(row.get(column)) for row in rows] for column in TEXT_COLUMNS}
+    expected_monetary = [reference_contains_monetary_info(title) or reference_contains_monetary_info(description)
+                         for title, description in zip(expected['title'], expected['description'])]
+    reference_time = time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    texts = {column: clean_text_column([row.get(column) for row in rows]) for column in TEXT_COLUMNS}
+    monetary = monetary_columns(texts['title'], texts['description'])
+    columnar_time = time.perf_counter() - started_at
+
+    assert all(list(texts[column]) == expected[column] for column in TEXT_COLUMNS)
+    assert list(monetary['contains_monetary']) == expected_monetary
+
+    print(f"rows: {len(rows)} | with monetary values: {int(monetary['contains_monetary'].sum())}")
+    print(f"per row    | {len(rows) / reference_time:8.0f} rows/s")
+    print(f"per column | {len(rows) / columnar_time:8.0f} rows/s | {reference_time / columnar_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+FIXTURES_FOLDER = Path(__file__).resolve().parent / 'fixtures'
+
+IMAGE_TYPES = {'.jpg': 'image/jpeg', '.jpeg': 'image/jpeg', '.png': 'image/png', '.webp': 'image/webp'}
+
+
+class _BackloggedHTTPServer(ThreadingHTTPServer):
+    # The default backlog of 5 drops connections under concurrent fetches, each drop costs a 1s SYN retry.
+    request_queue_size = 128
+    daemon_threads = True
+
+
+class LocalNewsServer:
+    """
+    Local HTTP stand-in that replays saved search and article pages.
+
+    Every source lives under its own path prefix (``/apnews/...``, ``/yahoo/...``) so the urls keep the
+    source name the listing step filters on. Search urls return ``fixtures/<source>/search.html``,
+    any other html url returns ``fixtures/<source>/<page>.html`` falling back to ``article.html`` and
+    image urls return a deterministic binary payload. ``{{base_url}}`` and ``{{page}}`` in a saved page are
+    replaced by the url of the server and the name of the requested page, so every article links its own
+    picture.
+    """
+
+    def __init__(self, fixtures_folder: Path = FIXTURES_FOLDER, latency: float = 0.0, port: int = 0,
+                 listing_copies: int = 1):
+        """
+        :param fixtures_folder: folder with one sub folder of saved pages per source.
+        :param latency: seconds slept before answering each request.
+        :param port: 0 picks a free port.
+        :param listing_copies: search pages list their articles this many times, each copy under other urls.
+        """
+        self.fixtures_folder = Path(fixtures_folder)
+        self.latency = latency
+        self.listing_copies = max(1, int(listing_copies))
+        self.requests_served = 0
+        self.first_request_at = None
+        self._lock = threading.Lock()
+        self._server = _BackloggedHTTPServer(('127.0.0.1', port), self._handler_class())
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def read_page(self, path: str):
+        parts = [part for part in path.split('?')[0].split('/') if part != '']
+        if len(parts) == 0:
+            return None, None
+        source_folder = self.fixtures_folder / parts[0]
+        if not source_folder.is_dir():
+            return None, None
+
+        suffix = Path(parts[-1]).suffix.lower()
+        if suffix in IMAGE_TYPES:
+            # Images are synthetic: the same url always returns the same bytes.
+            seed = '/'.join(parts).encode('utf-8')
+            return seed * (16384 // len(seed) + 1), IMAGE_TYPES[suffix]
+
+        if len(parts) > 1 and parts[1] == 'search':
+            page = source_folder / 'search.html'
+        else:
+            page = source_folder / f"{Path(parts[-1]).stem}.html"
+            if not page.exists():
+                page = source_folder / 'article.html'
+        if not page.exists():
+            return None, None
+        body = page.read_bytes()
+        if page.name == 'search.html':
+            body = self._repeat_listing(body)
+        body = body.replace(b'{{base_url}}', self.base_url.encode('utf-8'))
+        body = body.replace(b'{{page}}', Path(parts[-1]).stem.encode('utf-8'))
+        return body, 'text/html; charset=utf-8'
+
+    def _repeat_listing(self, body: bytes) -> bytes:
+        if self.listing_copies == 1:
+            return body
+        start = re.search(rb'<body[^>]*>', body).end()
+        end = body.rindex(b'</body>')
+        copies = [re.sub(rb'href="(/[^"]+)"', rb'href="\1-copy-%d"' % number, body[start:end])
+                  for number in range(self.listing_copies)]
+        return body[:start] + b''.join(copies) + body[end:]
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if server.latency:
+                    time.sleep(server.latency)
+                with server._lock:
+                    server.requests_served += 1
+                    if server.first_request_at is None:
+                        server.first_request_at = time.perf_counter()
+                body, content_type = server.read_page(re.sub('/+', '/', self.path))
+                if body is None:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+def make_local_extractor_class(server_base_url: str):
+    """
+    Returns a ``NewsDataExtractor`` subclass whose sources point at a running ``LocalNewsServer``.
+
+    :param server_base_url:
+    :return:
+    """
+    from news_data_extractor.source.main import NewsDataExtractor
+
+    class LocalNewsDataExtractor(NewsDataExtractor):
+        @staticmethod
+        def _get_sources(only_active=False):
+            sources = NewsDataExtractor._get_sources(only_active=only_active)
+            local_sources = {}
+            for source, config in sources.items():
+                local_config = dict(config)
+                local_config['domain'] = server_base_url
+                local_config['text_search_url'] = f"{server_base_url}/{source}/search?q="
+                local_sources[source] = local_config
+            return local_sources
+
+    return LocalNewsDataExtractor
@@ -0,0 +1,252 @@
+"""
+Benchmark suite of the pipeline stages against the local stand-in: every stage of NewsDataExtractor runs on the
+saved pages of every enabled source, several times, and its wall time, throughput, request latency and peak
+memory are saved to ``benchmarks/results/<commit>.json``. Two saved runs can then be compared.
+
+Timings come from runs without tracemalloc, the peak memory of each stage from one extra traced run, since
+tracing slows every allocation down. Caches and the date pruning of the listings are disabled so every run does the
+same work, whatever the day it runs on, and the rate limiter too since the stand-in does not need politeness.
+
+Usage: python -m benchmarks.suite --copies 10 --latency 0.05 --repeats 5
+       python -m benchmarks.suite --compare <base commit> <commit>
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from benchmarks.local_server import LocalNewsServer, make_local_extractor_class
+
+ROOT_FOLDER = Path(__file__).resolve().parent.parent
+RESULTS_FOLDER = Path(__file__).resolve().parent / 'results'
+
+STAGES = ['search_news', 'get_news_listing', 'get_news_html', 'parse_each_news', 'normalize_all_data',
+          'filter_data']
+
+# What each stage counts as one item for its throughput.
+STAGE_ITEMS = {
+    'search_news': lambda bot: len(bot.source_parameters),
+    'get_news_listing': lambda bot: sum(len(config.get('listing_results', []))
+                                        for config in bot.source_parameters.values()),
+    'get_news_html': lambda bot: sum(len(config['news_to_collect_data']) for config in bot.source_parameters.values()),
+    'parse_each_news': lambda bot: len(bot.extracted_data),
+    'normalize_all_data': lambda bot: len(bot.normalized_data),
+    'filter_data': lambda bot: len(bot.normalized_data),
+}
+
+
+def make_timed_extractor_class(base_url: str):
+    """
+    Local extractor that keeps the duration of every page request, to report the latency of the fetch stages.
+
+    :param base_url:
+    :return:
+    """
+    extractor_class = make_local_extractor_class(base_url)
+
+    class TimedNewsDataExtractor(extractor_class):
+        def __init__(self, *args, **kwargs):
+            self.request_times = []
+            super().__init__(*args, **kwargs)
+
+        def _request_page(self, source, url, resource_type=None):
+            started_at = time.perf_counter()
+            result = super()._request_page(source, url, resource_type=resource_type)
+            self.request_times.append(time.perf_counter() - started_at)
+            return result
+
+    return TimedNewsDataExtractor
+
+
+def percentile(values: list, fraction: float):
+    if len(values) == 0:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def run_pipeline(extractor_class, search_parameters: dict, folder: Path, trace_memory: bool = False) -> dict:
+    """
+    Function responsible for running every stage once on a fresh extractor.
+
+    :param extractor_class:
+    :param search_parameters:
+    :param folder: empty folder used as the root of the run (page archive, images).
+    :param trace_memory: measures the peak memory of each stage instead of trusting its time.
+    :return: dict stage -> measures, a stage that raised and the ones after it only have an ``error``.
+    """
+    bot = extractor_class(search_parameters=dict(search_parameters))
+    bot.root_folder = folder
+    bot.current_folder = folder
+    measures = {}
+    failed_stage = None
+    try:
+        for stage in STAGES:
+            if failed_stage is not None:
+                measures[stage] = {'error': f"skipped, {failed_stage} failed"}
+                continue
+            requests_before = len(bot.request_times)
+            if trace_memory:
+                tracemalloc.start()
+            started_at = time.perf_counter()
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    getattr(bot, stage)()
+            except (Exception, SystemExit) as error:
+                failed_stage = stage
+                measures[stage] = {'error': f"{type(error).__name__}: {error}"}
+                continue
+            finally:
+                elapsed = time.perf_counter() - started_at
+                peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+                tracemalloc.stop()
+            measures[stage] = {'seconds': elapsed, 'items': STAGE_ITEMS[stage](bot),
+                               'request_times': bot.request_times[requests_before:],
+                               'peak_mb': None if peak is None else peak / 1024 / 1024}
+    finally:
+        bot.close()
+    return measures
+
+
+def summarize(runs: list, traced_run: dict) -> dict:
+    """
+    Function responsible for merging the repeated runs of every stage.
+
+    :param runs: results of ``run_pipeline`` without tracing.
+    :param traced_run: result of ``run_pipeline`` with tracing.
+    :return:
+    """
+    summary = {}
+    for stage in STAGES:
+        stage_runs = [run[stage] for run in runs]
+        errors = [stage_run['error'] for stage_run in stage_runs if 'error' in stage_run]
+        if len(errors) != 0:
+            summary[stage] = {'error': errors[0]}
+            continue
+        seconds = [stage_run['seconds'] for stage_run in stage_runs]
+        request_times = [value for stage_run in stage_runs for value in stage_run['request_times']]
+        items = stage_runs[0]['items']
+        summary[stage] = {
+            'items': items,
+            'median_seconds': statistics.median(seconds),
+            'min_seconds': min(seconds),
+            'stdev_seconds': statistics.stdev(seconds) if len(seconds) > 1 else 0.0,
+            'items_per_second': items / statistics.median(seconds) if statistics.median(seconds) > 0 else None,
+            'requests': len(request_times) // len(stage_runs),
+            'request_p50_ms': None if len(request_times) == 0 else percentile(request_times, 0.5) * 1000,
+            'request_p95_ms': None if len(request_times) == 0 else percentile(request_times, 0.95) * 1000,
+            'peak_mb': traced_run[stage].get('peak_mb'),
+        }
+    return summary
+
+
+def git_commit() -> str:
+    def git(*args):
+        return subprocess.run(['git', *args], cwd=ROOT_FOLDER, capture_output=True, text=True).stdout.strip()
+
+    commit = git('rev-parse', '--short', 'HEAD') or 'unknown'
+    if git('status', '--porcelain', '--untracked-files=no') != '':
+        commit = f"{commit}-dirty"
+    return commit
+
+
+def _number(value, width: int, decimals: int) -> str:
+    return f"{'-':>{width}}" if value is None else f"{value:>{width}.{decimals}f}"
+
+
+def print_summary(results: dict):
+    print(f"commit {results['commit']} | {results['settings']} | python {results['machine']['python']} | "
+          f"{results['machine']['cpus']} cpus")
+    print(f"{'stage':<20} {'items':>6} {'median s':>9} {'min s':>9} {'items/s':>9} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'peak MB':>8}")
+    for stage, measures in results['stages'].items():
+        if 'error' in measures:
+            print(f"{stage:<20} {measures['error']}")
+            continue
+        print(f"{stage:<20} {measures['items']:>6} {measures['median_seconds']:>9.4f} {measures['min_seconds']:>9.4f} "
+              f"{_number(measures['items_per_second'], 9, 0)} {_number(measures['request_p50_ms'], 8, 1)} "
+              f"{_number(measures['request_p95_ms'], 8, 1)} {_number(measures['peak_mb'], 8, 2)}")
+
+
+def compare(base_commit: str, commit: str):
+    """
+    Function responsible for printing the change of every stage between two saved results.
+
+    :param base_commit:
+    :param commit:
+    :return:
+    """
+    base = json.loads((RESULTS_FOLDER / f"{base_commit}.json").read_text(encoding='utf-8'))
+    head = json.loads((RESULTS_FOLDER / f"{commit}.json").read_text(encoding='utf-8'))
+    if base['settings'] != head['settings']:
+        print(f"warning: the runs used other settings, {base['settings']} against {head['settings']}")
+    if base['machine'] != head['machine']:
+        print(f"warning: the runs come from other machines, {base['machine']} against {head['machine']}")
+    print(f"{'stage':<20} {base_commit:>14} {commit:>14} {'time':>8} {'peak MB':>16}")
+    for stage in STAGES:
+        base_stage, head_stage = base['stages'].get(stage, {}), head['stages'].get(stage, {})
+        if 'median_seconds' not in base_stage or 'median_seconds' not in head_stage:
+            print(f"{stage:<20} {base_stage.get('error', '-')} | {head_stage.get('error', '-')}")
+            continue
+        change = head_stage['median_seconds'] / base_stage['median_seconds'] - 1
+        print(f"{stage:<20} {base_stage['median_seconds']:>13.4f}s {head_stage['median_seconds']:>13.4f}s "
+              f"{change:>+8.1%} {_number(base_stage['peak_mb'], 7, 2)} -> {_number(head_stage['peak_mb'], 7, 2)}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--copies', type=int, default=10, help='times every search page lists its articles')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds added by the stand-in per request')
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--news-category', default='sports', help='empty to skip the similarity filter')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'COMMIT'), help='compare two saved results')
+    args = parser.parse_args()
+
+    if args.compare is not None:
+        compare(*args.compare)
+        return
+
+    logging.disable(logging.WARNING)
+    settings = {'copies': args.copies, 'latency': args.latency, 'repeats': args.repeats, 'workers': args.workers,
+                'news_category': args.news_category}
+    search_parameters = {'text_phrase': 'Olympic Paris', 'news_category': args.news_category or None,
+                         'max_months': 2, 'use_http_cache': False, 'use_embedding_store': False,
+                         'use_article_store': False, 'use_date_pruning': False, 'use_rate_limiter': False,
+                         'workers': args.workers}
+    runs = []
+    with LocalNewsServer(latency=args.latency, listing_copies=args.copies) as server:
+        extractor_class = make_timed_extractor_class(server.base_url)
+        # The first run loads the models and warms the imports, it is not measured.
+        for repeat in range(args.repeats + 2):
+            folder = Path(tempfile.mkdtemp())
+            try:
+                run = run_pipeline(extractor_class, search_parameters, folder, trace_memory=repeat == args.repeats + 1)
+            finally:
+                shutil.rmtree(folder)
+            if repeat != 0:
+                runs.append(run)
+
+    results = {'commit': git_commit(), 'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'settings': settings,
+               'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                           'cpus': os.cpu_count()},
+               'stages': summarize(runs[:-1], runs[-1])}
+    print_summary(results)
+    RESULTS_FOLDER.mkdir(parents=True, exist_ok=True)
+    results_path = RESULTS_FOLDER / f"{results['commit']}.json"
+    results_path.write_text(json.dumps(results, indent=2), encoding='utf-8')
+    print(f"saved to {results_path.relative_to(ROOT_FOLDER)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+import logging
+import os
+from pathlib import Path
+
+import numpy as np
+
+from news_data_extractor.source.similarity import build_embedding_matrix, top_k_indices
+
+
+# Lists scanned per query: 8 gives about 0.72 recall@10 in benchmarks.bench_ann, 32 about 0.95.
+DEFAULT_N_PROBE = 32
+
+
+class IVFIndex:
+    """
+    Approximate nearest neighbour index (inverted file) over normalized article embeddings.
+
+    Vectors are grouped around ``n_lists`` centroids found with spherical k-means and a query only scores
+    the vectors of its ``n_probe`` closest lists. Until there are enough vectors to train the centroids
+    the index falls back to an exact search. Ids are article urls; adding an id again replaces its vector.
+    """
+
+    def __init__(self, n_lists: int = 64, n_probe: int = DEFAULT_N_PROBE, model_name: str = None,
+                 model_version: str = None, retrain_growth: float = 4.0, seed: int = 42):
+        """
+        :param n_lists: number of centroids / inverted lists.
+        :param n_probe: lists scanned per query.
+        :param model_name: model that produced the vectors, saved with the index.
+        :param model_version:
+        :param retrain_growth: retrain the centroids once the index grew by this factor since training.
+        :param seed:
+        """
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.model_name = model_name
+        self.model_version = model_version
+        self.retrain_growth = retrain_growth
+        self.seed = seed
+        self.ids = []
+        self.positions = {}
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self.centroids = None
+        self.assignments = np.zeros(0, dtype=np.int32)
+        self.trained_size = 0
+        self._lists = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._vectors[:len(self.ids)]
+
+    @property
+    def min_train_size(self):
+        return self.n_lists * 8
+
+    def add(self, ids: list, embeddings):
+        """
+        Function responsible for inserting or replacing vectors.
+
+        :param ids: article urls.
+        :param embeddings: one vector per id.
+        :return:
+        """
+        if len(ids) == 0:
+            return
+        matrix = build_embedding_matrix(embeddings)
+        if self._vectors.shape[1] == 0:
+            self._vectors = np.zeros((max(1024, len(ids)), matrix.shape[1]), dtype=np.float32)
+
+        new_positions = []
+        for article_id, vector in zip(ids, matrix):
+            position = self.positions.get(article_id)
+            if position is None:
+                position = len(self.ids)
+                if position >= self._vectors.shape[0]:
+                    grown = np.zeros((self._vectors.shape[0] * 2, self._vectors.shape[1]), dtype=np.float32)
+                    grown[:position] = self._vectors[:position]
+                    self._vectors = grown
+                self.ids.append(article_id)
+                self.positions[article_id] = position
+            self._vectors[position] = vector
+            new_positions.append(position)
+
+        if self.assignments.shape[0] < len(self.ids):
+            self.assignments = np.concatenate(
+                [self.assignments, np.full(len(self.ids) - self.assignments.shape[0], -1, dtype=np.int32)])
+        if self._needs_training():
+            self.train()
+        elif self.centroids is not None:
+            positions = np.array(new_positions, dtype=np.int64)
+            self.assignments[positions] = np.argmax(self._vectors[positions] @ self.centroids.T, axis=1)
+        self._lists = None
+
+    def update(self, ids: list, embeddings) -> int:
+        """
+        Function responsible for adding the vectors of new ids and of ids whose vector changed, the vectors
+        already indexed as they are stay untouched.
+
+        :param ids: article urls.
+        :param embeddings: one vector per id.
+        :return: number of vectors added or replaced.
+        """
+        if len(ids) == 0:
+            return 0
+        matrix = build_embedding_matrix(embeddings)
+        changed = [number for number, article_id in enumerate(ids)
+                   if article_id not in self.positions
+                   or not np.allclose(self._vectors[self.positions[article_id]], matrix[number], atol=1e-6)]
+        if len(changed) != 0:
+            self.add([ids[number] for number in changed], matrix[changed])
+        return len(changed)
+
+    def _needs_training(self):
+        if len(self.ids) < self.min_train_size:
+            return False
+        if self.centroids is None:
+            return True
+        return len(self.ids) >= self.trained_size * self.retrain_growth
+
+    def train(self, iterations: int = 10, sample_size: int = None):
+        """
+        Function responsible for fitting the centroids with spherical k-means and reassigning every vector.
+
+        :param iterations:
+        :param sample_size: vectors used to fit the centroids, 64 per list by default.
+        :return:
+        """
+        vectors = self.vectors
+        n_lists = min(self.n_lists, len(vectors))
+        generator = np.random.default_rng(self.seed)
+        sample_size = sample_size or n_lists * 64
+        sample = vectors[generator.choice(len(vectors), size=min(sample_size, len(vectors)), replace=False)]
+        centroids = sample[generator.choice(len(sample), size=n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for list_number in range(n_lists):
+                members = sample[labels == list_number]
+                if len(members) != 0:
+                    centroids[list_number] = members.sum(axis=0)
+            centroids = build_embedding_matrix(centroids)
+        self.centroids = centroids
+        self.assignments = self._assign(vectors)
+        self.trained_size = len(vectors)
+        self._lists = None
+        logging.info(f"[ANN] Trained {n_lists} lists on {len(sample)} of {len(vectors)} vectors.")
+
+    def _assign(self, vectors, batch_size=16384):
+        assignments = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), batch_size):
+            assignments[start:start + batch_size] = np.argmax(vectors[start:start + batch_size] @ self.centroids.T,
+                                                              axis=1)
+        return assignments
+
+    def _inverted_lists(self):
+        if self._lists is None:
+            order = np.argsort(self.assignments[:len(self.ids)], kind='stable')
+            boundaries = np.searchsorted(self.assignments[:len(self.ids)][order], np.arange(len(self.centroids) + 1))
+            self._lists = [order[boundaries[number]:boundaries[number + 1]] for number in range(len(self.centroids))]
+        return self._lists
+
+    def search(self, query_embeddings, k: int = 10, n_probe: int = None) -> list:
+        """
+        Function responsible for finding the k most similar articles for every query.
+
+        :param query_embeddings: one vector or a list of vectors.
+        :param k:
+        :param n_probe: lists scanned per query, more is slower and more exact.
+        :return: one list of (id, similarity) per query, most similar first.
+        """
+        queries = build_embedding_matrix(np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32)))
+        if len(self.ids) == 0:
+            return [[] for _ in range(len(queries))]
+        vectors = self.vectors
+        n_probe = n_probe or self.n_probe
+        results = []
+        for query in queries:
+            if self.centroids is None:
+                candidates = np.arange(len(vectors))
+            else:
+                closest_lists = top_k_indices(self.centroids @ query, n_probe)
+                inverted_lists = self._inverted_lists()
+                candidates = np.concatenate([inverted_lists[number] for number in closest_lists])
+            scores = vectors[candidates] @ query
+            best = top_k_indices(scores, k)
+            results.append([(self.ids[candidates[position]], float(scores[position])) for position in best])
+        return results
+
+    def exact_search(self, query_embeddings, k: int = 10) -> list:
+        """
+        Brute force cosine search over every vector, used to measure recall.
+
+        :param query_embeddings:
+        :param k:
+        :return:
+        """
+        queries = build_embedding_matrix(np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32)))
+        results = []
+        for query in queries:
+            scores = self.vectors @ query
+            results.append([(self.ids[position], float(scores[position])) for position in top_k_indices(scores, k)])
+        return results
+
+    def save(self, path):
+        """
+        Function responsible for writing the index to a ``.npz`` file.
+
+        :param path:
+        :return:
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = path.with_name(f"{path.stem}.tmp.npz")
+        np.savez(temporary_path, vectors=self.vectors, ids=np.array(self.ids, dtype=object),
+                 centroids=self.centroids if self.centroids is not None else np.zeros((0, 0), dtype=np.float32),
+                 assignments=self.assignments[:len(self.ids)],
+                 settings=np.array([self.n_lists, self.n_probe, self.trained_size], dtype=np.int64),
+                 model=np.array([self.model_name or '', self.model_version or ''], dtype=object))
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Function responsible for reading an index written by ``save``.
+
+        :param path:
+        :return:
+        """
+        data = np.load(path, allow_pickle=True)
+        n_lists, n_probe, trained_size = (int(value) for value in data['settings'])
+        model_name, model_version = (str(value) or None for value in data['model'])
+        index = cls(n_lists=n_lists, n_probe=n_probe, model_name=model_name, model_version=model_version)
+        index.ids = [str(article_id) for article_id in data['ids']]
+        index.positions = {article_id: position for position, article_id in enumerate(index.ids)}
+        index._vectors = np.ascontiguousarray(data['vectors'], dtype=np.float32)
+        if data['centroids'].size != 0:
+            index.centroids = data['centroids']
+        index.assignments = data['assignments'].astype(np.int32)
+        index.trained_size = trained_size
+        return index
+
+    @classmethod
+    def from_embedding_store(cls, store, **kwargs):
+        """
+        Function responsible for building an index from every article of an ``EmbeddingStore``.
+
+        :param store:
+        :param kwargs: ``IVFIndex`` settings.
+        :return:
+        """
+        index = cls(model_name=store.model_name, model_version=store.model_version, **kwargs)
+        urls = list(store.index.keys())
+        if len(urls) != 0:
+            index.add(urls, store.matrix[[store.index[url][1] for url in urls]])
+        return index
@@ -0,0 +1,379 @@
+import contextlib
+import datetime
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import click
+
+SCHEMA_VERSION = 1
+
+# Bumped when normalize_raw_rows changes its output, stored normalized rows are then recomputed.
+NORMALIZATION_VERSION = 1
+
+TRACKING_PARAMETERS = ('utm_', 'fbclid', 'gclid', 'mc_cid', 'mc_eid', 'ocid', 'guccounter', 'guce_')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    canonical_url TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    url TEXT NOT NULL,
+    content_hash TEXT,
+    parser_version TEXT,
+    raw_row TEXT,
+    normalized_key TEXT,
+    normalized_row TEXT,
+    first_seen_run TEXT,
+    last_seen_run TEXT,
+    changed_run TEXT,
+    fetched_at REAL
+);
+CREATE INDEX IF NOT EXISTS articles_changed_run ON articles (changed_run);
+"""
+
+# Rows of another store are taken when they were fetched later. A row that was only new for the other store
+# (a shard that never saw the article) keeps the run where it last changed here.
+MERGE_ROWS = """
+INSERT INTO articles SELECT * FROM other.articles WHERE true
+ON CONFLICT (canonical_url) DO UPDATE SET source = excluded.source, url = excluded.url,
+    content_hash = excluded.content_hash, parser_version = excluded.parser_version, raw_row = excluded.raw_row,
+    normalized_key = COALESCE(excluded.normalized_key, articles.normalized_key),
+    normalized_row = COALESCE(excluded.normalized_row, articles.normalized_row),
+    first_seen_run = COALESCE(articles.first_seen_run, excluded.first_seen_run),
+    last_seen_run = excluded.last_seen_run,
+    changed_run = CASE WHEN articles.raw_row IS excluded.raw_row THEN articles.changed_run
+                       ELSE excluded.changed_run END,
+    fetched_at = excluded.fetched_at
+WHERE excluded.fetched_at >= COALESCE(articles.fetched_at, 0)
+"""
+
+
+def canonical_url(url: str) -> str:
+    """
+    Function responsible for giving every address of the same article one key: lower case scheme and host,
+    no fragment, no repeated or trailing slash, no tracking parameters and the other parameters sorted.
+
+    :param url:
+    :return:
+    """
+    parts = urlsplit(url.strip())
+    path = '/'.join(part for part in parts.path.split('/') if part != '')
+    query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+             if not key.lower().startswith(TRACKING_PARAMETERS)]
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), f"/{path}", urlencode(sorted(query)), ''))
+
+
+def _encode_row(row: dict) -> str:
+    return json.dumps({key: ({'__datetime__': value.isoformat()} if isinstance(value, datetime.datetime) else value)
+                       for key, value in row.items()})
+
+
+def _decode_row(text: str) -> dict:
+    row = json.loads(text)
+    for key, value in row.items():
+        if isinstance(value, dict) and '__datetime__' in value:
+            row[key] = datetime.datetime.fromisoformat(value['__datetime__'])
+    return row
+
+
+class ArticleStore:
+    """
+    SQLite store of the articles seen by earlier runs, keyed by canonical url.
+
+    Every article keeps the sha256 of its page, the raw row parsed from it (with the version of the extraction
+    steps that parsed it) and its normalized row (with the hash of the raw row it comes from). A run can then
+    skip the download of articles fetched less than ``refresh_after`` seconds ago, skip the parsing of pages
+    whose content did not change and reuse normalized rows. ``changed_run`` is the last run where the article
+    was new or changed, the rows of a run with that value are its delta.
+
+    Every write is its own short transaction, started with BEGIN IMMEDIATE so a process finding the store
+    locked by another one waits up to ``busy_timeout`` seconds for it instead of failing in the middle.
+    """
+
+    def __init__(self, path, refresh_after: float = 24 * 3600, busy_timeout: float = 30):
+        """
+        :param path: SQLite file, created with its folder when missing.
+        :param refresh_after: seconds after which a stored article is downloaded again to look for changes.
+        :param busy_timeout: seconds a write waits for another connection holding the store.
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.refresh_after = refresh_after
+        self.stats = {'new': 0, 'changed': 0, 'unchanged': 0, 'not_fetched': 0, 'normalized_reused': 0}
+        self._lock = threading.Lock()
+        # isolation_level=None: transactions are only the ones opened by _write.
+        self.connection = sqlite3.connect(str(self.path), timeout=busy_timeout, isolation_level=None,
+                                          check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute(f'PRAGMA busy_timeout = {int(busy_timeout * 1000)}')
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        # With WAL, NORMAL only syncs at checkpoints: a commit per row stays cheap.
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+        if version not in (0, SCHEMA_VERSION):
+            logging.warning(f"[ArticleStore] {self.path} has schema {version}, not {SCHEMA_VERSION}. Resetting it.")
+            self.connection.execute('DROP TABLE IF EXISTS articles')
+        self.connection.executescript(SCHEMA)
+        self.connection.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    @contextlib.contextmanager
+    def _write(self):
+        with self._lock:
+            self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                yield self.connection
+            except BaseException:
+                self.connection.execute('ROLLBACK')
+                raise
+            self.connection.execute('COMMIT')
+
+    @staticmethod
+    def content_hash(body: bytes) -> str:
+        return hashlib.sha256(body).hexdigest()
+
+    @staticmethod
+    def row_key(row: dict) -> str:
+        """Hash of a raw row and of the normalization version, the key of its normalized row."""
+        text = json.dumps(row, sort_keys=True, default=str)
+        return hashlib.sha256(f"{NORMALIZATION_VERSION}:{text}".encode('utf-8')).hexdigest()
+
+    def __len__(self):
+        with self._lock:
+            return self.connection.execute('SELECT COUNT(*) FROM articles').fetchone()[0]
+
+    def lookup(self, url: str):
+        """
+        Function responsible for returning what is stored about an article.
+
+        :param url: any address of the article.
+        :return: dict with the columns of the table, None when the article was never stored.
+        """
+        with self._lock:
+            record = self.connection.execute('SELECT * FROM articles WHERE canonical_url = ?',
+                                             (canonical_url(url),)).fetchone()
+        return None if record is None else dict(record)
+
+    def fresh_row(self, url: str, parser_version: str):
+        """
+        Function responsible for returning the stored raw row of an article downloaded less than
+        ``refresh_after`` seconds ago, so it is not downloaded again.
+
+        :param url:
+        :param parser_version: version of the extraction steps of the source.
+        :return: the raw row, or None when the article has to be downloaded.
+        """
+        record = self.lookup(url)
+        if (record is None or record['raw_row'] is None or record['parser_version'] != parser_version
+                or time.time() - (record['fetched_at'] or 0) >= self.refresh_after):
+            return None
+        self.stats['not_fetched'] += 1
+        return _decode_row(record['raw_row'])
+
+    def unchanged_row(self, url: str, content_hash: str, parser_version: str, run_id: str = None):
+        """
+        Function responsible for returning the stored raw row of an article whose page did not change.
+
+        :param url:
+        :param content_hash: ``content_hash`` of the page just downloaded.
+        :param parser_version:
+        :param run_id: recorded as the last run that saw the article.
+        :return: the raw row, or None when the page has to be parsed.
+        """
+        record = self.lookup(url)
+        if (record is None or record['raw_row'] is None or record['content_hash'] != content_hash
+                or record['parser_version'] != parser_version):
+            return None
+        with self._write() as connection:
+            connection.execute('UPDATE articles SET last_seen_run = ?, fetched_at = ? WHERE canonical_url = ?',
+                               (run_id, time.time(), record['canonical_url']))
+            self.stats['unchanged'] += 1
+        return _decode_row(record['raw_row'])
+
+    def save_raw_row(self, source: str, url: str, content_hash: str, parser_version: str, row: dict,
+                     run_id: str = None) -> str:
+        """
+        Function responsible for storing the raw row parsed from a page.
+
+        :param source:
+        :param url:
+        :param content_hash:
+        :param parser_version:
+        :param row:
+        :param run_id:
+        :return: 'new', 'changed' or 'unchanged' when the same row was already stored.
+        """
+        key = canonical_url(url)
+        encoded_row = _encode_row(row)
+        with self._write() as connection:
+            record = connection.execute('SELECT raw_row, changed_run FROM articles WHERE canonical_url = ?',
+                                        (key,)).fetchone()
+            if record is None:
+                change = 'new'
+            else:
+                # A page can change (ads, counters) without changing what is extracted from it.
+                change = 'unchanged' if record['raw_row'] == encoded_row else 'changed'
+            changed_run = record['changed_run'] if change == 'unchanged' else run_id
+            connection.execute(
+                'INSERT INTO articles (canonical_url, source, url, content_hash, parser_version, raw_row, '
+                'first_seen_run, last_seen_run, changed_run, fetched_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (canonical_url) DO UPDATE SET source = excluded.source, url = excluded.url, '
+                'content_hash = excluded.content_hash, parser_version = excluded.parser_version, '
+                'raw_row = excluded.raw_row, last_seen_run = excluded.last_seen_run, '
+                'changed_run = excluded.changed_run, fetched_at = excluded.fetched_at',
+                (key, source, url, content_hash, parser_version, encoded_row, run_id, run_id, changed_run,
+                 time.time()))
+            self.stats[change] += 1
+        return change
+
+    def normalized_rows(self, rows: list) -> list:
+        """
+        Function responsible for returning the stored normalized version of raw rows.
+
+        :param rows: raw rows.
+        :return: one normalized row or None per raw row.
+        """
+        keys = {canonical_url(row['url']): self.row_key(row) for row in rows}
+        urls = list(keys)
+        stored = {}
+        with self._lock:
+            # Chunks stay under the SQLite limit of bound parameters.
+            for start in range(0, len(urls), 500):
+                chunk = urls[start:start + 500]
+                for record in self.connection.execute(
+                        f"SELECT canonical_url, normalized_key, normalized_row FROM articles "
+                        f"WHERE canonical_url IN ({','.join('?' * len(chunk))})", chunk):
+                    if record['normalized_row'] is not None and record['normalized_key'] == keys[record[0]]:
+                        stored[record['canonical_url']] = _decode_row(record['normalized_row'])
+            self.stats['normalized_reused'] += len(stored)
+        return [stored.get(canonical_url(row['url'])) for row in rows]
+
+    def normalized_rows_by_url(self, urls: list) -> dict:
+        """
+        Function responsible for returning the last normalized row stored for articles, whatever run stored it.
+
+        :param urls:
+        :return: dict url -> normalized row, urls without one are missing.
+        """
+        urls_by_key = {canonical_url(url): url for url in urls}
+        keys = list(urls_by_key)
+        stored = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                for record in self.connection.execute(
+                        f"SELECT canonical_url, normalized_row FROM articles "
+                        f"WHERE canonical_url IN ({','.join('?' * len(chunk))})", chunk):
+                    if record['normalized_row'] is not None:
+                        stored[urls_by_key[record['canonical_url']]] = _decode_row(record['normalized_row'])
+        return stored
+
+    def save_normalized_rows(self, raw_rows: list, normalized_rows: list):
+        """
+        Function responsible for storing normalized rows next to the raw row they come from.
+        Articles that are not stored yet (rows of another machine) are added with their raw row.
+
+        :param raw_rows:
+        :param normalized_rows: same order as raw_rows.
+        :return:
+        """
+        with self._write() as connection:
+            for raw_row, normalized_row in zip(raw_rows, normalized_rows):
+                stored_row = {key: value for key, value in normalized_row.items() if key != 'embedding'}
+                connection.execute(
+                    'INSERT INTO articles (canonical_url, source, url, raw_row, normalized_key, normalized_row) '
+                    'VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (canonical_url) DO UPDATE SET '
+                    'normalized_key = excluded.normalized_key, normalized_row = excluded.normalized_row',
+                    (canonical_url(raw_row['url']), raw_row.get('source'), raw_row['url'], _encode_row(raw_row),
+                     self.row_key(raw_row), _encode_row(stored_row)))
+
+    def merge_from(self, path) -> int:
+        """
+        Function responsible for adding the articles of another store, e.g. the store of a shard of step 1.
+        An article stored in both keeps the row fetched last.
+
+        :param path: SQLite file of the other store.
+        :return: articles in the other store.
+        """
+        with self._lock:
+            self.connection.execute('ATTACH DATABASE ? AS other', (str(path),))
+        try:
+            with self._write() as connection:
+                articles = connection.execute('SELECT COUNT(*) FROM other.articles').fetchone()[0]
+                connection.execute(MERGE_ROWS)
+        finally:
+            with self._lock:
+                self.connection.execute('DETACH DATABASE other')
+        logging.info(f"[ArticleStore] Merged {articles} articles of {path} into {self.path}.")
+        return articles
+
+    def changed_rows(self, run_id: str) -> list:
+        """
+        Function responsible for returning the raw rows that were new or changed in a run.
+
+        :param run_id:
+        :return:
+        """
+        with self._lock:
+            records = self.connection.execute('SELECT raw_row FROM articles WHERE changed_run = ? ORDER BY source, url',
+                                              (run_id,)).fetchall()
+        return [_decode_row(record['raw_row']) for record in records]
+
+    def runs(self) -> dict:
+        """
+        Function responsible for counting the articles new or changed in every run.
+
+        :return: dict run_id -> articles.
+        """
+        with self._lock:
+            return {record[0]: record[1] for record in self.connection.execute(
+                'SELECT changed_run, COUNT(*) FROM articles WHERE changed_run IS NOT NULL GROUP BY changed_run '
+                'ORDER BY changed_run')}
+
+    def commit(self):
+        # Writes are committed as they are made, this only ends a transaction left open by a caller.
+        with self._lock:
+            if self.connection.in_transaction:
+                self.connection.execute('COMMIT')
+
+    def log_summary(self):
+        logging.info(f"[ArticleStore] {self.stats}")
+
+    def close(self):
+        self.commit()
+        self.log_summary()
+        with self._lock:
+            self.connection.close()
+
+
+@click.group()
+def cli():
+    """Maintenance commands for the article store."""
+
+
+@cli.command()
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+def info(path):
+    """Show the articles in the store at PATH and the changes of every run."""
+    store = ArticleStore(path)
+    click.echo(f"articles={len(store)}")
+    for run_id, articles in store.runs().items():
+        click.echo(f"run {run_id}: {articles} new or changed")
+
+
+@cli.command()
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--run-id', required=True, help='Run whose new or changed articles are written.')
+def delta(path, run_id):
+    """Write the raw rows new or changed in a run as JSON lines."""
+    store = ArticleStore(path)
+    for row in store.changed_rows(run_id):
+        click.echo(_encode_row(row))
+
+
+if __name__ == '__main__':
+    cli()
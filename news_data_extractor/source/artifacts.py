@@ -0,0 +1,106 @@
+import itertools
+import logging
+import os
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Bump when the columns or their types change, step 2 refuses artifacts of another version.
+ARTIFACT_SCHEMA_VERSION = 1
+ARTIFACT_FORMAT = 'parquet'
+SCHEMA_VERSION_KEY = b'news_data_extractor.schema_version'
+
+RAW_ROW_COLUMNS = ('url', 'source', 'title', 'description', 'full_text', 'date', 'picture_url', 'picture_caption',
+                   'authors')
+
+
+class ArtifactSchemaMismatch(ValueError):
+    """Raised when an artifact was written with another schema version."""
+
+
+def raw_rows_schema(columns: tuple = RAW_ROW_COLUMNS) -> pa.Schema:
+    return pa.schema([pa.field(column, pa.string()) for column in columns],
+                     metadata={SCHEMA_VERSION_KEY: str(ARTIFACT_SCHEMA_VERSION).encode()})
+
+
+def _as_text(value):
+    return None if value is None else str(value)
+
+
+def write_rows_artifact(rows, path, chunk_size: int = 1000, columns: tuple = RAW_ROW_COLUMNS) -> dict:
+    """
+    Function responsible for writing the raw rows of step 1 to a Parquet file, one row group per chunk.
+
+    Rows can come from a generator, only ``chunk_size`` of them are held in memory while writing.
+
+    :param rows: iterable of raw rows.
+    :param path:
+    :param chunk_size: rows per row group.
+    :param columns: columns written, keys of the rows not listed are dropped.
+    :return: reference to the artifact, small enough for a work item payload.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    schema = raw_rows_schema(columns)
+    temporary_path = path.with_name(f"{path.name}.tmp")
+    total_rows = 0
+    dropped_columns = set()
+    rows = iter(rows)
+    with pq.ParquetWriter(temporary_path, schema, compression='zstd') as writer:
+        while True:
+            chunk = list(itertools.islice(rows, chunk_size))
+            if len(chunk) == 0:
+                break
+            for row in chunk:
+                dropped_columns.update(key for key in row.keys() if key not in columns)
+            writer.write_table(pa.table({column: [_as_text(row.get(column)) for row in chunk]
+                                         for column in columns}, schema=schema))
+            total_rows += len(chunk)
+    os.replace(temporary_path, path)
+    if len(dropped_columns) != 0:
+        logging.warning(f"[Artifact] Columns not in the schema were not written: {sorted(dropped_columns)}")
+    logging.info(f"[Artifact] Wrote {total_rows} rows to {path} ({path.stat().st_size} bytes)")
+    return {'format': ARTIFACT_FORMAT, 'schema_version': ARTIFACT_SCHEMA_VERSION, 'file_name': path.name,
+            'path': str(path), 'rows': total_rows, 'columns': list(columns)}
+
+
+def is_artifact_reference(value) -> bool:
+    return isinstance(value, dict) and value.get('format') == ARTIFACT_FORMAT and 'schema_version' in value
+
+
+def _open_artifact(reference: dict) -> pq.ParquetFile:
+    if reference['schema_version'] != ARTIFACT_SCHEMA_VERSION:
+        raise ArtifactSchemaMismatch(f"Artifact {reference['path']} has schema version {reference['schema_version']}, "
+                                     f"expected {ARTIFACT_SCHEMA_VERSION}")
+    parquet_file = pq.ParquetFile(reference['path'])
+    file_version = (parquet_file.schema_arrow.metadata or {}).get(SCHEMA_VERSION_KEY)
+    if file_version != str(ARTIFACT_SCHEMA_VERSION).encode():
+        raise ArtifactSchemaMismatch(f"Artifact {reference['path']} was written with schema version {file_version}")
+    return parquet_file
+
+
+def read_artifact_columns(reference: dict, columns: list = None) -> dict:
+    """
+    Function responsible for reading an artifact one column at a time.
+
+    :param reference: returned by ``write_rows_artifact``.
+    :param columns: columns to read, all of them when None.
+    :return: dict column -> list of values.
+    """
+    parquet_file = _open_artifact(reference)
+    columns = columns or parquet_file.schema_arrow.names
+    return {column: parquet_file.read(columns=[column]).column(0).to_pylist() for column in columns}
+
+
+def read_rows_artifact(reference: dict, columns: list = None) -> list:
+    """
+    Function responsible for turning an artifact back into the raw rows of step 1.
+
+    :param reference: returned by ``write_rows_artifact``.
+    :param columns:
+    :return: list of rows.
+    """
+    data = read_artifact_columns(reference, columns)
+    names = list(data.keys())
+    return [dict(zip(names, values)) for values in zip(*data.values())]
@@ -0,0 +1,235 @@
+import datetime
+import functools
+import logging
+import re
+from collections import Counter, defaultdict
+
+import pandas as pd
+
+DATE_FORMATS = (
+    "%B %d, %Y at %I:%M %p",  # e.g., August 17, 2024 at 6:23 PM
+    "%Y-%m-%d",  # e.g., 2024-08-17
+    "%A, %B %d, %Y, %I:%M %p",  # e.g., Saturday, August 17, 2024, 6:47 PM
+    "%b %d, %Y",  # e.g., Aug 8, 2024
+    "%B %d, %Y",  # e.g., August 17, 2024
+    "%b %d, %YModified %b %d, %Y",  # e.g., Published Jul 18, 2024Modified Jul 19, 2024
+)
+TIMESTAMP_FORMAT = 'timestamp_ms'
+
+# Abbreviated weekday in front of the date, e.g. "Sat, August 17, 2024 at 6:23 PM".
+WEEKDAY_PREFIX = re.compile(r'^(mon|tue|wed|thu|fri|sat|sun),\s*', re.IGNORECASE)
+PUBLISHED_MODIFIED = re.compile(r"(Published|Modified)\s*")
+
+
+def clean_date_text(value):
+    """
+    Function responsible for removing what surrounds the date in the scraped text.
+
+    "Sat, August 17, 2024 at 6:23 PM·3 min read" -> "August 17, 2024 at 6:23 PM"
+    "Published Jul 18, 2024Modified Jul 19, 2024" -> "Jul 18, 2024"
+
+    :param value:
+    :return:
+    """
+    date_str = str(value)
+    if '·' in date_str:
+        date_str = date_str.split('·')[0].strip()
+    elif 'Published' in date_str:
+        date_str = date_str.split('Published')[1].strip()
+        if 'Modified' in date_str:
+            date_str = date_str.split('Modified')[0].strip()
+    return WEEKDAY_PREFIX.sub('', date_str).strip()
+
+
+class DateParser:
+    """
+    Date parser that learns the formats used by every source.
+
+    Formats are tried in order of past successes for the row's source, so after a few rows the first
+    attempt is almost always the right one. Results are memoized per string, columns are parsed with one
+    ``pd.to_datetime(format=...)`` call per source and only the values it can't read go through the
+    format list. Parsed, missing and failed values are counted per source.
+    """
+
+    def __init__(self, formats: tuple = DATE_FORMATS, cache_size: int = 4096):
+        """
+        :param formats: ``strptime`` formats, in the order used for unknown sources.
+        :param cache_size: distinct strings remembered.
+        """
+        self.formats = tuple(formats)
+        self.format_hits = defaultdict(Counter)
+        self.counts = defaultdict(Counter)
+        self._parse_text = functools.lru_cache(maxsize=cache_size)(self._parse_text_uncached)
+
+    def formats_for(self, source: str = None) -> list:
+        """
+        Function responsible for returning the formats of a source, the most successful first.
+
+        :param source:
+        :return:
+        """
+        hits = self.format_hits[source]
+        return sorted(self.formats, key=lambda date_format: -hits[date_format])
+
+    def _parse_text_uncached(self, date_str: str, source: str):
+        # Case where date is a timestamp in milliseconds
+        if date_str.isdigit():
+            return datetime.datetime.fromtimestamp(int(date_str) / 1000), TIMESTAMP_FORMAT
+        for date_format in self.formats_for(source):
+            try:
+                return datetime.datetime.strptime(date_str, date_format), date_format
+            except ValueError:
+                continue
+        # Handle "Published" and "Modified" dates with keywords
+        if "Published" in date_str or "Modified" in date_str:
+            return self._parse_text(PUBLISHED_MODIFIED.sub("", date_str), source)
+        return None, None
+
+    def parse(self, value, source: str = None):
+        """
+        Function responsible for parsing one scraped date.
+
+        :param value: text of the date element.
+        :param source:
+        :return: datetime or None.
+        """
+        if value is None:
+            self.counts[source]['missing'] += 1
+            return None
+        try:
+            result, date_format = self._parse_text(clean_date_text(value), source)
+        except (ValueError, OverflowError, OSError):
+            result, date_format = None, None
+        if result is None:
+            self.counts[source]['failed'] += 1
+            return None
+        self.counts[source]['parsed'] += 1
+        self.format_hits[source][date_format] += 1
+        return result
+
+    def parse_column(self, values: list, sources: list) -> list:
+        """
+        Function responsible for parsing a whole date column.
+
+        Values of each source are first parsed with one ``pd.to_datetime`` call using the learned format
+        of the source; the values it can't read fall back to ``parse``.
+
+        :param values: texts of the date elements.
+        :param sources: source of every value.
+        :return: list of datetime or None, in the order of ``values``.
+        """
+        results = [None] * len(values)
+        positions_by_source = defaultdict(list)
+        for position, source in enumerate(sources):
+            positions_by_source[source].append(position)
+
+        for source, positions in positions_by_source.items():
+            pending = [position for position in positions if values[position] is not None]
+            self.counts[source]['missing'] += len(positions) - len(pending)
+            if len(self.format_hits[source]) == 0 and len(pending) != 0:
+                # The first value of an unknown source teaches its format.
+                results[pending[0]] = self.parse(values[pending[0]], source)
+                pending = pending[1:]
+            best_format = self.formats_for(source)[0]
+            if self.format_hits[source][best_format] > 0 and len(pending) != 0:
+                texts = pd.Series([clean_date_text(values[position]) for position in pending])
+                try:
+                    parsed = pd.to_datetime(texts, format=best_format, errors='coerce')
+                except ValueError:
+                    parsed = [pd.NaT] * len(pending)
+                missed = []
+                for position, timestamp in zip(pending, parsed):
+                    if pd.isna(timestamp):
+                        missed.append(position)
+                    else:
+                        results[position] = timestamp.to_pydatetime()
+                parsed_count = len(pending) - len(missed)
+                self.counts[source]['parsed'] += parsed_count
+                self.format_hits[source][best_format] += parsed_count
+                pending = missed
+            for position in pending:
+                results[position] = self.parse(values[position], source)
+        return results
+
+    def stats(self) -> dict:
+        """
+        Parsed, missing and failed dates per source, with the formats that matched.
+
+        :return:
+        """
+        sources = set(self.counts.keys()) | set(self.format_hits.keys())
+        return {source: {'parsed': self.counts[source]['parsed'], 'missing': self.counts[source]['missing'],
+                         'failed': self.counts[source]['failed'], 'formats': dict(self.format_hits[source])}
+                for source in sources}
+
+    def log_summary(self):
+        for source, source_stats in self.stats().items():
+            message = f"[Dates] {source} | {source_stats}"
+            if source_stats['failed'] != 0:
+                logging.warning(message)
+            else:
+                logging.info(message)
+
+
+RELATIVE_DATE = re.compile(r'^(\d+)\s*(minute|min|hour|hr|day|week|month|year)s?\s+ago$', re.IGNORECASE)
+RELATIVE_UNITS = {'minute': datetime.timedelta(minutes=1), 'min': datetime.timedelta(minutes=1),
+                  'hour': datetime.timedelta(hours=1), 'hr': datetime.timedelta(hours=1),
+                  'day': datetime.timedelta(days=1), 'week': datetime.timedelta(weeks=1),
+                  'month': datetime.timedelta(days=30), 'year': datetime.timedelta(days=365)}
+
+# Dates written in article urls, e.g. /news/2024/8/1/title or /2024-08-01-title.
+URL_DATES = (re.compile(r'/(\d{4})/(\d{1,2})/(\d{1,2})(?:/|$)'),
+             re.compile(r'[/_-](\d{4})-(\d{2})-(\d{2})(?:[/_.-]|$)'))
+
+
+def relative_date(value, now: datetime.datetime = None):
+    """
+    Function responsible for reading the relative dates of search pages: "3 hours ago", "2 days ago", "yesterday".
+
+    :param value:
+    :param now: defaults to the current time.
+    :return: datetime or None.
+    """
+    now = datetime.datetime.now() if now is None else now
+    text = clean_date_text(value).lower()
+    if text in ('just now', 'today'):
+        return now
+    if text == 'yesterday':
+        return now - datetime.timedelta(days=1)
+    match = RELATIVE_DATE.match(text)
+    if match is None:
+        return None
+    return now - int(match.group(1)) * RELATIVE_UNITS[match.group(2).lower()]
+
+
+def date_from_url(url: str):
+    """
+    Function responsible for reading the publication date written in the path of an article url.
+
+    :param url:
+    :return: datetime or None.
+    """
+    for pattern in URL_DATES:
+        match = pattern.search(url)
+        if match is not None:
+            try:
+                return datetime.datetime(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+            except ValueError:
+                continue
+    return None
+
+
+def months_back_start(months_back: int, now: datetime.datetime = None) -> datetime.datetime:
+    """
+    Function responsible for the oldest date kept by ``max_months``: the first day of the current month,
+    ``months_back - 1`` months earlier.
+
+    :param months_back:
+    :param now: defaults to the current time.
+    :return:
+    """
+    current_date = datetime.datetime.now() if now is None else now
+    first_day_of_current_month = current_date.replace(day=1)
+    if months_back <= 1:
+        return first_day_of_current_month
+    return (first_day_of_current_month - pd.DateOffset(months=months_back - 1)).to_pydatetime()
@@ -0,0 +1,277 @@
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+
+import click
+import numpy as np
+
+VECTORS_FILE = 'vectors.f32'
+INDEX_FILE = 'index.jsonl'
+META_FILE = 'meta.json'
+
+
+class EmbeddingStoreMismatch(ValueError):
+    """Raised when a store was written by another model or model version."""
+
+
+class EmbeddingStore:
+    """
+    Persistent embedding store keyed by article url and content hash.
+
+    Vectors are appended to a raw float32 file that is read back through ``np.memmap``, so stored
+    embeddings are returned as views of the file instead of copies. ``index.jsonl`` maps every
+    (url, content hash) to its row, the last line of an url wins, and ``meta.json`` records the model
+    that produced the vectors. Rows superseded by a newer version of an article are removed by ``compact``,
+    which writes the next generation of both data files and switches ``meta.json`` to it.
+    """
+
+    def __init__(self, folder, model_name: str, model_version: str, reset_on_mismatch: bool = False):
+        """
+        :param folder:
+        :param model_name:
+        :param model_version:
+        :param reset_on_mismatch: delete the stored vectors instead of raising when the model changed.
+        """
+        self.folder = Path(folder)
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.model_name = model_name
+        self.model_version = model_version
+        self.meta = self._read_meta()
+        if self.meta is not None and (self.meta['model'], self.meta['model_version']) != (model_name, model_version):
+            message = (f"Embedding store {self.folder} was built with {self.meta['model']} "
+                       f"{self.meta['model_version']}, not {model_name} {model_version}")
+            if not reset_on_mismatch:
+                raise EmbeddingStoreMismatch(message)
+            logging.warning(f"{message}. Resetting it.")
+            self.reset()
+        if self.meta is None:
+            self.meta = {'model': model_name, 'model_version': model_version, 'dimension': None,
+                         'dtype': 'float32', 'rows': 0}
+            self._write_meta()
+
+        self.index = {}
+        self._load_index()
+        self._matrix = None
+        self._pending = []
+        self._repair()
+
+    @staticmethod
+    def content_hash(text: str) -> str:
+        return hashlib.sha256(str(text).encode('utf-8')).hexdigest()
+
+    def _path(self, file_name: str, generation: int = None) -> Path:
+        """
+        Function responsible for the path of a data file of a generation, the one in ``meta.json`` by default.
+        Generation 0 keeps the plain file names.
+
+        :param file_name: VECTORS_FILE or INDEX_FILE.
+        :param generation:
+        :return:
+        """
+        if generation is None:
+            generation = (self.meta or {}).get('generation', 0)
+        if generation == 0:
+            return self.folder / file_name
+        stem, suffix = file_name.split('.', 1)
+        return self.folder / f"{stem}.{generation}.{suffix}"
+
+    def _read_meta(self):
+        meta_path = self.folder / META_FILE
+        if not meta_path.exists():
+            return None
+        return json.loads(meta_path.read_text(encoding='utf-8'))
+
+    def _write_meta(self):
+        temporary_path = self.folder / f"{META_FILE}.tmp"
+        temporary_path.write_text(json.dumps(self.meta), encoding='utf-8')
+        os.replace(temporary_path, self.folder / META_FILE)
+
+    def _load_index(self):
+        self._orphan_lines = 0
+        index_path = self._path(INDEX_FILE)
+        if not index_path.exists():
+            return
+        with open(index_path, 'r', encoding='utf-8') as index_file:
+            for line in index_file:
+                if line.strip() == '':
+                    continue
+                entry = json.loads(line)
+                # A row missing from meta.json comes from an interrupted flush.
+                if entry['row'] < self.meta['rows']:
+                    self.index[entry['url']] = (entry['content_hash'], entry['row'])
+                else:
+                    self._orphan_lines += 1
+
+    def _repair(self):
+        """
+        Function responsible for dropping what an interrupted flush left after the last committed row, and the
+        data files an interrupted compaction left.
+
+        :return:
+        """
+        current_paths = {self._path(VECTORS_FILE), self._path(INDEX_FILE)}
+        # Data files of another generation are left by an interrupted compaction.
+        for path in [*self.folder.glob('vectors*.f32'), *self.folder.glob('index*.jsonl')]:
+            if path not in current_paths:
+                path.unlink()
+        vectors_path = self._path(VECTORS_FILE)
+        expected_size = self.meta['rows'] * (self.meta['dimension'] or 0) * 4
+        if vectors_path.exists() and vectors_path.stat().st_size > expected_size:
+            with open(vectors_path, 'r+b') as vectors_file:
+                vectors_file.truncate(expected_size)
+        if self._orphan_lines > 0:
+            with open(self._path(INDEX_FILE), 'w', encoding='utf-8') as index_file:
+                for url, (content_hash, row) in sorted(self.index.items(), key=lambda x: x[1][1]):
+                    index_file.write(json.dumps({'url': url, 'content_hash': content_hash, 'row': row}) + '\n')
+            self._orphan_lines = 0
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """
+        Read-only memory map over every stored vector, shape (rows, dimension).
+
+        :return:
+        """
+        if self._matrix is None:
+            rows, dimension = self.meta['rows'], self.meta['dimension']
+            if rows == 0 or not dimension:
+                self._matrix = np.zeros((rows, dimension or 0), dtype=np.float32)
+            else:
+                self._matrix = np.memmap(self._path(VECTORS_FILE), dtype=np.float32, mode='r',
+                                         shape=(rows, dimension))
+        return self._matrix
+
+    def __len__(self):
+        return len(self.index)
+
+    def get(self, url: str, content_hash: str = None):
+        """
+        Function responsible for returning the stored vector of an article, without copying it.
+
+        :param url:
+        :param content_hash: when given, a vector computed from other content is ignored.
+        :return: 1-D view of the memory map or None.
+        """
+        entry = self.index.get(url)
+        if entry is None:
+            return None
+        stored_hash, row = entry
+        if content_hash is not None and stored_hash != content_hash:
+            return None
+        return self.matrix[row]
+
+    def add(self, url: str, content_hash: str, vector):
+        """
+        Function responsible for queueing a vector, written to disk by ``flush``.
+
+        :param url:
+        :param content_hash:
+        :param vector:
+        :return:
+        """
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        if self.meta['dimension'] is None:
+            self.meta['dimension'] = int(vector.shape[0])
+        if vector.shape[0] != self.meta['dimension']:
+            raise ValueError(f"Expected vectors of dimension {self.meta['dimension']}, got {vector.shape[0]}")
+        self._pending.append((url, content_hash, vector))
+
+    def flush(self):
+        """
+        Function responsible for appending the queued vectors and their index lines.
+
+        The vectors are written before the index and ``meta.json`` is updated last, so an interrupted
+        flush leaves the previous state readable.
+
+        :return:
+        """
+        if len(self._pending) == 0:
+            return
+        first_row = self.meta['rows']
+        with open(self._path(VECTORS_FILE), 'ab') as vectors_file:
+            for _, _, vector in self._pending:
+                vectors_file.write(vector.tobytes())
+        with open(self._path(INDEX_FILE), 'a', encoding='utf-8') as index_file:
+            for offset, (url, content_hash, _) in enumerate(self._pending):
+                index_file.write(json.dumps({'url': url, 'content_hash': content_hash,
+                                             'row': first_row + offset}) + '\n')
+                self.index[url] = (content_hash, first_row + offset)
+        self.meta['rows'] = first_row + len(self._pending)
+        self._write_meta()
+        self._pending = []
+        self._matrix = None
+
+    def compact(self) -> int:
+        """
+        Function responsible for rewriting the store without the superseded rows.
+
+        The rows are written to the data files of the next generation and ``meta.json`` is switched to them last,
+        so an interrupted compaction leaves the previous generation readable.
+
+        :return: number of rows removed.
+        """
+        self.flush()
+        removed = self.meta['rows'] - len(self.index)
+        if removed == 0:
+            return 0
+        generation = self.meta.get('generation', 0) + 1
+        new_paths = {file_name: self._path(file_name, generation) for file_name in (VECTORS_FILE, INDEX_FILE)}
+        old_paths = [self._path(file_name) for file_name in (VECTORS_FILE, INDEX_FILE)]
+
+        matrix = self.matrix
+        new_index = {}
+        with open(new_paths[VECTORS_FILE], 'wb') as vectors_file, \
+                open(new_paths[INDEX_FILE], 'w', encoding='utf-8') as index_file:
+            for new_row, (url, (content_hash, row)) in enumerate(sorted(self.index.items(), key=lambda x: x[1][1])):
+                vectors_file.write(np.asarray(matrix[row]).tobytes())
+                index_file.write(json.dumps({'url': url, 'content_hash': content_hash, 'row': new_row}) + '\n')
+                new_index[url] = (content_hash, new_row)
+
+        self._matrix = None
+        del matrix
+        self.meta = dict(self.meta, generation=generation, rows=len(new_index))
+        self._write_meta()
+        self.index = new_index
+        for path in old_paths:
+            path.unlink(missing_ok=True)
+        logging.info(f"[EmbeddingStore] Compacted {self.folder}, removed {removed} rows.")
+        return removed
+
+    def reset(self):
+        for path in [*self.folder.glob('vectors*.f32'), *self.folder.glob('index*.jsonl'), self.folder / META_FILE]:
+            path.unlink(missing_ok=True)
+        self.meta = None
+        self.index = {}
+        self._matrix = None
+        self._pending = []
+
+
+@click.group()
+def cli():
+    """Maintenance commands for the embedding store."""
+
+
+@cli.command()
+@click.argument('folder', type=click.Path(exists=True, file_okay=False))
+def compact(folder):
+    """Remove superseded vectors from the store in FOLDER."""
+    meta = json.loads((Path(folder) / META_FILE).read_text(encoding='utf-8'))
+    store = EmbeddingStore(folder, model_name=meta['model'], model_version=meta['model_version'])
+    removed = store.compact()
+    click.echo(f"Removed {removed} rows, {len(store)} left.")
+
+
+@cli.command()
+@click.argument('folder', type=click.Path(exists=True, file_okay=False))
+def info(folder):
+    """Show the model, dimension and size of the store in FOLDER."""
+    meta = json.loads((Path(folder) / META_FILE).read_text(encoding='utf-8'))
+    store = EmbeddingStore(folder, model_name=meta['model'], model_version=meta['model_version'])
+    click.echo(f"model={meta['model']} version={meta['model_version']} dimension={meta['dimension']} "
+               f"rows={meta['rows']} articles={len(store)}")
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,321 @@
+import csv
+import datetime
+import itertools
+import json
+import logging
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_OUTPUT_FORMATS = ('xlsx',)
+
+# Columns only used while filtering, they are never exported.
+EXCLUDED_COLUMNS = ('embedding', 'similarities')
+
+# Key of the DataFrame index in the rows of export_dataframe, only the workbook writes it, as DataFrame.to_excel does.
+INDEX_COLUMN = ''
+
+# Parquet types of the columns that are not text, every other column is written as a string.
+PARQUET_COLUMN_TYPES = {
+    'monetary_amount': 'float64',
+    'contains_monetary': 'bool',
+    'query': 'int64',
+}
+
+
+def plain_value(value):
+    """
+    Function responsible for turning a value of a row into a plain Python value: numpy scalars become numbers,
+    dates ISO strings and NaN/NaT None.
+
+    :param value:
+    :return:
+    """
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (list, tuple, dict)):
+        return value
+    if value is None or pd.isna(value):
+        return None
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return value
+
+
+def text_value(value):
+    """Plain value for formats without nested values (CSV, xlsx), lists and dicts are written as JSON."""
+    value = plain_value(value)
+    if isinstance(value, (list, tuple, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+class RowExporter:
+    """
+    Writes rows one at a time to a file of one format. The file is written aside and renamed by ``close``,
+    a reader never sees half a file.
+    """
+
+    extension = None
+    # True when the file has the unnamed index column first, like DataFrame.to_excel.
+    writes_index = False
+
+    def __init__(self, path, columns: list):
+        self.path = Path(path)
+        self.columns = [column for column in columns if column != INDEX_COLUMN or self.writes_index]
+        self.temporary_path = self.path.with_name(f"{self.path.name}.tmp")
+        self.rows = 0
+
+    def write(self, row: dict):
+        self.rows += 1
+
+    def _finish(self):
+        pass
+
+    def close(self):
+        self._finish()
+        os.replace(self.temporary_path, self.path)
+
+    def abort(self):
+        try:
+            self._finish()
+        finally:
+            self.temporary_path.unlink(missing_ok=True)
+
+
+class JsonLinesExporter(RowExporter):
+    extension = 'jsonl'
+
+    def __init__(self, path, columns: list):
+        super().__init__(path, columns)
+        self.file = open(self.temporary_path, 'w', encoding='utf-8')
+
+    def write(self, row: dict):
+        super().write(row)
+        self.file.write(json.dumps({column: plain_value(row.get(column)) for column in self.columns},
+                                   ensure_ascii=False))
+        self.file.write('\n')
+
+    def _finish(self):
+        self.file.close()
+
+
+class JsonExporter(JsonLinesExporter):
+    """One JSON document ``{"results": [row, ...]}``, written row by row like JSON Lines."""
+
+    extension = 'json'
+
+    def __init__(self, path, columns: list):
+        super().__init__(path, columns)
+        self.file.write('{"results": [')
+
+    def write(self, row: dict):
+        if self.rows != 0:
+            self.file.write(', ')
+        self.rows += 1
+        self.file.write(json.dumps({column: plain_value(row.get(column)) for column in self.columns},
+                                   ensure_ascii=False))
+
+    def _finish(self):
+        if not self.file.closed:
+            self.file.write(']}\n')
+        super()._finish()
+
+
+class CsvExporter(RowExporter):
+    extension = 'csv'
+
+    def __init__(self, path, columns: list):
+        super().__init__(path, columns)
+        self.file = open(self.temporary_path, 'w', encoding='utf-8', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(self.columns)
+
+    def write(self, row: dict):
+        super().write(row)
+        self.writer.writerow([text_value(row.get(column)) for column in self.columns])
+
+    def _finish(self):
+        self.file.close()
+
+
+class XlsxExporter(RowExporter):
+    """openpyxl write-only workbook: rows are streamed to disk instead of building every cell in memory."""
+
+    extension = 'xlsx'
+    writes_index = True
+
+    def __init__(self, path, columns: list):
+        # openpyxl is only imported by the runs that write xlsx.
+        from openpyxl import Workbook
+        from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+        super().__init__(path, columns)
+        self.illegal_characters = ILLEGAL_CHARACTERS_RE
+        self.workbook = Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet('Sheet1')
+        self.sheet.append([None if column == INDEX_COLUMN else column for column in self.columns])
+
+    def write(self, row: dict):
+        super().write(row)
+        values = []
+        for column in self.columns:
+            value = text_value(row.get(column))
+            if isinstance(value, str):
+                # Control characters scraped from pages are not allowed in a worksheet.
+                value = self.illegal_characters.sub('', value)
+            values.append(value)
+        self.sheet.append(values)
+
+    def _finish(self):
+        if self.workbook is not None:
+            self.workbook.save(self.temporary_path)
+            self.workbook = None
+
+
+class ParquetExporter(RowExporter):
+    """
+    Zstandard-compressed Parquet, one row group per ``chunk_size`` rows. The schema is declared before the first
+    row from PARQUET_COLUMN_TYPES, a column empty in the first rows can still hold values later.
+    """
+
+    extension = 'parquet'
+
+    def __init__(self, path, columns: list, chunk_size: int = 1000, column_types: dict = None):
+        # pyarrow is only imported by the runs that write Parquet.
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        super().__init__(path, columns)
+        self.chunk_size = chunk_size
+        self.chunk = []
+        column_types = PARQUET_COLUMN_TYPES if column_types is None else column_types
+        self.text_columns = [column for column in self.columns if column not in column_types]
+        self.schema = pa.schema([pa.field(column, column_types.get(column, 'string')) for column in self.columns])
+        self.writer = pq.ParquetWriter(self.temporary_path, self.schema, compression='zstd')
+
+    def write(self, row: dict):
+        super().write(row)
+        values = {column: text_value(row.get(column)) for column in self.columns}
+        for column in self.text_columns:
+            if values[column] is not None and not isinstance(values[column], str):
+                values[column] = str(values[column])
+        self.chunk.append(values)
+        if len(self.chunk) >= self.chunk_size:
+            self._write_chunk()
+
+    def _write_chunk(self):
+        import pyarrow as pa
+
+        self.writer.write_table(pa.Table.from_pylist(self.chunk, schema=self.schema))
+        self.chunk = []
+
+    def _finish(self):
+        if self.writer is not None:
+            if len(self.chunk) != 0:
+                self._write_chunk()
+            self.writer.close()
+            self.writer = None
+
+
+EXPORTERS = {exporter.extension: exporter for exporter in (XlsxExporter, JsonLinesExporter, ParquetExporter,
+                                                             CsvExporter, JsonExporter)}
+
+
+def output_formats(value=None) -> list:
+    """
+    Function responsible for reading the ``output_formats`` of a run: a list or a comma separated string of
+    EXPORTERS keys.
+
+    :param value: None for DEFAULT_OUTPUT_FORMATS.
+    :return:
+    """
+    if value is None:
+        return list(DEFAULT_OUTPUT_FORMATS)
+    if isinstance(value, str):
+        value = value.split(',')
+    formats = []
+    for output_format in value:
+        output_format = str(output_format).strip().lower().lstrip('.')
+        if output_format in EXPORTERS:
+            if output_format not in formats:
+                formats.append(output_format)
+        elif output_format != '':
+            logging.warning(f"[Export] Unknown format {output_format}, expected one of {list(EXPORTERS)}")
+    return formats
+
+
+def dataframe_rows(df: pd.DataFrame, index: bool = False):
+    """
+    Function responsible for yielding the rows of a DataFrame as dicts, one at a time.
+
+    :param df:
+    :param index: the index value is added under INDEX_COLUMN.
+    :return:
+    """
+    columns = [INDEX_COLUMN] + list(df.columns) if index else list(df.columns)
+    for values in df.itertuples(index=index, name=None):
+        yield dict(zip(columns, values))
+
+
+def export_rows(rows, folder, name: str, formats: list, columns: list = None,
+                exclude_columns: tuple = EXCLUDED_COLUMNS) -> dict:
+    """
+    Function responsible for writing rows to ``<folder>/<name>.<format>`` in every format at once.
+    Rows can come from a generator, they are read once and never held together in memory.
+
+    :param rows: iterable of dicts.
+    :param folder:
+    :param name: file name without extension.
+    :param formats: keys of EXPORTERS.
+    :param columns: columns written, in order. Keys of the first row when None.
+    :param exclude_columns: columns never written.
+    :return: dict format -> path of the file written.
+    """
+    rows = iter(rows)
+    if columns is None:
+        first_rows = list(itertools.islice(rows, 1))
+        columns = list(first_rows[0].keys()) if len(first_rows) != 0 else []
+        rows = itertools.chain(first_rows, rows)
+    columns = [column for column in columns if column not in exclude_columns]
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    exporters = []
+    try:
+        for output_format in formats:
+            exporters.append(EXPORTERS[output_format](folder / f"{name}.{output_format}", columns))
+        for row in rows:
+            for exporter in exporters:
+                exporter.write(row)
+    except BaseException:
+        for exporter in exporters:
+            exporter.abort()
+        raise
+    paths = {}
+    for exporter in exporters:
+        exporter.close()
+        paths[exporter.extension] = str(exporter.path)
+    if len(exporters) != 0:
+        logging.info(f"[Export] Wrote {exporters[0].rows} rows to {list(paths.values())}")
+    return paths
+
+
+def export_dataframe(df: pd.DataFrame, folder, name: str, formats: list,
+                     exclude_columns: tuple = EXCLUDED_COLUMNS) -> dict:
+    """
+    Function responsible for writing a DataFrame with ``export_rows``, without copying it to a list of dicts.
+    The workbook keeps the layout of ``DataFrame.to_excel``, with the index as first column.
+
+    :param df:
+    :param folder:
+    :param name:
+    :param formats:
+    :param exclude_columns:
+    :return: dict format -> path of the file written.
+    """
+    return export_rows(dataframe_rows(df, index=True), folder, name, formats,
+                       columns=[INDEX_COLUMN] + list(df.columns), exclude_columns=exclude_columns)
@@ -0,0 +1,201 @@
+import hashlib
+import json
+import logging
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml  # noqa: F401
+
+    DEFAULT_PARSER = 'lxml'
+except ImportError:
+    DEFAULT_PARSER = 'html.parser'
+
+
+def _class_prefix_matcher(prefix: str):
+    def matches(class_value):
+        return class_value is not None and class_value.startswith(prefix)
+
+    return matches
+
+
+class ExtractionPlan:
+    """
+    Compiled version of the ``listing_steps`` and ``extraction_steps`` of one source.
+
+    The plan is built once per source and reused for every page. Article pages are parsed with a
+    ``SoupStrainer`` that only keeps the tag types the steps look for (plus ``p`` for description and
+    full text); the class-prefix fallback of a step needs the whole page, so the full tree is only built
+    when a strict lookup misses. Search pages only keep the elements of the listing step and what is inside
+    them (links and listed dates). The extracted values are the same ``NewsDataExtractor.parse_each_news``
+    produced with ``html.parser``.
+    """
+
+    def __init__(self, source: str, config: dict, parser: str = DEFAULT_PARSER):
+        self.source = source
+        self.domain = config.get('domain', '')
+        self.parser = parser
+        # Rows stored by a plan with other extraction steps are parsed again.
+        self.version = hashlib.sha256(json.dumps([config.get('extraction_steps', []), parser],
+                                                 sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+        self.listing_steps = []
+        for step in config.get('listing_steps', []):
+            class_name = step['loc'].get('class')
+            self.listing_steps.append({
+                'type': step['type'], 'loc': step['loc'],
+                'class_matcher': _class_prefix_matcher(class_name) if class_name is not None else None})
+
+        self.listing_strainer = None
+        if len(self.listing_steps) != 0:
+            step = self.listing_steps[0]
+            # The class-prefix lookup also finds every element of the strict lookup, one strainer serves both.
+            self.listing_strainer = (SoupStrainer(class_=step['class_matcher']) if step['class_matcher'] is not None
+                                     else SoupStrainer(step['type'], step['loc']))
+
+        # Date shown next to every result of the search page, used to skip old articles before downloading them.
+        self.listing_date_step = config.get('listing_date_step')
+
+        self.extraction_steps = []
+        for step in config.get('extraction_steps', []):
+            class_name = step['loc'].get('class')
+            self.extraction_steps.append({
+                'column_name': step['column_name'], 'type': step['type'], 'loc': step['loc'],
+                'class_matcher': _class_prefix_matcher(class_name) if class_name is not None else None})
+
+        article_tags = sorted({step['type'] for step in self.extraction_steps} | {'p'})
+        self.article_strainer = SoupStrainer(article_tags)
+
+    @property
+    def has_extraction_steps(self):
+        return len(self.extraction_steps) != 0
+
+    @property
+    def column_names(self):
+        return [step['column_name'] for step in self.extraction_steps]
+
+    def parse_listing(self, html) -> list:
+        """
+        Function responsible for returning every news url of a search page, in page order.
+
+        :param html:
+        :return:
+        """
+        return [url for url, _ in self.parse_listing_entries(html)]
+
+    def parse_listing_entries(self, html) -> list:
+        """
+        Function responsible for returning every news url of a search page with the date listed next to it.
+
+        :param html:
+        :return: list of (url, date text or None), in page order.
+        """
+        news_url_found = []
+        if len(self.listing_steps) == 0 or html is None:
+            return news_url_found
+        # TODO: Add tolerance to accept not only class
+        step = self.listing_steps[0]
+        soup = BeautifulSoup(html, self.parser, parse_only=self.listing_strainer)
+        elements = []
+        if step['class_matcher'] is not None:
+            elements = soup.find_all(class_=step['class_matcher'])
+        if len(elements) == 0:
+            elements = soup.find_all(step['type'], step['loc'])
+        for element in elements:
+            date_text = self.listing_date(element)
+            links = element.find_all('a', href=True)
+            http_urls = [a['href'] for a in links if a['href'].startswith('https')]
+            if len(http_urls) != 0:
+                news_url_found = news_url_found + [(url, date_text) for url in http_urls]
+            else:
+                # Another way to get urls, not that safe but works.
+                for a in links:
+                    if str(a['href'])[0] == '/':
+                        divider = ""
+                    else:
+                        divider = "/"
+                    news_url_found.append((f"{self.domain}/{divider}{a['href']}", date_text))
+        return news_url_found
+
+    def listing_date(self, element):
+        """
+        Function responsible for reading the date of one search result, its ``datetime`` attribute or its text.
+
+        :param element: element of the listing step.
+        :return: date text or None.
+        """
+        if self.listing_date_step is None:
+            return None
+        date_element = element.find(self.listing_date_step['type'], self.listing_date_step['loc'])
+        if date_element is None:
+            return None
+        date_text = date_element.get('datetime') or date_element.text.strip()
+        return date_text if date_text != '' else None
+
+    def parse_article(self, url: str, html):
+        """
+        Function responsible for extracting one row from an article page.
+
+        :param url:
+        :param html:
+        :return: the row, or None when the source has no extraction steps.
+        """
+        if not self.has_extraction_steps:
+            logging.info(f"[Parse] {self.source} has no extraction steps, skipping {url}")
+            return None
+        generated_row = {'url': url, 'source': self.source}
+        soup = BeautifulSoup(html, self.parser, parse_only=self.article_strainer)
+        full_soup = None
+        for step in self.extraction_steps:
+            element = soup.find(step['type'], step['loc'])
+            if element is None and step['class_matcher'] is not None:
+                if full_soup is None:
+                    full_soup = BeautifulSoup(html, self.parser)
+                element = full_soup.find(class_=step['class_matcher'])
+            generated_row[step['column_name']] = None if element is None else self.element_value(
+                step['column_name'], element)
+        return generated_row
+
+    @staticmethod
+    def element_value(column_name: str, element):
+        """
+        Function responsible for reading the value of one column from its element.
+
+        :param column_name:
+        :param element:
+        :return:
+        """
+        if column_name == "title":
+            return element.text
+        elif column_name == "description":
+            next_paragraph = element.find_next('p')
+            return None if next_paragraph is None else next_paragraph.text
+        elif column_name == "full_text":
+            all_p = element.find_all('p')
+            if len(all_p) != 0:
+                paragraphs = [p.text for p in all_p]
+                # Empty paragraphs before the first text are dropped, like the original concatenation did.
+                while len(paragraphs) > 1 and paragraphs[0] == "":
+                    paragraphs.pop(0)
+                return "\n".join(paragraphs)
+            return element.text
+        elif column_name == "date":
+            result = element.get('datetime')
+            if result is None or len(str(result)) == 0:
+                return str(element.text)
+            return str(result)
+        elif column_name == "picture_url":
+            src = element.get('src')
+            return None if src is None else str(src)
+        return str(element.text)
+
+
+def compile_plans(sources_config: dict, parser: str = DEFAULT_PARSER) -> dict:
+    """
+    Function responsible for compiling the extraction plan of every source.
+
+    :param sources_config:
+    :param parser:
+    :return: dict source -> ExtractionPlan
+    """
+    return {source: ExtractionPlan(source, config, parser=parser) for source, config in sources_config.items()}
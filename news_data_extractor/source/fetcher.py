@@ -0,0 +1,132 @@
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class FetchEngine:
+    """
+    Bounded thread pool that runs page downloads concurrently.
+
+    Two limits are applied at the same time: a global cap on requests in flight and a per-source
+    cap, so one slow website can't take every worker. Jobs are plain dicts with at least
+    ``source`` and ``url`` keys (plus optional keyword ``options`` for the fetch function) and results
+    come back in the same order as the jobs. A job that already has its ``result`` (an article taken from the
+    article store) is handed back as soon as it is pulled, without a request.
+    """
+
+    def __init__(self, fetch_function, max_in_flight: int = 16, source_limits: dict = None,
+                 default_source_limit: int = 4):
+        """
+        :param fetch_function: callable(source, url, **options) returning a result dict.
+        :param max_in_flight: maximum number of requests running at the same time.
+        :param source_limits: maximum number of requests in flight per source, e.g. {'apnews': 4}.
+        :param default_source_limit: limit used for sources missing from ``source_limits``.
+        """
+        self.fetch_function = fetch_function
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.source_limits = source_limits or {}
+        self.default_source_limit = max(1, int(default_source_limit))
+
+    @classmethod
+    def from_sources(cls, fetch_function, sources_config: dict, max_in_flight: int = 16):
+        """
+        Creates an engine reading the per-source limits from ``NewsDataExtractor._get_sources()``.
+
+        :param fetch_function:
+        :param sources_config:
+        :param max_in_flight:
+        :return:
+        """
+        source_limits = {}
+        for source, config in sources_config.items():
+            if 'max_concurrency' in config:
+                source_limits[source] = config['max_concurrency']
+        return cls(fetch_function=fetch_function, max_in_flight=max_in_flight, source_limits=source_limits)
+
+    def _source_limit(self, source):
+        return max(1, int(self.source_limits.get(source, self.default_source_limit)))
+
+    def fetch_all(self, jobs: list) -> list:
+        """
+        Fetch every job respecting the global and per-source limits.
+
+        :param jobs: list of dicts with ``source`` and ``url``.
+        :return: list of results, in the same order as ``jobs``.
+        """
+        results = [None] * len(jobs)
+        if len(jobs) == 0:
+            return results
+
+        started_at = time.perf_counter()
+        for position, _, result in self._run(iter(jobs), window=None):
+            results[position] = result
+        logging.info(f"[FetchEngine] {len(jobs)} requests in {time.perf_counter() - started_at:.2f}s "
+                     f"(max_in_flight={self.max_in_flight})")
+        return results
+
+    def iter_fetch(self, jobs, window: int = 32):
+        """
+        Fetch jobs from any iterable and yield them as soon as they finish.
+
+        Jobs are only pulled from ``jobs`` while fewer than ``window`` are waiting or running, so a slow
+        consumer slows the producer down instead of piling up responses in memory.
+
+        :param jobs: iterable of dicts with ``source`` and ``url``.
+        :param window: maximum number of jobs pulled but not yet yielded.
+        :return: generator of (job, result), in completion order.
+        """
+        for _, job, result in self._run(iter(jobs), window=max(1, int(window))):
+            yield job, result
+
+    def _run(self, jobs_iterator, window=None):
+        pending = {}
+        buffered = 0
+        in_flight_per_source = {}
+        running = {}
+        exhausted = False
+        next_position = 0
+
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            while True:
+                while not exhausted and (window is None or buffered < window):
+                    try:
+                        job = next(jobs_iterator)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    if 'result' in job:
+                        yield next_position, job, job['result']
+                        next_position += 1
+                        continue
+                    pending.setdefault(job['source'], deque()).append((next_position, job))
+                    in_flight_per_source.setdefault(job['source'], 0)
+                    next_position += 1
+                    buffered += 1
+
+                # Round-robin over sources so every website gets a fair share of the global slots.
+                submitted = True
+                while submitted and len(running) < self.max_in_flight:
+                    submitted = False
+                    for source in list(pending.keys()):
+                        if len(running) >= self.max_in_flight:
+                            break
+                        if in_flight_per_source[source] >= self._source_limit(source):
+                            continue
+                        position, job = pending[source].popleft()
+                        if len(pending[source]) == 0:
+                            del pending[source]
+                        future = executor.submit(self.fetch_function, job['source'], job['url'],
+                                                 **job.get('options', {}))
+                        running[future] = (position, job)
+                        in_flight_per_source[source] += 1
+                        submitted = True
+
+                if len(running) == 0:
+                    break
+                done, _ = wait(list(running.keys()), return_when=FIRST_COMPLETED)
+                for future in done:
+                    position, job = running.pop(future)
+                    in_flight_per_source[job['source']] -= 1
+                    buffered -= 1
+                    yield position, job, future.result()
@@ -0,0 +1,196 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+# Seconds a cached response is served without asking the website again, per resource type.
+DEFAULT_TTLS = {
+    'search': 15 * 60,
+    'article': 7 * 24 * 3600,
+    'image': 30 * 24 * 3600,
+}
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+class HttpCache:
+    """
+    Content-addressed disk cache for search pages, article pages and images.
+
+    Bodies are stored once per sha256 under ``blobs/`` and a SQLite index maps every url to its blob,
+    validators (ETag / Last-Modified) and access times. Expired entries are revalidated with
+    conditional GETs and the least recently used blobs are evicted when the cache grows past ``max_bytes``.
+    """
+
+    def __init__(self, folder, ttls: dict = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.folder = Path(folder)
+        self.blobs_folder = self.folder / 'blobs'
+        self.blobs_folder.mkdir(parents=True, exist_ok=True)
+        self.ttls = dict(DEFAULT_TTLS)
+        if ttls is not None:
+            self.ttls.update(ttls)
+        self.max_bytes = max_bytes
+        self.stats = {'hits': 0, 'misses': 0, 'revalidated': 0, 'stale': 0, 'stored': 0, 'evicted': 0,
+                      'bytes_saved': 0}
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(self.folder / 'index.sqlite3'), check_same_thread=False)
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                url TEXT PRIMARY KEY,
+                resource_type TEXT,
+                blob TEXT,
+                size INTEGER,
+                headers TEXT,
+                encoding TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL,
+                last_access REAL
+            )""")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+        self._connection.commit()
+
+    def _blob_path(self, blob: str) -> Path:
+        return self.blobs_folder / blob[:2] / blob
+
+    def lookup(self, url: str):
+        """
+        Function responsible for finding the cached entry of an url.
+
+        :param url:
+        :return: dict with the entry columns or None.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT url, resource_type, blob, size, headers, encoding, etag, last_modified, fetched_at "
+                "FROM entries WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        entry = dict(zip(['url', 'resource_type', 'blob', 'size', 'headers', 'encoding', 'etag',
+                          'last_modified', 'fetched_at'], row))
+        entry['headers'] = json.loads(entry['headers'])
+        if not self._blob_path(entry['blob']).exists():
+            return None
+        return entry
+
+    def is_fresh(self, entry: dict) -> bool:
+        ttl = self.ttls.get(entry['resource_type'], 0)
+        return time.time() - entry['fetched_at'] < ttl
+
+    @staticmethod
+    def conditional_headers(entry: dict) -> dict:
+        headers = {}
+        if entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def read(self, entry: dict) -> bytes:
+        return self._blob_path(entry['blob']).read_bytes()
+
+    def record_hit(self, entry: dict, revalidated: bool = False, stale: bool = False):
+        """
+        Function responsible for updating the access time (LRU) and the counters of a served entry.
+
+        :param entry:
+        :param revalidated: True when the website answered 304 Not Modified.
+        :param stale: True when the entry is expired and served because the website could not answer.
+        :return:
+        """
+        now = time.time()
+        with self._lock:
+            if revalidated:
+                self.stats['revalidated'] += 1
+                self._connection.execute("UPDATE entries SET fetched_at = ?, last_access = ? WHERE url = ?",
+                                         (now, now, entry['url']))
+            else:
+                self.stats['stale' if stale else 'hits'] += 1
+                self._connection.execute("UPDATE entries SET last_access = ? WHERE url = ?", (now, entry['url']))
+            self.stats['bytes_saved'] += entry['size']
+            self._connection.commit()
+
+    def record_miss(self):
+        with self._lock:
+            self.stats['misses'] += 1
+
+    def store(self, url: str, resource_type: str, content: bytes, headers: dict, encoding: str = None):
+        """
+        Function responsible for saving a downloaded body and its validators.
+
+        :param url:
+        :param resource_type: 'search', 'article' or 'image'.
+        :param content:
+        :param headers: response headers.
+        :param encoding:
+        :return:
+        """
+        blob = hashlib.sha256(content).hexdigest()
+        blob_path = self._blob_path(blob)
+        if not blob_path.exists():
+            blob_path.parent.mkdir(parents=True, exist_ok=True)
+            temporary_path = blob_path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            temporary_path.write_bytes(content)
+            os.replace(temporary_path, blob_path)
+
+        lowered_headers = {key.lower(): value for key, value in headers.items()}
+        kept_headers = {key: value for key, value in headers.items() if key.lower() in ('content-type',)}
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO entries (url, resource_type, blob, size, headers, encoding, etag, "
+                "last_modified, fetched_at, last_access) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, resource_type, blob, len(content), json.dumps(kept_headers), encoding,
+                 lowered_headers.get('etag'), lowered_headers.get('last-modified'), now, now))
+            self._connection.commit()
+            self.stats['stored'] += 1
+        self.evict()
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT SUM(size) FROM (SELECT blob, MAX(size) AS size FROM entries GROUP BY blob)").fetchone()
+        return row[0] or 0
+
+    def evict(self):
+        """
+        Function responsible for removing the least recently used entries until the cache fits ``max_bytes``.
+
+        :return:
+        """
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9)
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT url, blob, size FROM entries ORDER BY last_access ASC").fetchall()
+            for url, blob, size in rows:
+                if total <= target:
+                    break
+                self._connection.execute("DELETE FROM entries WHERE url = ?", (url,))
+                self.stats['evicted'] += 1
+                still_used = self._connection.execute(
+                    "SELECT 1 FROM entries WHERE blob = ? LIMIT 1", (blob,)).fetchone()
+                if still_used is None:
+                    try:
+                        self._blob_path(blob).unlink()
+                    except FileNotFoundError:
+                        pass
+                    total -= size
+            self._connection.commit()
+
+    def log_summary(self):
+        stats = self.stats
+        logging.info(f"[HttpCache] hits={stats['hits']} revalidated={stats['revalidated']} stale={stats['stale']} "
+                     f"misses={stats['misses']} stored={stats['stored']} evicted={stats['evicted']} "
+                     f"bytes_saved={stats['bytes_saved']}")
+
+    def close(self):
+        with self._lock:
+            self._connection.commit()
+            self._connection.close()
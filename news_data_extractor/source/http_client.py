@@ -0,0 +1,276 @@
+import logging
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_HTTP_SETTINGS = {
+    'connect_timeout': 5,
+    'read_timeout': 20,
+    'max_retries': 3,
+    'backoff_factor': 0.5,
+    'backoff_max': 30,
+    'pool_size': 8,
+}
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) '
+                  'Chrome/127.0.0.0 Safari/537.36',
+    'Accept-Language': 'en-US,en;q=0.9',
+}
+
+
+class FetchResult:
+    """
+    Outcome of one GET request, successful or not.
+
+    ``status_code`` is the real status returned by the website, or None when no response was received
+    (timeout, connection error...). In both cases ``error`` explains what went wrong.
+    ``stale`` is True for an expired cached copy served because the website could not be reached.
+    """
+
+    def __init__(self, url, status_code=None, content=None, headers=None, encoding=None, elapsed=0.0,
+                 attempts=0, error=None, from_cache=False, stale=False):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+        self.encoding = encoding
+        self.elapsed = elapsed
+        self.attempts = attempts
+        self.error = error
+        self.from_cache = from_cache
+        self.stale = stale
+
+    @property
+    def ok(self):
+        return self.status_code == 200 and self.error is None
+
+    @property
+    def text(self):
+        if self.content is None:
+            return None
+        return self.content.decode(self.encoding or 'utf-8', errors='replace')
+
+
+class HttpClient:
+    """
+    Shared, pooled HTTP layer with one ``requests.Session`` per domain.
+
+    Timeouts, retries and pool size come from the ``http`` entry of each source in
+    ``NewsDataExtractor._get_sources()``; missing keys fall back to ``DEFAULT_HTTP_SETTINGS``.
+    Connection errors, timeouts and 429/5xx answers are retried with jittered exponential backoff.
+    When an ``HttpCache`` is given, requests made with a ``resource_type`` are served from disk while
+    fresh and revalidated with conditional GETs once expired, and an expired copy is served (``stale``) when the
+    website cannot be reached or keeps failing. When ``RunMetrics`` are given, the latency,
+    status and size of every answer are added to them, and slow answers are sampled by the ``Profiler``.
+    When a ``RateLimiter`` is given, every attempt waits for it and reports its answer to it.
+    """
+
+    def __init__(self, sources_config: dict = None, headers: dict = None, cache=None, metrics=None,
+                 profiler=None, rate_limiter=None):
+        self.sources_config = sources_config or {}
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.metrics = metrics
+        self.profiler = profiler
+        self.headers = dict(DEFAULT_HEADERS if headers is None else headers)
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._source_by_domain = {}
+        # Sources sharing a domain share its session, the pool fits the largest of them.
+        self._pool_size_by_domain = {}
+        for source, config in self.sources_config.items():
+            if 'domain' in config:
+                self._source_by_domain[urlparse(config['domain']).netloc] = source
+            pool_size = self.settings_for(source)['pool_size']
+            for key in ('domain', 'text_search_url'):
+                if key in config:
+                    domain = urlparse(config[key]).netloc
+                    self._pool_size_by_domain[domain] = max(pool_size, self._pool_size_by_domain.get(domain, 0))
+
+    def settings_for(self, source: str = None) -> dict:
+        """
+        Function responsible for merging the source http settings with the defaults.
+
+        :param source:
+        :return:
+        """
+        settings = dict(DEFAULT_HTTP_SETTINGS)
+        if source is not None and source in self.sources_config:
+            settings.update(self.sources_config[source].get('http', {}))
+        return settings
+
+    def _session_for(self, domain: str, pool_size: int) -> requests.Session:
+        with self._lock:
+            session = self._sessions.get(domain)
+            if session is None:
+                session = requests.Session()
+                session.headers.update(self.headers)
+                # Retries are handled by HttpClient.get so the backoff can be jittered and logged.
+                pool_size = max(pool_size, self._pool_size_by_domain.get(domain, 0))
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._sessions[domain] = session
+        return session
+
+    @staticmethod
+    def _backoff(settings: dict, attempt: int) -> float:
+        ceiling = min(settings['backoff_max'], settings['backoff_factor'] * (2 ** attempt))
+        return random.uniform(0, ceiling)
+
+    def get(self, url: str, source: str = None, headers: dict = None, max_bytes: int = None,
+            chunk_size: int = 65536, resource_type: str = None, content_types=None) -> FetchResult:
+        """
+        Function responsible for downloading an url with timeouts and retries.
+
+        :param url:
+        :param source: name of the source in ``_get_sources()``; inferred from the domain when None.
+        :param headers: extra request headers.
+        :param max_bytes: abort the download when the body is bigger than this.
+        :param chunk_size: size of the buffer used to stream the body.
+        :param resource_type: 'search', 'article' or 'image'; enables the disk cache for this request.
+        :param content_types: when given, a response announcing another Content-Type is not downloaded.
+        :return:
+        """
+        if source is None:
+            source = self._source_by_domain.get(urlparse(url).netloc)
+        result = self._get(url, source, headers, max_bytes, chunk_size, resource_type, content_types)
+        if self.metrics is not None:
+            self.metrics.record_request(source, resource_type, result)
+        if self.profiler is not None:
+            self.profiler.record_request(source, resource_type, result)
+        return result
+
+    def _get(self, url, source, headers, max_bytes, chunk_size, resource_type, content_types) -> FetchResult:
+        cache_entry = None
+        use_cache = self.cache is not None and resource_type is not None
+        if use_cache:
+            cache_entry = self.cache.lookup(url)
+            if cache_entry is not None and self.cache.is_fresh(cache_entry):
+                self.cache.record_hit(cache_entry)
+                return self._cached_result(url, cache_entry)
+            if cache_entry is not None:
+                headers = {**(headers or {}), **self.cache.conditional_headers(cache_entry)}
+
+        domain = urlparse(url).netloc
+        settings = self.settings_for(source)
+        session = self._session_for(domain, settings['pool_size'])
+        timeout = (settings['connect_timeout'], settings['read_timeout'])
+
+        started_at = time.perf_counter()
+        result = FetchResult(url=url)
+        # Pages of an unknown source are paced per domain.
+        limiter_key = source if source is not None else domain
+        for attempt in range(settings['max_retries'] + 1):
+            result.attempts = attempt + 1
+            # Headers of a failed attempt must not be read as the answer to this one (Retry-After).
+            result.headers = {}
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(limiter_key, resource_type)
+            attempt_started_at = time.perf_counter()
+            try:
+                with session.get(url, headers=headers, timeout=timeout, stream=True) as response:
+                    result.status_code = response.status_code
+                    result.headers = dict(response.headers)
+                    result.encoding = requests.utils.get_encoding_from_headers(response.headers)
+                    if result.encoding == 'ISO-8859-1' and 'charset' not in response.headers.get(
+                            'Content-Type', '').lower():
+                        # requests assumes latin-1 for text/* without charset, pages here are utf-8.
+                        result.encoding = None
+                    if response.status_code in RETRY_STATUS_CODES:
+                        result.error = f"HTTP {response.status_code}"
+                    else:
+                        self._check_headers(response, max_bytes, content_types)
+                        result.content = self._read_body(response, max_bytes, chunk_size)
+                        result.error = None
+            except (requests.exceptions.MissingSchema, requests.exceptions.InvalidSchema,
+                    requests.exceptions.InvalidURL) as error:
+                # Retrying can't fix a malformed url.
+                result.status_code = None
+                result.content = None
+                result.error = f"{type(error).__name__}: {error}"
+                break
+            except requests.RequestException as error:
+                result.status_code = None
+                result.content = None
+                result.error = f"{type(error).__name__}: {error}"
+            except ValueError as error:
+                result.content = None
+                result.error = str(error)
+                break
+            finally:
+                if self.rate_limiter is not None:
+                    self.rate_limiter.release(limiter_key, result.status_code, time.perf_counter() - attempt_started_at,
+                                              retry_after=result.headers.get('Retry-After'))
+
+            if result.error is None or attempt == settings['max_retries']:
+                break
+            wait_seconds = self._backoff(settings, attempt)
+            logging.warning(f"[Retry] {source} | {url} | {result.error} | waiting {wait_seconds:.2f}s")
+            time.sleep(wait_seconds)
+
+        result.elapsed = time.perf_counter() - started_at
+        if use_cache:
+            if cache_entry is not None and result.status_code == 304:
+                self.cache.record_hit(cache_entry, revalidated=True)
+                cached_result = self._cached_result(url, cache_entry)
+                cached_result.elapsed = result.elapsed
+                cached_result.attempts = result.attempts
+                return cached_result
+            if cache_entry is not None and (result.status_code is None or result.status_code in RETRY_STATUS_CODES):
+                # No usable answer after the retries, the expired copy is better than nothing.
+                logging.warning(f"[Stale] {source} | {url} | {result.error}, serving the cached copy")
+                self.cache.record_hit(cache_entry, stale=True)
+                cached_result = self._cached_result(url, cache_entry)
+                cached_result.stale = True
+                cached_result.elapsed = result.elapsed
+                cached_result.attempts = result.attempts
+                return cached_result
+            self.cache.record_miss()
+            if result.ok:
+                self.cache.store(url, resource_type, result.content, result.headers, result.encoding)
+        if result.error is not None:
+            logging.warning(f"[Request failed] {source} | {url} | {result.error} after {result.attempts} attempts")
+        return result
+
+    def _cached_result(self, url, cache_entry):
+        return FetchResult(url=url, status_code=200, content=self.cache.read(cache_entry),
+                           headers=cache_entry['headers'], encoding=cache_entry['encoding'], from_cache=True)
+
+    @staticmethod
+    def _check_headers(response, max_bytes, content_types):
+        content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_types is not None and content_type != '' and content_type not in content_types:
+            raise ValueError(f"Content-Type {content_type} not accepted")
+        content_length = response.headers.get('Content-Length', '')
+        if max_bytes is not None and content_length.isdigit() and int(content_length) > max_bytes:
+            raise ValueError(f"Response bigger than {max_bytes} bytes")
+
+    @staticmethod
+    def _read_body(response, max_bytes, chunk_size):
+        chunks = []
+        size = 0
+        for chunk in response.iter_content(chunk_size):
+            size += len(chunk)
+            if max_bytes is not None and size > max_bytes:
+                raise ValueError(f"Response bigger than {max_bytes} bytes")
+            chunks.append(chunk)
+        return b''.join(chunks)
+
+    def close(self):
+        if self.cache is not None:
+            self.cache.log_summary()
+            self.cache.close()
+        if self.rate_limiter is not None:
+            self.rate_limiter.log_summary()
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions = {}
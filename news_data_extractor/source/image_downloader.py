@@ -0,0 +1,129 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+from news_data_extractor.source.fetcher import FetchEngine
+
+# Accepted Content-Type -> extension of the saved file.
+IMAGE_CONTENT_TYPES = {
+    'image/jpeg': '.jpg',
+    'image/jpg': '.jpg',
+    'image/png': '.png',
+    'image/webp': '.webp',
+    'image/gif': '.gif',
+    'image/avif': '.avif',
+}
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.gif', '.avif'}
+
+
+class ImageDownloader:
+    """
+    Concurrent image download stage.
+
+    Every distinct url is downloaded once through a ``FetchEngine``, and files are named after the sha256 of their
+    content, so two urls serving the same picture share one file and pictures with the same basename no
+    longer overwrite each other. Responses announcing another Content-Type or a size above ``max_bytes``
+    are dropped before their body is read.
+    """
+
+    def __init__(self, http_client, save_directory, sources_config: dict = None, max_in_flight: int = 8,
+                 max_bytes: int = 10 * 1024 * 1024, content_types: dict = None, chunk_size: int = 256 * 1024):
+        """
+        :param http_client: HttpClient used for the requests (and its cache).
+        :param save_directory:
+        :param sources_config: ``_get_sources()``, gives the per-source concurrency.
+        :param max_in_flight: images downloaded at the same time.
+        :param max_bytes: bigger images are skipped.
+        :param content_types: accepted Content-Type -> file extension.
+        :param chunk_size: size of the buffer used to stream the body.
+        """
+        self.http_client = http_client
+        self.save_directory = Path(save_directory)
+        self.max_bytes = max_bytes
+        self.content_types = content_types or IMAGE_CONTENT_TYPES
+        self.chunk_size = chunk_size
+        self.fetch_engine = FetchEngine.from_sources(fetch_function=self._download,
+                                                     sources_config=sources_config or {},
+                                                     max_in_flight=max_in_flight)
+        self.paths_by_url = {}
+        self.stats = {'downloaded': 0, 'repeated_url': 0, 'repeated_content': 0, 'failed': 0, 'bytes': 0}
+        self._saved_files = set()
+        self._lock = threading.Lock()
+
+    def _extension(self, url, headers):
+        content_type = headers.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type in self.content_types:
+            return self.content_types[content_type]
+        extension = Path(urlparse(url).path).suffix.lower()
+        return extension if extension in IMAGE_EXTENSIONS else None
+
+    def _download(self, source, url):
+        response = self.http_client.get(url, source=source, resource_type='image', max_bytes=self.max_bytes,
+                                        chunk_size=self.chunk_size, content_types=self.content_types)
+        if not response.ok:
+            logging.warning(f"Error downloading the image: {response.error or response.status_code}")
+            return None
+        extension = self._extension(url, response.headers)
+        if extension is None:
+            logging.warning(f"Error downloading the image: unknown image type for {url}")
+            return None
+
+        image_path = self.save_directory / f"{hashlib.sha256(response.content).hexdigest()}{extension}"
+        with self._lock:
+            # The first thread holding a content writes it, the file may also come from an earlier run.
+            repeated = image_path.name in self._saved_files or image_path.exists()
+            self._saved_files.add(image_path.name)
+            self.stats['repeated_content' if repeated else 'downloaded'] += 1
+            self.stats['bytes'] += len(response.content)
+        if not repeated:
+            temporary_path = image_path.with_name(f"{image_path.name}.{threading.get_ident()}.tmp")
+            with open(temporary_path, 'wb') as image_file:
+                image_file.write(response.content)
+            os.replace(temporary_path, image_path)
+        return str(image_path)
+
+    def download(self, jobs: list) -> dict:
+        """
+        Function responsible for downloading images concurrently, each url only once.
+
+        :param jobs: list of (source, image url).
+        :return: dict image url -> saved path, None for images that could not be saved.
+        """
+        self.save_directory.mkdir(parents=True, exist_ok=True)
+        pending = []
+        queued_urls = set()
+        for source, url in jobs:
+            if url is None or url == '':
+                continue
+            if url in self.paths_by_url or url in queued_urls:
+                self.stats['repeated_url'] += 1
+                continue
+            queued_urls.add(url)
+            pending.append({'source': source, 'url': url})
+
+        started_at = time.perf_counter()
+        for job, image_path in zip(pending, self.fetch_engine.fetch_all(pending)):
+            self.paths_by_url[job['url']] = image_path
+            if image_path is None:
+                self.stats['failed'] += 1
+        if len(pending) != 0:
+            logging.info(f"[Images] {len(pending)} urls in {time.perf_counter() - started_at:.2f}s | {self.stats}")
+        return {url: self.paths_by_url.get(url) for _, url in jobs}
+
+    def download_rows(self, rows: list, url_column: str = 'picture_url', path_column: str = 'picture_path') -> list:
+        """
+        Function responsible for downloading the picture of every row and writing its path in the row.
+
+        :param rows:
+        :param url_column:
+        :param path_column:
+        :return: the same rows.
+        """
+        paths = self.download([(row.get('source'), row.get(url_column)) for row in rows])
+        for row in rows:
+            row[path_column] = paths.get(row.get(url_column))
+        return rows
@@ -1,17 +1,32 @@
 import datetime
 import logging
-import os
-import re
+import time
+from collections import Counter
 from pathlib import Path
-from urllib.parse import urlparse
 import numpy as np
 import pandas as pd
-import requests
-import spacy
-from bs4 import BeautifulSoup
-from sentence_transformers import SentenceTransformer
 
-sbert_model = SentenceTransformer('bert-base-nli-mean-tokens')
+from news_data_extractor.source.ann_index import DEFAULT_N_PROBE, IVFIndex
+from news_data_extractor.source.article_store import ArticleStore
+from news_data_extractor.source.date_parser import DateParser, date_from_url, months_back_start, relative_date
+from news_data_extractor.source.embedding_store import EmbeddingStore
+from news_data_extractor.source.exporters import export_dataframe, output_formats
+from news_data_extractor.source.extraction_plan import compile_plans
+from news_data_extractor.source.fetcher import FetchEngine
+from news_data_extractor.source.http_cache import HttpCache
+from news_data_extractor.source.http_client import HttpClient
+from news_data_extractor.source.image_downloader import ImageDownloader
+from news_data_extractor.source.metrics import RunMetrics, track_stage
+from news_data_extractor.source.models import SPACY_MODEL_NAME, get_spacy_model, spacy_model_version
+from news_data_extractor.source.page_archive import PageArchive
+from news_data_extractor.source.parallel import ProcessPool
+from news_data_extractor.source.profiling import Profiler, profiling_options
+from news_data_extractor.source.rate_limiter import RateLimiter
+from news_data_extractor.source.sharding import shard_listing, shard_sources
+from news_data_extractor.source.pipeline import stream_news
+from news_data_extractor.source.text_normalization import normalize_raw_rows
+from news_data_extractor.source.similarity import (build_embedding_matrix, combine_query_scores, closest_mask,
+                                                   score_queries, top_k_indices)
 
 logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s %(levelname)s %(module)s %(funcName)s %(message)s',
@@ -19,6 +34,20 @@ logging.basicConfig(level=logging.INFO,
                               logging.StreamHandler()])
 
 
+def _search_pages(bot) -> int:
+    return sum(len([page for page in config.get('search_results', []) if page['status_code'] == 200])
+               for config in bot.source_parameters.values())
+
+
+def _listed_urls(bot) -> int:
+    return sum(len(config.get('listing_results', [])) for config in bot.source_parameters.values())
+
+
+def _downloaded_pages(bot) -> int:
+    return sum(len([article for article in config.get('news_to_collect_data', []) if article['status_code'] == 200])
+               for config in bot.source_parameters.values())
+
+
 class NewsDataExtractor:
     def __init__(self, search_parameters: dict = None,
                  extracted_data=None,
@@ -50,20 +79,259 @@ class NewsDataExtractor:
         else:
             self.filtered_news = filtered_news
 
-        try:
-            self.nlp = spacy.load('en_core_web_sm')
-        except OSError:
-            logging.info(f"Downloading spacy model.")
-            os.system("python -m spacy download en_core_web_sm")
-            self.nlp = spacy.load('en_core_web_sm')
         self.processed_raw_data = []
+        # One filtered DataFrame per query of a batch (``queries``), empty for a single query.
+        self.query_results = []
+        # Rows that failed to parse or normalize, with the stage, url and error message.
+        self.row_errors = []
+        self.embedding_matrix = None
+        self._embedding_store = None
+        self._ann_index = None
+        self._extraction_plans = None
+        self._page_archive = None
+        self._article_store = None
+        self._image_downloader = None
+        self._date_parser = None
+        self._listing_date_parser = None
+        self._process_pool = None
+        self.run_id = datetime.datetime.now().strftime('%Y%m%d%H%M%S')
+        self.metrics = RunMetrics(run_id=self.run_id)
+        self.profiler = Profiler.from_options(profiling_options(self.search_parameters),
+                                              folder=self.root_folder / 'output' / 'profiles' / self.run_id)
+        http_cache = None
+        if self.search_parameters.get('use_http_cache', True):
+            http_cache = HttpCache(folder=self.root_folder / 'output' / 'http_cache')
+        rate_limiter = None
+        if self.search_parameters.get('use_rate_limiter', True):
+            # Shards split by url all request every source at once, they share its politeness budget.
+            shares = 1
+            if self.search_parameters.get('shard') is not None and self.search_parameters.get('shard_by') == 'url':
+                shares = int(self.search_parameters.get('shards', 1))
+            rate_limiter = RateLimiter.from_sources(self._get_sources(), shares=shares)
+        self.http_client = HttpClient(sources_config=self._get_sources(), cache=http_cache, metrics=self.metrics,
+                                      profiler=self.profiler, rate_limiter=rate_limiter)
+        self.fetch_engine = FetchEngine.from_sources(fetch_function=self._request_page,
+                                                     sources_config=self._get_sources(),
+                                                     max_in_flight=self.search_parameters.get('max_in_flight', 16))
+
+    @property
+    def nlp(self):
+        """
+        spaCy pipeline used for embeddings, loaded from the shared registry the first time a stage needs it.
+
+        :return:
+        """
+        return get_spacy_model()
+
+    @property
+    def extraction_plans(self):
+        """
+        Listing and extraction steps of every source, compiled once per extractor.
+
+        :return:
+        """
+        if self._extraction_plans is None:
+            self._extraction_plans = compile_plans(self._get_sources())
+        return self._extraction_plans
+
+    @property
+    def process_pool(self):
+        """
+        Worker processes for parsing, normalization and embeddings, None unless ``workers`` is above 1.
+
+        :return:
+        """
+        if self._process_pool is None and int(self.search_parameters.get('workers', 1)) > 1:
+            # Workers only read the archive, the folder is enough and step 2 never opens it to write.
+            archive_folder = self.page_archive_folder()
+            self._process_pool = ProcessPool(sources_config=self._get_sources(), archive_folder=archive_folder,
+                                             workers=int(self.search_parameters['workers']),
+                                             chunk_size=int(self.search_parameters.get('worker_chunk_size', 16)))
+        return self._process_pool
+
+    @property
+    def date_parser(self):
+        """
+        Date parser shared by every batch of this extractor, so formats learned on a batch speed up the next.
+
+        :return:
+        """
+        if self._date_parser is None:
+            self._date_parser = DateParser()
+        return self._date_parser
+
+    @property
+    def listing_date_parser(self):
+        """
+        Date parser of the dates listed in search pages, apart so their formats are not learned for the articles.
+
+        :return:
+        """
+        if self._listing_date_parser is None:
+            self._listing_date_parser = DateParser()
+        return self._listing_date_parser
+
+    @property
+    def image_downloader(self):
+        """
+        Concurrent image download stage, images are saved to ``downloaded_images`` next to this file.
+
+        :return:
+        """
+        if self._image_downloader is None:
+            self._image_downloader = ImageDownloader(
+                http_client=self.http_client, save_directory=self.current_folder / 'downloaded_images',
+                sources_config=self._get_sources(),
+                max_in_flight=self.search_parameters.get('image_max_in_flight', 8),
+                max_bytes=self.search_parameters.get('image_max_bytes', 10 * 1024 * 1024))
+        return self._image_downloader
+
+    def download_images(self, rows: list) -> list:
+        """
+        Function responsible for downloading the picture of every normalized row into ``picture_path``.
+
+        :param rows:
+        :return:
+        """
+        return self.image_downloader.download_rows(rows)
+
+    def page_archive_folder(self):
+        """
+        Folder of the archive of the downloaded article pages (output/page_archive), None when ``use_page_archive``
+        is False. A shard of step 1 has its own archive (output/page_archive/shard_<shard>), so the workers running
+        on the same machine never append to the same file.
+
+        :return:
+        """
+        if not self.search_parameters.get('use_page_archive', True):
+            return None
+        folder = self.root_folder / 'output' / 'page_archive'
+        if self.search_parameters.get('shard') is not None:
+            folder = folder / f"shard_{self.search_parameters['shard']}"
+        return folder
+
+    @property
+    def page_archive(self):
+        """
+        Archive the downloaded article pages are appended to, see ``page_archive_folder``. When it is opened, the
+        runs before the last ``page_archive_keep_runs`` ones and the oldest pages beyond ``page_archive_max_mb``
+        are dropped.
+
+        :return:
+        """
+        if self._page_archive is None and self.page_archive_folder() is not None:
+            self._page_archive = PageArchive(folder=self.page_archive_folder())
+            keep_runs = self.search_parameters.get('page_archive_keep_runs')
+            max_mb = self.search_parameters.get('page_archive_max_mb')
+            if keep_runs is not None or max_mb is not None:
+                self._page_archive.prune(keep_runs=int(keep_runs) if keep_runs is not None else None,
+                                         max_bytes=int(float(max_mb) * 1024 * 1024) if max_mb is not None else None)
+        return self._page_archive
+
+    def archive_page(self, source, url, response):
+        """
+        Function responsible for keeping a downloaded article page out of memory.
+
+        :param source:
+        :param url:
+        :param response: result of the fetch engine.
+        :return: the ``news_to_collect_data`` entry, with an ``archive_ref`` instead of the html when archiving.
+        """
+        news_article = {'url': url, 'status_code': response['status_code'], 'error': response['error']}
+        if response['html'] is not None and self.page_archive is not None:
+            news_article['archive_ref'] = self.page_archive.append(url, response['html'], source=source,
+                                                                   status_code=response['status_code'],
+                                                                   run_id=self.run_id)
+            news_article['html'] = None
+        else:
+            news_article['html'] = response['html']
+        return news_article
+
+    def read_page(self, news_article):
+        """
+        Function responsible for returning the html of a ``news_to_collect_data`` entry.
+
+        :param news_article:
+        :return:
+        """
+        if news_article.get('archive_ref') is not None:
+            return self.page_archive.read(news_article['archive_ref'])
+        return news_article.get('html')
+
+    def page_archive_reference(self):
+        """
+        Reference to the pages of this run, small enough to travel in a work item payload.
+
+        :return:
+        """
+        if self.page_archive is None:
+            return None
+        return {'folder': str(self.page_archive.folder), 'run_id': self.run_id}
+
+    @property
+    def article_store(self):
+        """
+        Articles seen by earlier runs (output/article_store.sqlite3), None when ``use_article_store`` is False.
+        Articles downloaded less than ``article_store_refresh_hours`` (24) ago are not downloaded again.
+        A shard of step 1 has its own store (output/article_store/shard_<shard>.sqlite3), merged into the
+        store of the run by step_1_merge.
+
+        :return:
+        """
+        if self._article_store is None and self.search_parameters.get('use_article_store', True):
+            refresh_hours = float(self.search_parameters.get('article_store_refresh_hours', 24))
+            path = self.root_folder / 'output' / 'article_store.sqlite3'
+            if self.search_parameters.get('shard') is not None:
+                path = path.parent / 'article_store' / f"shard_{self.search_parameters['shard']}.sqlite3"
+            self._article_store = ArticleStore(path=path, refresh_after=refresh_hours * 3600)
+        return self._article_store
+
+    def stored_article(self, source: str, url: str, html=None):
+        """
+        Function responsible for finding an article in the article store.
+
+        Without html, the row is returned when the article was downloaded recently enough to skip the request.
+        With the html just downloaded, the row is returned when the page did not change since it was stored.
+
+        :param source:
+        :param url:
+        :param html: page of the article.
+        :return: (stored raw row or None, content hash of html or None)
+        """
+        if self.article_store is None or not self.extraction_plans[source].has_extraction_steps:
+            return None, None
+        parser_version = self.extraction_plans[source].version
+        if html is None:
+            return self.article_store.fresh_row(url, parser_version), None
+        content_hash = self.article_store.content_hash(html)
+        return (self.article_store.unchanged_row(url, content_hash, parser_version, run_id=self.run_id),
+                content_hash)
+
+    def keep_parsed_row(self, source: str, news_article: dict, row: dict) -> bool:
+        """
+        Function responsible for saving a parsed row in the article store.
+
+        :param source:
+        :param news_article: ``news_to_collect_data`` entry of the row, with the ``content_hash`` of its page.
+        :param row:
+        :return: False when ``only_changed_articles`` is set and the row was already stored as it is.
+        """
+        if self.article_store is None or news_article.get('content_hash') is None:
+            return True
+        change = self.article_store.save_raw_row(source, news_article['url'], news_article['content_hash'],
+                                                 self.extraction_plans[source].version, row, run_id=self.run_id)
+        return change != 'unchanged' or not self.search_parameters.get('only_changed_articles', False)
 
     @staticmethod
     def _get_sources(only_active=False):
         sources_config = {
             'apnews': {'text_search_url': 'https://apnews.com/search?q=', 'domain': 'https://apnews.com',
-                       'enabled': True, 'captcha': False,
+                       'enabled': True, 'captcha': False, 'max_concurrency': 4,
+                       'http': {'connect_timeout': 5, 'read_timeout': 20, 'max_retries': 3, 'pool_size': 4},
+                       'rate_limit': {'requests_per_second': 4, 'burst': 8},
                        'listing_steps': [{'type': 'div', 'loc': {'class': 'PageList-items-item'}}],
+                       'listing_date_step': {'type': 'bsp-timestamp', 'loc': {}},
+                       'search_paging': {'parameter': 'p', 'first': 1, 'step': 1},
                        'extraction_steps': [
                            {'column_name': 'title', 'type': 'h1', 'loc': {'class': 'Page-headline'}},
                            {'column_name': 'description', 'type': 'div',
@@ -79,7 +347,9 @@ class NewsDataExtractor:
                        },
 
             'aljazeera': {'text_search_url': 'https://www.aljazeera.com/search/', 'domain': 'https://www.aljazeera.com',
-                          'enabled': True, 'captcha': False,
+                          'enabled': True, 'captcha': False, 'max_concurrency': 4,
+                          'http': {'connect_timeout': 5, 'read_timeout': 20, 'max_retries': 3, 'pool_size': 4},
+                          'rate_limit': {'requests_per_second': 2, 'burst': 4},
                           'listing_steps': [{'type': 'article', 'loc': {
                               'class': 'gc u-clickable-card gc--type-customsearch#result gc--list gc--with-image'}}], },
 
@@ -91,9 +361,13 @@ class NewsDataExtractor:
                         'enabled': False, 'captcha': True},
 
             'gothamist': {'text_search_url': 'https://gothamist.com/search?q=', 'domain': 'https://gothamist.com',
-                          'enabled': True, 'captcha': False,
+                          'enabled': True, 'captcha': False, 'max_concurrency': 4,
+                          'http': {'connect_timeout': 5, 'read_timeout': 20, 'max_retries': 3, 'pool_size': 4},
+                          'rate_limit': {'requests_per_second': 2, 'burst': 4},
                           'listing_steps': [
                               {'type': 'div', 'loc': {'class': 'v-card gothamist-card mod-horizontal'}}],
+                          'listing_date_step': {'type': 'span', 'loc': {'class': 'date'}},
+                          'search_paging': {'parameter': 'page', 'first': 1, 'step': 1},
                           'extraction_steps': [
                               {'column_name': 'title', 'type': 'h1', 'loc': {'class': 'mt-4 mb-3 h2'}},
                               {'column_name': 'description', 'type': 'div',
@@ -114,7 +388,12 @@ class NewsDataExtractor:
 
             'yahoo': {'text_search_url': 'https://news.search.yahoo.com/search;?p=',
                       'domain': 'https://news.search.yahoo.com', 'enabled': True, 'captcha': False,
+                      'max_concurrency': 4,
+                      'http': {'connect_timeout': 5, 'read_timeout': 20, 'max_retries': 3, 'pool_size': 4},
+                      'rate_limit': {'requests_per_second': 4, 'burst': 8},
                       'listing_steps': [{'type': 'div', 'loc': {'class': 'dd NewsArticle'}}],
+                      'listing_date_step': {'type': 'span', 'loc': {'class': 's-time'}},
+                      'search_paging': {'parameter': 'b', 'first': 1, 'step': 10},
                       'extraction_steps': [
                           {'column_name': 'title', 'type': 'div', 'loc': {'class': 'caas-title-wrapper'}},
                           {'column_name': 'description', 'type': 'div',
@@ -139,6 +418,44 @@ class NewsDataExtractor:
         else:
             return sources_config
 
+    @property
+    def is_batch(self):
+        return 'queries' in self.search_parameters
+
+    @property
+    def queries(self) -> list:
+        """
+        Queries of the run. A batch has a ``queries`` list of dicts with ``text_phrase`` and optionally
+        ``news_category`` and ``max_months`` (those of the search parameters by default), or of plain text phrases.
+        Otherwise the search parameters are the only query.
+
+        :return: list of dicts with text_phrase, news_category and max_months.
+        """
+        defaults = {'news_category': self.search_parameters.get('news_category'),
+                    'max_months': self.search_parameters.get('max_months')}
+        if not self.is_batch:
+            return [{**defaults, 'text_phrase': self.search_parameters['text_phrase']}]
+        return [{**defaults, **({'text_phrase': query} if isinstance(query, str) else query)}
+                for query in self.search_parameters['queries']]
+
+    def record_query_urls(self, positions: list, urls: list):
+        """
+        Function responsible for remembering the articles listed for every query of a batch.
+        Articles listed by several queries are still downloaded, parsed and embedded once, the urls of every
+        query are kept in the search parameters (``query_urls``) so they travel to step 2 with them.
+
+        :param positions: positions in ``queries`` of the queries that listed the urls.
+        :param urls:
+        :return:
+        """
+        if not self.is_batch:
+            return
+        query_urls = self.search_parameters.setdefault('query_urls', [[] for _ in self.search_parameters['queries']])
+        for position in positions:
+            known_urls = set(query_urls[position])
+            query_urls[position].extend(url for url in urls if url not in known_urls)
+
+    @track_stage('search_news', rows_out=_search_pages)
     def search_news(self):
         """
         Function responsible for collecting listed news based on some text.
@@ -149,224 +466,342 @@ class NewsDataExtractor:
         logging.info(f'Obtained {len(list(self.source_parameters.keys()))} sources to process.')
 
         print(self.source_parameters.keys())
-        for source in list(self.source_parameters.keys()):
-            search_url = self.source_parameters[source]['text_search_url']
-            try:
-                search_text = self.search_parameters['text_phrase']
-            except KeyError:
-                self.search_parameters['text_phrase'] = "Golden Medal Paris 2024"
-                self.search_parameters['news_category'] = "sports"
-                self.search_parameters['max_months'] = 2
-
-            search_text = self.search_parameters['text_phrase']
-            # TODO: Add other filtering directly in search
-            # search_category = self.search_parameters['news_category']
-            # search_months = self.search_parameters['max_months']
-            search_full_url = f"{search_url}{search_text}"
-            try:
-                response = requests.get(search_full_url)
-                response_status = response.status_code
-                response_html = response.text
-                response_html = response_html.encode('utf-8')
-
-            except requests.RequestException:
-                logging.warning(f"Request 500")
-                response_status = 500
-                response_html = None
-
-            # TODO: Add elapsed time to request
-            logging.info(f"[Request] {source} | {response_status}")
-            if 'search_results' not in list(self.source_parameters[source].keys()):
-                self.source_parameters[source]['search_results'] = {}
-            self.source_parameters[source]['search_results'] = {'status_code': response_status,
-                                                                'html': response_html}
+        self._set_default_search_parameters()
+
+        jobs = self.search_jobs()
+        for job, response in zip(jobs, self.fetch_engine.fetch_all(jobs)):
+            source = job['source']
+            logging.info(f"[Request] {source} | {response['status_code']} | {response['elapsed']:.2f}s")
+            self.source_parameters[source].setdefault('search_results', []).append(
+                {'url': job['url'], 'page': 1, 'queries': job['queries'], 'status_code': response['status_code'],
+                 'html': response['html'], 'error': response['error']})
         return self.source_parameters
 
+    def _set_default_search_parameters(self):
+        if self.is_batch:
+            return
+        try:
+            self.search_parameters['text_phrase']
+        except KeyError:
+            self.search_parameters['text_phrase'] = "Golden Medal Paris 2024"
+            self.search_parameters['news_category'] = "sports"
+            self.search_parameters['max_months'] = 2
+
+    def search_jobs(self) -> list:
+        """
+        Function responsible for building the search request of every source and query.
+        Queries with the same text phrase share their search requests.
+
+        :return: jobs with the positions of their ``queries``.
+        """
+        # TODO: Add other filtering directly in search
+        # search_category = self.search_parameters['news_category']
+        # search_months = self.search_parameters['max_months']
+        jobs = {}
+        for position, query in enumerate(self.queries):
+            for source in list(self.source_parameters.keys()):
+                search_url = f"{self.source_parameters[source]['text_search_url']}{query['text_phrase']}"
+                job = jobs.setdefault((source, search_url), {'source': source, 'url': search_url,
+                                                             'options': {'resource_type': 'search'}, 'queries': []})
+                job['queries'].append(position)
+        return list(jobs.values())
+
+    @track_stage('get_news_listing', rows_in=_search_pages, rows_out=_listed_urls)
     def get_news_listing(self):
         """
         Function responsible for getting every news URL.
+        Articles older than ``max_months`` are dropped here when their url or the search page gives their date.
+        With ``max_search_pages`` above 1, the next search pages of a source are requested until one has no
+        article recent enough.
 
         :return:
         """
-        for source in list(self.source_parameters.keys()):
-            if 'search_results' not in list(self.source_parameters[source].keys()):
-                pass
+        max_search_pages = int(self.search_parameters.get('max_search_pages', 1))
+        listing_results = {}
+        search_pages = [(source, search_page) for source in list(self.source_parameters.keys())
+                        for search_page in self.source_parameters[source].get('search_results', [])]
+        while len(search_pages) != 0:
+            next_jobs = []
+            for source, search_page in search_pages:
+                entries = []
+                if search_page['status_code'] == 200:
+                    entries = self.extraction_plans[source].parse_listing_entries(search_page['html'])
+                listing_dates = {}
+                for url, date_text in entries:
+                    if listing_dates.get(url) is None:
+                        listing_dates[url] = date_text
+
+                logging.info(f"[Listings] {source} Found {list(listing_dates)} news.")
+                valid_urls = self.valid_listing_urls(source, list(listing_dates))
+                kept_urls = self.prune_listing(source, [(url, listing_dates[url]) for url in valid_urls],
+                                               cutoff=self.listing_cutoff(search_page['queries']))
+                self.record_query_urls(search_page['queries'], kept_urls)
+                listing_results.setdefault(source, []).extend(kept_urls)
+                # A page without any recent article ends the paging, the next ones are older.
+                if search_page['page'] < max_search_pages and len(kept_urls) != 0:
+                    next_job = self.next_search_page_job(source, search_page)
+                    if next_job is not None:
+                        next_jobs.append(next_job)
+
+            search_pages = []
+            for job, response in zip(next_jobs, self.fetch_engine.fetch_all(next_jobs)):
+                logging.info(f"[Request] {job['source']} page {job['page']} | {response['status_code']} | "
+                             f"{response['elapsed']:.2f}s")
+                search_page = {'url': job['search_url'], 'page': job['page'], 'queries': job['queries'],
+                               'status_code': response['status_code'], 'html': response['html'],
+                               'error': response['error']}
+                self.source_parameters[job['source']]['search_results'].append(search_page)
+                search_pages.append((job['source'], search_page))
+
+        for source, urls in listing_results.items():
+            # Articles listed by several queries or pages are downloaded once.
+            self.source_parameters[source]['listing_results'] = list(dict.fromkeys(urls))
+
+    def load_listing(self, listing: dict):
+        """
+        Function responsible for starting from urls listed by another run instead of searching them, for a shard of
+        step 1. get_news_html and parse_each_news then only handle those urls.
+
+        :param listing: dict source -> urls.
+        :return:
+        """
+        sources_config = self._get_sources(only_active=True)
+        self.source_parameters = {source: {**sources_config[source], 'listing_results': list(urls)}
+                                  for source, urls in listing.items() if source in sources_config}
+        return self.source_parameters
+
+    def next_search_page_job(self, source: str, search_page: dict):
+        """
+        Function responsible for building the request of the search page after search_page.
+
+        :param source:
+        :param search_page: entry of ``search_results``.
+        :return: job for the fetch engine, None when the source has no ``search_paging``.
+        """
+        paging = self.source_parameters[source].get('search_paging')
+        if paging is None:
+            return None
+        value = paging['first'] + paging['step'] * search_page['page']
+        return {'source': source, 'url': f"{search_page['url']}&{paging['parameter']}={value}",
+                'options': {'resource_type': 'search'}, 'search_url': search_page['url'],
+                'page': search_page['page'] + 1, 'queries': search_page['queries']}
+
+    def listing_cutoff(self, positions: list):
+        """
+        Function responsible for the oldest date kept by the queries of a search page, the loosest one when
+        several queries share it, minus ``date_pruning_margin_days`` (1).
+
+        :param positions: positions in ``queries``.
+        :return: datetime, None when a query has no ``max_months`` or ``use_date_pruning`` is False.
+        """
+        if not self.search_parameters.get('use_date_pruning', True) or len(positions) == 0:
+            return None
+        queries = self.queries
+        cutoffs = []
+        for position in positions:
+            if queries[position]['max_months'] is None:
+                return None
+            cutoffs.append(months_back_start(int(queries[position]['max_months'])))
+        margin = datetime.timedelta(days=float(self.search_parameters.get('date_pruning_margin_days', 1)))
+        return min(cutoffs) - margin
+
+    def prune_listing(self, source: str, entries: list, cutoff) -> list:
+        """
+        Function responsible for dropping the listed articles older than cutoff, dated by their url or by the date
+        next to them in the search page. Articles without a date are kept, ``filter_data`` decides for them.
+
+        :param source:
+        :param entries: (url, date text) of ``ExtractionPlan.parse_listing_entries``.
+        :param cutoff: datetime or None.
+        :return: urls kept, in order.
+        """
+        if cutoff is None:
+            return [url for url, _ in entries]
+        now = datetime.datetime.now()
+        kept_urls = []
+        pruned = Counter()
+        for url, date_text in entries:
+            date, reason = date_from_url(url), 'url_date'
+            if date is None and date_text is not None:
+                date, reason = relative_date(date_text, now), 'listing_date'
+                if date is None:
+                    date = self.listing_date_parser.parse(date_text, source)
+            if date is not None and date < cutoff:
+                pruned[reason] += 1
             else:
-                search_status = self.source_parameters[source]['search_results']['status_code']
-                search_html = self.source_parameters[source]['search_results']['html']
-                news_url_found = []
-                if search_status == 200:
-                    # TODO: Add tolerance to accept not only class
-                    listing_object_class_name = self.source_parameters[source]['listing_steps'][0]['loc']['class']
-                    listing_object_type = self.source_parameters[source]['listing_steps'][0]['type']
-                    listing_object_properties = self.source_parameters[source]['listing_steps'][0]['loc']
-                    source_domain = self.source_parameters[source]['domain']
-                    soup = BeautifulSoup(search_html, 'html.parser')
-                    elements = soup.find_all(class_=lambda x: x and x.startswith(listing_object_class_name))
-                    if len(elements) == 0:
-                        elements = soup.find_all(f"{listing_object_type}", listing_object_properties)
-                    if len(elements) != 0:
-                        for element in elements:
-                            http_urls = [a['href'] for a in element.find_all('a', href=True) if
-                                         a['href'].startswith('https')]
-                            if isinstance(http_urls, list):
-                                if len(http_urls) != 0:
-                                    news_url_found = news_url_found + http_urls
-                                else:
-                                    # Another way to get urls, not that safe but works.
-                                    a_list = element.find_all('a', href=True)
-                                    for a in a_list:
-                                        if str(a['href'])[0] == '/':
-                                            divider = ""
-                                        else:
-                                            divider = "/"
-                                        news_url_found.append(f"{source_domain}/{divider}{a['href']}")
-
-                logging.info(f"[Listings] {source} Found {list(set(news_url_found))} news.")
-                if news_url_found != 0:
-                    news_url_found = list(set(news_url_found))
-                    valid_urls = []
-                    for url in news_url_found:
-                        if source in url:
-                            ignore_flag = False
-                            for text in self.ignore_urls_with_text:
-                                if text in url:
-                                    ignore_flag = True
-                            if ignore_flag:
-                                pass
-                            else:
-                                valid_urls.append(url)
-
-                    self.source_parameters[source]['listing_results'] = valid_urls
+                kept_urls.append(url)
+        for reason, count in pruned.items():
+            self.metrics.record_pruned('get_news_listing', source, reason, count)
+        if len(pruned) != 0:
+            logging.info(f"[Listings] {source} Pruned {dict(pruned)} news older than {cutoff:%Y-%m-%d}.")
+        return kept_urls
+
+    def valid_listing_urls(self, source: str, urls: list) -> list:
+        """
+        Function responsible for keeping only the listed urls of the source that are not ignored.
 
+        :param source:
+        :param urls:
+        :return:
+        """
+        valid_urls = []
+        for url in urls:
+            if source in url:
+                ignore_flag = False
+                for text in self.ignore_urls_with_text:
+                    if text in url:
+                        ignore_flag = True
+                if not ignore_flag:
+                    valid_urls.append(url)
+        return valid_urls
+
+    @track_stage('get_news_html', rows_in=_listed_urls, rows_out=_downloaded_pages)
     def get_news_html(self):
         """
         Function responsible for getting entire html for some specific news.
 
         :return:
         """
+        jobs = []
         for source in list(self.source_parameters.keys()):
-
-            if 'news_collect_data' not in list(self.source_parameters[source].keys()):
-                self.source_parameters[source]['news_to_collect_data'] = []
+            self.source_parameters[source]['news_to_collect_data'] = []
             if 'listing_results' not in list(self.source_parameters[source].keys()):
                 self.source_parameters[source]['listing_results'] = []
-            listing_results = self.source_parameters[source]['listing_results']
-
-            if len(listing_results) != 0:
-                # REMOVE THIS
-                listing_results = listing_results[:2]
-                for listing_url in listing_results:
-                    try:
-                        print(listing_url)
-                        response = requests.get(listing_url)
-                        response_status = response.status_code
-                        response_html = response.text
-                        response_html = response_html.encode('utf-8')
-
-                    except requests.RequestException:
-                        response_status = 500
-                        response_html = None
-
-                    # TODO: Add elapsed time to request
-                    logging.info(f"[Request NEWS] {source} | {response_status}")
-                    self.source_parameters[source]['news_to_collect_data'].append({
-                        'url': listing_url,
-                        'status_code': response_status,
-                        'html': str(response_html)})
+            for listing_url in self.source_parameters[source]['listing_results']:
+                stored_row, _ = self.stored_article(source, listing_url)
+                if stored_row is not None:
+                    # Downloaded by a recent run, the stored row is used without any request.
+                    self.source_parameters[source]['news_to_collect_data'].append(
+                        {'url': listing_url, 'status_code': 200, 'error': None, 'html': None,
+                         'stored_row': stored_row})
+                    continue
+                jobs.append({'source': source, 'url': listing_url, 'options': {'resource_type': 'article'}})
+
+        for job, response in zip(jobs, self.fetch_engine.fetch_all(jobs)):
+            source = job['source']
+            logging.info(f"[Request NEWS] {source} | {response['status_code']} | {response['elapsed']:.2f}s")
+            stored_row, content_hash = None, None
+            if response['status_code'] == 200 and response['html'] is not None:
+                stored_row, content_hash = self.stored_article(source, job['url'], response['html'])
+            if stored_row is not None:
+                # Same page as the stored one, it is neither archived nor parsed again.
+                news_article = {'url': job['url'], 'status_code': 200, 'error': None, 'html': None,
+                                'stored_row': stored_row}
+            else:
+                news_article = self.archive_page(source, job['url'], response)
+                news_article['content_hash'] = content_hash
+            self.source_parameters[source]['news_to_collect_data'].append(news_article)
         return self.source_parameters
 
+    def _request_page(self, source, url, resource_type=None):
+        """
+        Function responsible for downloading a single page, used by the fetch engine.
+        Failed requests keep the real status code (None when there was no answer) and the error message.
+
+        :param source:
+        :param url:
+        :param resource_type: 'search' or 'article', selects the cache policy.
+        :return:
+        """
+        response = self.http_client.get(url, source=source, resource_type=resource_type)
+        response_html = None
+        if response.content is not None:
+            response_html = response.text.encode('utf-8')
+        return {'source': source, 'url': url, 'status_code': response.status_code, 'html': response_html,
+                'error': response.error, 'elapsed': response.elapsed}
+
+    @track_stage('parse_each_news', rows_in=_downloaded_pages, rows_out=lambda bot: len(bot.extracted_data))
     def parse_each_news(self):
         """
         Function responsible for collecting raw data.
 
         :return:
         """
-        try:
-            self.search_parameters['text_phrase']
-        except KeyError:
-            self.search_parameters['text_phrase'] = "Golden Medal Paris 2024"
-            self.search_parameters['news_category'] = "sports"
-            self.search_parameters['max_months'] = 2
+        self._set_default_search_parameters()
+        if self.process_pool is not None:
+            self._parse_each_news_in_workers()
+        else:
+            for source in list(self.source_parameters.keys()):
+                self.source_parameters[source]['collected_data'] = []
+                for news_article in self.source_parameters[source]['news_to_collect_data']:
+                    if news_article.get('stored_row') is not None:
+                        self._collect_stored_row(source, news_article)
+                        continue
+                    article_status = news_article['status_code']
+                    url = news_article['url']
+                    search_html = self.read_page(news_article)
+                    if article_status == 200 and search_html is not None:
+                        try:
+                            generated_row = self.extraction_plans[source].parse_article(url, search_html)
+                        except Exception as error:
+                            self._row_error('parse', url, error)
+                            continue
+                        if generated_row is not None and self.keep_parsed_row(source, news_article, generated_row):
+                            self.source_parameters[source]['collected_data'].append(generated_row)
+
+        if self.article_store is not None:
+            self.article_store.commit()
         for source in list(self.source_parameters.keys()):
-            self.source_parameters[source]['collected_data'] = []
-            for news_article in self.source_parameters[source]['news_to_collect_data']:
-                article_status = news_article['status_code']
-                url = news_article['url']
-                search_html = news_article['html']
-                if article_status == 200 and search_html is not None:
-                    generated_row = {'url': url, 'source': source}
-                    soup = BeautifulSoup(search_html, 'html.parser')
-                    # TODO: Add tolerance to accept not only class
-                    for step_dict in self.source_parameters[source]['extraction_steps']:
-                        column_name = step_dict['column_name']
-                        object_type = step_dict['type']
-                        object_param = step_dict['loc']
-                        result = None
-
-                        element = soup.find(f'{object_type}', object_param)
-                        if element is None:
-                            try:
-                                element = soup.find(class_=lambda x: x and x.startswith(object_param['class']))
-                            except AttributeError:
-                                pass
-                        if element is None:
-                            try:
-                                element = soup.find(id_=lambda x: x and x.startswith(object_param['id']))
-                            except AttributeError:
-                                pass
-
-                        if element is not None:
-                            if column_name == "title":
-                                result = element.text
-                            elif column_name == "description":
-                                result = element.findNext('p').text
-
-                            elif column_name == "full_text":
-                                full_text = ""
-                                all_p = element.find_all('p')
-                                if len(all_p) != 0:
-                                    for p in all_p:
-                                        if full_text == "":
-                                            full_text = f"{p.text}"
-                                        else:
-                                            full_text = f"{full_text}\n{p.text}"
-                                else:
-                                    full_text = element.text
-                                result = full_text
-
-                            elif column_name == "date":
-                                try:
-                                    try:
-                                        result = str(element['datetime'])
-                                        if len(result) == 0:
-                                            result = str(element.text)
-                                    except AttributeError:
-                                        result = str(element['data-timestamp'])
-                                    except TypeError:
-                                        result = str(element['data-timestamp'])
-                                    except ValueError:
-                                        result = str(element['data-timestamp'])
-
-                                except ValueError:
-                                    result = str(element.text)
-                                except KeyError:
-                                    result = str(element.text)
-
-                            elif column_name == "picture_url":
-                                result = str(element['src'])
-
-                            else:
-                                result = str(element.text)
-                            generated_row[column_name] = result
-                        else:
-                            generated_row[column_name] = result
-                    self.source_parameters[source]['collected_data'].append(generated_row)
-
             print(self.source_parameters[source]['collected_data'])
+            self.metrics.record_parsed_rows(source, self.source_parameters[source]['collected_data'],
+                                            self.extraction_plans[source].column_names)
             if len(self.source_parameters[source]['collected_data']) != 0:
                 self.extracted_data = self.extracted_data + self.source_parameters[source]['collected_data']
         return self.extracted_data
+
+    def _parse_each_news_in_workers(self):
+        """
+        Same as the loop of parse_each_news, with the articles of every source parsed by the process pool.
+
+        :return:
+        """
+        jobs = []
+        for source in list(self.source_parameters.keys()):
+            self.source_parameters[source]['collected_data'] = []
+            for news_article in self.source_parameters[source]['news_to_collect_data']:
+                if news_article.get('stored_row') is not None:
+                    self._collect_stored_row(source, news_article)
+                elif news_article['status_code'] == 200 and (news_article.get('archive_ref') is not None
+                                                             or news_article.get('html') is not None):
+                    jobs.append({'source': source, 'url': news_article['url'],
+                                 'archive_ref': news_article.get('archive_ref'), 'html': news_article.get('html'),
+                                 'content_hash': news_article.get('content_hash')})
+        rows, errors = self.process_pool.parse_articles(jobs)
+        for error in errors:
+            self._row_error(error['stage'], error['url'], error['error'])
+        for job, generated_row in zip(jobs, rows):
+            if generated_row is not None and self.keep_parsed_row(job['source'], job, generated_row):
+                self.source_parameters[job['source']]['collected_data'].append(generated_row)
+
+    def _collect_stored_row(self, source, news_article):
+        # Rows of the article store did not change, they are not part of a delta.
+        if not self.search_parameters.get('only_changed_articles', False):
+            self.source_parameters[source]['collected_data'].append(news_article['stored_row'])
+
+    def _row_error(self, stage, url, error):
+        message = error if isinstance(error, str) else f"{type(error).__name__}: {error}"
+        logging.warning(f"[{stage.capitalize()}] {url} | {message}")
+        self.row_errors.append({'stage': stage, 'url': url, 'error': message})
+
+    def parse_archived_pages(self, run_id: str = None):
+        """
+        Function responsible for collecting raw data again from the archived pages, without any request.
+
+        :param run_id: only the pages of this run, every archived page when None.
+        :return:
+        """
+        sources_config = self._get_sources()
+        archive = self._page_archive
+        if archive is None:
+            # Reading only, another process can be appending to the archive.
+            archive = PageArchive(folder=self.page_archive_folder(), read_only=True)
+        for record, page in archive.iter_records(run_id=run_id):
+            if record['status_code'] != 200 or record['source'] not in sources_config:
+                continue
+            generated_row = self.extraction_plans[record['source']].parse_article(record['url'], page)
+            if generated_row is not None:
+                self.extracted_data.append(generated_row)
+        return self.extracted_data
     
     def generate_text_embedding(self, text: str):
         """
@@ -378,6 +813,139 @@ class NewsDataExtractor:
         text_embedding = self.nlp(text).vector
         return text_embedding
 
+    def generate_text_embeddings(self, texts: list, batch_size: int = 64, n_process: int = 1) -> list:
+        """
+        Function responsible for creating embeddings for many texts at once.
+        Texts are streamed through ``nlp.pipe`` so spaCy can batch them, the vectors keep the input order.
+
+        :param texts:
+        :param batch_size: number of texts per spaCy batch.
+        :param n_process: number of processes used by spaCy, 1 keeps everything in this process.
+        :return:
+        """
+        started_at = time.perf_counter()
+        if n_process == 1 and self.process_pool is not None:
+            vectors = self.process_pool.embed_texts(texts)
+        else:
+            vectors = [doc.vector for doc in self.nlp.pipe(texts, batch_size=batch_size, n_process=n_process)]
+        self.metrics.record_embeddings(len(texts), time.perf_counter() - started_at)
+        return vectors
+
+    @property
+    def embedding_store(self):
+        """
+        Persistent store of the article embeddings, None when disabled with ``use_embedding_store``.
+
+        :return:
+        """
+        if self._embedding_store is None and self.search_parameters.get('use_embedding_store', True):
+            self._embedding_store = EmbeddingStore(folder=self.root_folder / 'output' / 'embedding_store',
+                                                   model_name=SPACY_MODEL_NAME,
+                                                   model_version=spacy_model_version(SPACY_MODEL_NAME),
+                                                   reset_on_mismatch=True)
+        return self._embedding_store
+
+    @property
+    def ann_index(self):
+        """
+        Approximate nearest neighbour index over every article collected so far, None unless ``use_ann_index`` or
+        ``"similarity_scope": "corpus"``. Articles of the embedding store missing from the saved index are added
+        when it is opened. ``ann_n_probe`` (DEFAULT_N_PROBE) trades recall for speed, see benchmarks.bench_ann.
+
+        :return:
+        """
+        if self._ann_index is None and (self.search_parameters.get('use_ann_index', False)
+                                        or self.search_parameters.get('similarity_scope') == 'corpus'):
+            index_path = self.root_folder / 'output' / 'ann_index.npz'
+            model_version = spacy_model_version(SPACY_MODEL_NAME)
+            index = None
+            if index_path.exists():
+                index = IVFIndex.load(index_path)
+                if (index.model_name, index.model_version) != (SPACY_MODEL_NAME, model_version):
+                    logging.warning(f"[ANN] {index_path} was built with another model, rebuilding it.")
+                    index = None
+            if index is None:
+                index = IVFIndex(model_name=SPACY_MODEL_NAME, model_version=model_version)
+            index.n_probe = int(self.search_parameters.get('ann_n_probe', DEFAULT_N_PROBE))
+            store = self.embedding_store
+            if store is not None:
+                missing_urls = [url for url in store.index if url not in index.positions]
+                if len(missing_urls) != 0:
+                    index.add(missing_urls, store.matrix[[store.index[url][1] for url in missing_urls]])
+                    index.save(index_path)
+            self._ann_index = index
+        return self._ann_index
+
+    def search_corpus(self, text, k: int = 100) -> pd.DataFrame:
+        """
+        Function responsible for finding the articles closest to a text among everything in the ANN index.
+
+        :param text: text or list of texts, each article keeps its best similarity.
+        :param k: number of articles returned per text.
+        :return: DataFrame with url and similarities, most similar first.
+        """
+        texts = [text] if isinstance(text, str) else list(text)
+        best_scores = {}
+        for results in self.ann_index.search(self.generate_text_embeddings(texts), k=k):
+            for url, similarity in results:
+                best_scores[url] = max(similarity, best_scores.get(url, similarity))
+        df = pd.DataFrame({'url': list(best_scores.keys()), 'similarities': list(best_scores.values())})
+        return df.sort_values(by='similarities', ascending=False, kind='stable').reset_index(drop=True)
+
+    def corpus_candidates(self, text, k: int = None) -> pd.DataFrame:
+        """
+        Function responsible for scoring every article collected so far instead of the rows of this run: the
+        ``ann_k`` (100) articles of the ANN index closest to the text, with their normalized row from this run or,
+        for older articles, from the article store.
+
+        :param text: text or list of texts.
+        :param k: articles returned per text.
+        :return: normalized rows with their similarities, most similar first.
+        """
+        scores = self.search_corpus(text, k=int(k or self.search_parameters.get('ann_k', 100)))
+        rows = {row['url']: row for row in self.processed_raw_data}
+        older_urls = [url for url in scores['url'] if url not in rows]
+        if len(older_urls) != 0 and self.article_store is not None:
+            rows.update(self.article_store.normalized_rows_by_url(older_urls))
+        candidates = []
+        for url, similarity in zip(scores['url'], scores['similarities']):
+            if url in rows:
+                candidates.append(dict(rows[url], similarities=similarity))
+        if len(candidates) != len(scores):
+            logging.warning(f"[ANN] {len(scores) - len(candidates)} of {len(scores)} candidates have no stored row.")
+        if len(candidates) == 0:
+            return pd.DataFrame(columns=list(self.normalized_data.columns) + ['similarities'])
+        return pd.DataFrame(candidates)
+
+    def generate_row_embeddings(self, rows: list) -> list:
+        """
+        Function responsible for creating the embedding of every article row.
+        Articles already in the embedding store with the same content are read from it, the others are
+        embedded in batches and appended to the store.
+
+        :param rows:
+        :return: one vector per row, in order.
+        """
+        texts = [f"{row['title']} {row['full_text']}" for row in rows]
+        batch_size = int(self.search_parameters.get('embedding_batch_size', 64))
+        n_process = int(self.search_parameters.get('embedding_n_process', 1))
+        store = self.embedding_store
+        if store is None:
+            return self.generate_text_embeddings(texts=texts, batch_size=batch_size, n_process=n_process)
+
+        content_hashes = [store.content_hash(text) for text in texts]
+        embeddings = [store.get(row['url'], content_hash) for row, content_hash in zip(rows, content_hashes)]
+        missing = [position for position, embedding in enumerate(embeddings) if embedding is None]
+        logging.info(f"[Embeddings] {len(rows) - len(missing)} read from store, {len(missing)} to generate.")
+        self.metrics.record_embeddings(0, 0.0, from_store=len(rows) - len(missing))
+        new_embeddings = self.generate_text_embeddings(texts=[texts[position] for position in missing],
+                                                       batch_size=batch_size, n_process=n_process)
+        for position, embedding in zip(missing, new_embeddings):
+            embeddings[position] = embedding
+            store.add(rows[position]['url'], content_hashes[position], embedding)
+        store.flush()
+        return embeddings
+
     @staticmethod
     def nlp_cosine_similarity(vector_a, vector_b):
         """
@@ -392,205 +960,106 @@ class NewsDataExtractor:
         magnitude_b = np.linalg.norm(vector_b)
         return dot_product / (magnitude_a * magnitude_b)
 
-    def calculate_similarity_from_text(self, df: pd.DataFrame, text: str) -> pd.DataFrame:
+    def calculate_similarity_from_text(self, df: pd.DataFrame, text, embedding_matrix: np.ndarray = None) -> pd.DataFrame:
         """
         Function that is responsible for creating a new column to refer similarities distances.
+        Several texts can be scored at once (e.g. category and text phrase), each row keeps the best one.
+
         :param df:
-        :param text:
+        :param text: text or list of texts.
+        :param embedding_matrix: normalized embeddings aligned with the rows of df, built from df when None.
         :return:
         """
+        texts = [text] if isinstance(text, str) else list(text)
+        if len(df) == 0:
+            df['similarities'] = pd.Series(dtype='float64')
+            return df
+        if embedding_matrix is None:
+            embedding_matrix = build_embedding_matrix(df['embedding'].tolist())
+        query_matrix = build_embedding_matrix(self.generate_text_embeddings(texts))
 
-        text_embedding = self.generate_text_embedding(text)
-
-        # Calculate distances between the text embedding and each embedding in the DataFrame
-        df['similarities'] = df['embedding'].apply(lambda emb: self.nlp_cosine_similarity(text_embedding, emb).item())
-        df_sorted = df.sort_values(by='similarities', ascending=True)
+        # One matrix product scores every row against every text.
+        scores = score_queries(embedding_matrix, query_matrix)
+        df['similarities'] = combine_query_scores(scores)
 
-        return df_sorted
+        return df
 
     @staticmethod
-    def filter_similarity_by_closest(df, max_percentage=0.1):
+    def filter_similarity_by_closest(df, max_percentage=0.1, top_k: int = None):
         """
         Nearest Neighbors similarity.
 
         :param df:
-        :param max_percentage:
+        :param max_percentage: keep rows within this percentage of the maximum similarity.
+        :param top_k: keep the k most similar rows instead of using max_percentage.
         :return:
         """
-        # Determine the cutoff similarity value for the top 'top_percent' of similar entries
-        max_similarity = df['similarities'].max()
-        cutoff_similarity = max_similarity * (1 - max_percentage)
+        scores = df['similarities'].to_numpy(dtype=np.float64)
+        if top_k is not None:
+            selected = top_k_indices(scores, top_k)
+        else:
+            # Keep only entries within the top 'max_percentage' of the maximum similarity
+            selected = np.flatnonzero(closest_mask(scores, max_percentage))
 
-        # Filter the DataFrame to keep only entries within the top 'top_percent' of the maximum similarity
-        df_filtered = df[df['similarities'] >= cutoff_similarity].reset_index(drop=True)
+        # Only the kept rows are sorted
+        df_filtered = df.iloc[selected].sort_values(by='similarities', ascending=True, kind='stable')
 
-        return df_filtered
+        return df_filtered.reset_index(drop=True)
 
-    def normalize_all_data(self):
+    def normalize_rows(self, rows: list) -> list:
         """
-        Function responsible to normalize every column in raw collected data.
+        Function responsible to normalize every column of raw rows: dates, texts and monetary info.
+        Rows without title are dropped, images and embeddings are handled by the caller.
 
+        :param rows:
         :return:
         """
-        def clean_text(text):
-            """
-            Normalize text by removing extra spaces, HTML tags, and unwanted characters.
-
-            Parameters:
-            text (str): The text to be cleaned.
-
-            Returns:
-            str: Cleaned text.
-            """
-            if not isinstance(text, str):
-                return text
-            # Remove HTML tags
-            text = BeautifulSoup(text, "html.parser").get_text()
-            # Remove unwanted characters
-            text = re.sub(r'\s+', ' ', text).strip()
-            return text
-
-        def parse_date(date_str):
-            """
-            Parse different date formats and convert them to datetime format.
-
-            Parameters:
-            date_str (str): The date string to be parsed.
-
-            Returns:
-            datetime: The parsed datetime object or None if parsing fails.
-            """
-            try:
-                # Case where date is a timestamp in milliseconds
-                if date_str.isdigit():
-                    return datetime.datetime.fromtimestamp(int(date_str) / 1000)
-
-                # Case where date is a standard formatted date string
-                formats = [
-                    "%B %d, %Y at %I:%M %p",  # e.g., August 17, 2024 at 6:23 PM
-                    "%Y-%m-%d",  # e.g., 2024-08-17
-                    "%A, %B %d, %Y, %I:%M %p",  # e.g., Saturday, August 17, 2024, 6:47 PM
-                    "%b %d, %Y",  # e.g., Aug 8, 2024
-                    "%B %d, %Y",  # e.g., August 17, 2024
-                    "%b %d, %YModified %b %d, %Y"  # e.g., Published Jul 18, 2024Modified Jul 19, 2024
-                ]
-
-                for fmt in formats:
-                    try:
-                        return datetime.datetime.strptime(date_str, fmt)
-                    except ValueError:
-                        continue
-
-                # Handle "Published" and "Modified" dates with keywords
-                if "Published" in date_str or "Modified" in date_str:
-                    cleaned_str = re.sub(r"(Published|Modified)\s*", "", date_str)
-                    return parse_date(cleaned_str)
-
-            except:
-                logging.warning('Failed to parse Date')
-                return None
+        store = self.article_store
+        if store is None or len(rows) == 0:
+            return self._normalize_raw_rows(rows)
+        # Rows normalized by an earlier run from the same raw row are reused.
+        stored_rows = store.normalized_rows(rows)
+        missing_rows = {row['url']: dict(row) for row, stored_row in zip(rows, stored_rows) if stored_row is None}
+        new_rows = self._normalize_raw_rows([row for row, stored_row in zip(rows, stored_rows) if stored_row is None])
+        store.save_normalized_rows([missing_rows[row['url']] for row in new_rows], new_rows)
+        new_rows_by_url = {row['url']: row for row in new_rows}
+        formatted_rows = []
+        for row, stored_row in zip(rows, stored_rows):
+            formatted_row = stored_row if stored_row is not None else new_rows_by_url.get(row['url'])
+            if formatted_row is not None:
+                formatted_rows.append(formatted_row)
+        return formatted_rows
+
+    def _normalize_raw_rows(self, rows: list) -> list:
+        if self.process_pool is not None:
+            formatted_rows, errors = self.process_pool.normalize_rows(rows, date_parser=self.date_parser)
+        else:
+            formatted_rows, errors = normalize_raw_rows(rows, self.date_parser)
+        for error in errors:
+            self._row_error(error['stage'], error['url'], error['error'])
+        return formatted_rows
 
-        def contains_monetary_info(text):
-
-            if not isinstance(text, str):
-                return False
-
-            # Define patterns to match common currency symbols and keywords
-            monetary_patterns = [
-                r'\$\d+',  # Matches dollar amounts like $100
-                r'€\d+',  # Matches euro amounts like €100
-                r'£\d+',  # Matches pound amounts like £100
-                r'\d+\s?(dollars|USD|euros|pounds)',  # Matches written forms like "100 dollars"
-                r'\d+\s?(cents|pennies)',  # Matches small units like "50 cents"
-                r'\d+\s?₹',  # Matches rupee amounts like ₹100
-                r'¥\d+',  # Matches yen amounts like ¥100
-                r'\d+\s?(yen|RMB|yuan)'  # Matches written forms like "100 yen"
-            ]
-
-            pattern = '|'.join(monetary_patterns)
-
-            return bool(re.search(pattern, text, re.IGNORECASE))
-
-        def download_image(image_url, save_directory=None):
-            try:
-                # Send a GET request to the image URL
-                response = requests.get(image_url, stream=True)
-                response.raise_for_status()
-
-                # Extract the image file name and extension from the URL
-                parsed_url = urlparse(image_url)
-                image_name = Path(parsed_url.path).name
-
-                if save_directory is None:
-                    save_directory = f"{self.current_folder}/downloaded_images"
-                # Ensure the save directory exists
-                save_path = Path(save_directory)
-                save_path.mkdir(parents=True, exist_ok=True)
-
-                # Determine the image format and file extension
-                image_extension = Path(image_name).suffix.lower()
-                if not image_extension:
-                    # If no extension is found in the URL, infer from the content type
-                    content_type = response.headers.get('Content-Type')
-                    if content_type == 'image/jpeg':
-                        image_extension = '.jpg'
-                    elif content_type == 'image/png':
-                        image_extension = '.png'
-                    elif content_type == 'image/webp':
-                        image_extension = '.webp'
-                    else:
-                        return None
-                    image_name += image_extension
-
-                # Save the image to the specified directory
-                image_path = save_path / image_name
-                with open(image_path, 'wb') as image_file:
-                    for chunk in response.iter_content(1024):
-                        image_file.write(chunk)
-
-                return str(image_path)
-
-            except requests.exceptions.RequestException as e:
-                logging.warning(f"Error downloading the image: {e}")
-                return None
-            except ValueError as e:
-                print(e)
-                logging.warning(f"Error downloading the image: {e}")
-                return None
-            except OSError:
-                logging.warning(f"Error downloading the image")
-                return None
+    @track_stage('normalize_all_data', rows_in=lambda bot: len(bot.extracted_data),
+                 rows_out=lambda bot: len(bot.normalized_data))
+    def normalize_all_data(self):
+        """
+        Function responsible to normalize every column in raw collected data.
 
-        formatted_rows = []
-        for row in self.extracted_data:
-            try:
-                if row['title'] is not None:
-                    if '·' in str(row['date']):
-                        row['date'] = str(row['date']).split('·')[0].strip()
-                    elif 'Published' in str(row['date']):
-                        row['date'] = str(row['date']).split('Published')[1].strip()
-                        if 'Modified' in str(row['date']):
-                            row['date'] = str(row['date']).split('Modified')[0].strip()
-                    to_remove = ['SAT,', 'MON,', 'WED,', 'THU,', 'FRI', 'TUE,', 'SUN,']
-                    for value_to_remove in to_remove:
-                        if value_to_remove in str(row['date']).upper():
-                            row['date'] = str(row['date']).split(f"{str(row['date']).split(',')[0]},")[1].strip()
-                    formatted_date = parse_date(str(row['date']))
-                    row['date'] = formatted_date
-                    row['title'] = clean_text(row['title'])
-                    row['description'] = clean_text(row['description'])
-                    row['full_text'] = clean_text(row['full_text'])
-                    row['authors'] = clean_text(row['authors'])
-                    monetary_info = contains_monetary_info(row['title'])
-                    if not monetary_info:
-                        monetary_info = contains_monetary_info(row['description'])
-                    row['contains_monetary'] = monetary_info
-                    picture_downloaded = download_image(image_url=row['picture_url'])
-                    row['picture_path'] = picture_downloaded
-                    row['embedding'] = self.generate_text_embedding(text=f"{row['title']} {row['full_text']}")
-                    formatted_rows.append(row)
-            except:
-                pass
+        :return:
+        """
+        formatted_rows = self.normalize_rows(self.extracted_data)
+        if self.search_parameters.get('download_images', 'all') == 'all':
+            self.download_images(formatted_rows)
+
+        # Embeddings are generated in batches once every row is clean, it is the slowest part of this step.
+        embeddings = self.generate_row_embeddings(formatted_rows)
+        for row, embedding in zip(formatted_rows, embeddings):
+            row['embedding'] = embedding
+        self.embedding_matrix = build_embedding_matrix(embeddings)
+        if self.ann_index is not None:
+            # Articles indexed by earlier runs with the same vector are not added again.
+            if self.ann_index.update([row['url'] for row in formatted_rows], embeddings) != 0:
+                self.ann_index.save(self.root_folder / 'output' / 'ann_index.npz')
         self.processed_raw_data = formatted_rows
         self.normalized_data = pd.DataFrame(formatted_rows)
         print(self.normalized_data)
@@ -609,16 +1078,8 @@ class NewsDataExtractor:
             # Ensure the date_column is in datetime format
             df[date_column] = pd.to_datetime(df[date_column])
 
-            # Get the current date
-            current_date = datetime.datetime.now()
-
-            # Calculate the start date
-            if months_back <= 1:
-                start_date = current_date.replace(day=1)
-            else:
-                # Calculate the start date for the number of months_back
-                first_day_of_current_month = current_date.replace(day=1)
-                start_date = first_day_of_current_month - pd.DateOffset(months=months_back - 1)
+            # Calculate the start date for the number of months_back
+            start_date = months_back_start(months_back)
 
             # Filter the DataFrame
             df_filtered = df[df[date_column] >= start_date]
@@ -627,16 +1088,31 @@ class NewsDataExtractor:
 
         return df_filtered
 
+    @track_stage('filter_data', rows_in=lambda bot: len(bot.normalized_data),
+                 rows_out=lambda bot: len(bot.filtered_news))
     def filter_data(self):
         """
         Filter data based in nearest neighbors by  text or caregory.
 
         :return:
         """
+        if self.is_batch:
+            self.filter_queries()
+            return
+        df = self.normalized_data
+        embedding_matrix = self.embedding_matrix
+        if embedding_matrix is not None and embedding_matrix.shape[0] != len(df):
+            embedding_matrix = None
 
         if self.search_parameters['news_category'] is not None and self.search_parameters['news_category'] != "":
-            df = self.calculate_similarity_from_text(df=self.normalized_data,
-                                                     text=self.search_parameters['news_category'])
+            if self.search_parameters.get('similarity_scope', 'run') == 'corpus':
+                # Candidates come from every run through the ANN index.
+                df = self.corpus_candidates(self.search_parameters['news_category'])
+            else:
+                # The rows of this run are scored exactly.
+                df = self.calculate_similarity_from_text(df=self.normalized_data,
+                                                         text=self.search_parameters['news_category'],
+                                                         embedding_matrix=embedding_matrix)
             df = self.filter_similarity_by_closest(df=df, max_percentage=0.6)
 
             # df = self.calculate_similarity_from_text(df=df,
@@ -649,24 +1125,157 @@ class NewsDataExtractor:
         #    df = self.filter_similarity_by_closest(df=df)
 
         if self.search_parameters['max_months'] is not None:
-            df = self.filter_by_date(df=df, months_back=int(self.search_parameters['max_months']))
+            df_filtered = self.filter_by_date(df=df, months_back=int(self.search_parameters['max_months']))
+            df = self._record_date_pruned(df, df_filtered)
+        if self.search_parameters.get('download_images', 'all') == 'filtered':
+            df = self._download_kept_images([df])[0]
         self.filtered_news = df.copy()
         print(self.filtered_news)
 
+    def filter_queries(self):
+        """
+        Filter the rows of every query of a batch: a query keeps the articles listed by its search, filtered by
+        its category and months. Every category is embedded once and scored against one embedding matrix.
+
+        Results go to ``query_results``, one DataFrame per query, and to ``filtered_news`` with a ``query``
+        column holding the position of the query.
+
+        :return:
+        """
+        df = self.normalized_data
+        queries = self.queries
+        query_urls = self.search_parameters.get('query_urls', [[] for _ in queries])
+        categories = list(dict.fromkeys(query['news_category'] for query in queries if query['news_category']))
+        scores = None
+        if len(categories) != 0 and len(df) != 0:
+            embedding_matrix = self.embedding_matrix
+            if embedding_matrix is None or embedding_matrix.shape[0] != len(df):
+                embedding_matrix = build_embedding_matrix(df['embedding'].tolist())
+            # One matrix product scores every row against every category.
+            scores = score_queries(embedding_matrix, build_embedding_matrix(self.generate_text_embeddings(categories)))
+
+        query_results = []
+        for position, query in enumerate(queries):
+            if len(df) == 0:
+                query_results.append(df.copy())
+                continue
+            selected = df['url'].isin(set(query_urls[position])).to_numpy()
+            query_df = df[selected].copy()
+            if query['news_category'] and len(query_df) != 0:
+                query_df['similarities'] = scores[selected, categories.index(query['news_category'])]
+                query_df = self.filter_similarity_by_closest(df=query_df, max_percentage=0.6)
+            if query['max_months'] is not None:
+                query_df_filtered = self.filter_by_date(df=query_df, months_back=int(query['max_months']))
+                query_df = self._record_date_pruned(query_df, query_df_filtered)
+            query_results.append(query_df.reset_index(drop=True))
+            logging.info(f"[Filter] query {position} {query['text_phrase']!r} kept {len(query_df)} news.")
+        if self.search_parameters.get('download_images', 'all') == 'filtered':
+            query_results = self._download_kept_images(query_results)
+        self.query_results = query_results
+        kept_frames = [query_df.assign(query=position) for position, query_df in enumerate(query_results)
+                       if not query_df.empty]
+        self.filtered_news = pd.concat(kept_frames, ignore_index=True) if len(kept_frames) != 0 else pd.DataFrame([])
+        print(self.filtered_news)
+
+    def _record_date_pruned(self, df: pd.DataFrame, df_filtered: pd.DataFrame) -> pd.DataFrame:
+        # Rows dropped by filter_by_date made it through every stage, the pruning of the listing missed them.
+        if len(df) != len(df_filtered):
+            pruned = df['source'].value_counts().sub(df_filtered['source'].value_counts(), fill_value=0)
+            for source, count in pruned.items():
+                if count > 0:
+                    self.metrics.record_pruned('filter_data', source, 'article_date', int(count))
+        return df_filtered
+
+    def _download_kept_images(self, frames: list) -> list:
+        # Only the pictures of the rows that are kept are downloaded, once even when several frames keep them.
+        kept_urls = set()
+        for frame in frames:
+            if not frame.empty:
+                kept_urls.update(frame['url'])
+        if len(kept_urls) == 0:
+            return frames
+        kept_rows = self.download_images([row for row in self.processed_raw_data if row['url'] in kept_urls])
+        picture_paths = {row['url']: row['picture_path'] for row in kept_rows}
+        return [frame if frame.empty else frame.assign(picture_path=frame['url'].map(picture_paths))
+                for frame in frames]
+
+    @track_stage('save_final_data', rows_in=lambda bot: len(bot.filtered_news))
     def save_final_data(self):
         """
-        Saves all the collected and normalized data to xlsx format.
+        Saves all the collected and normalized data to output/results.<format>, for every format of
+        ``output_formats`` (xlsx by default, see exporters.EXPORTERS). Rows are streamed to the files.
+        The results of every query of a batch are also saved to output/results_query_<position>.<format>.
+        In json, the filtered rows go to output/results_filtered.json, output/results.json holds every
+        normalized row of the run (written by the robot tasks).
 
         :return:
         """
+        formats = output_formats(self.search_parameters.get('output_formats'))
+        for position, query_df in enumerate(self.query_results):
+            if not query_df.empty:
+                query_df = query_df.drop(columns=['embedding', 'similarities'], errors='ignore')
+                query_df['date'] = query_df['date'].astype(str)
+                export_dataframe(query_df, 'output', f"results_query_{position}", formats)
+                self.query_results[position] = query_df
         if not self.filtered_news.empty:
-            self.filtered_news = self.filtered_news.drop(columns=['embedding', 'similarities'])
+            self.filtered_news = self.filtered_news.drop(columns=['embedding', 'similarities'], errors='ignore')
             self.filtered_news['date'] = self.filtered_news['date'].astype(str)
-            self.filtered_news.to_excel(f"output/results.xlsx")
+            # output/results.json is the dump of every normalized row, the filtered rows get their own json file.
+            export_dataframe(self.filtered_news, 'output', 'results',
+                             [output_format for output_format in formats if output_format != 'json'])
+            if 'json' in formats:
+                export_dataframe(self.filtered_news, 'output', 'results_filtered', ['json'])
             return self.filtered_news, self.processed_raw_data
         else:
             return None, self.processed_raw_data
 
+    def close(self):
+        """
+        Function responsible for releasing the http sessions, worker processes, the page archive and the article store.
+
+        :return:
+        """
+        if self._date_parser is not None:
+            self._date_parser.log_summary()
+        if len(self.row_errors) != 0:
+            logging.warning(f"[Errors] {len(self.row_errors)} rows failed: {self.row_errors}")
+        if self._process_pool is not None:
+            self._process_pool.close()
+        self.http_client.close()
+        if self._page_archive is not None:
+            self._page_archive.close()
+        if self._article_store is not None:
+            self._article_store.close()
+        if self.profiler is not None:
+            self.profiler.save()
+
+    def save_metrics(self, step: str):
+        """
+        Function responsible for writing the metrics of this run to output/metrics_<step>.json and .prom,
+        unless ``use_metrics`` is False.
+
+        :param step: 'step_1' or 'step_2'.
+        :return: paths of the files, None when disabled.
+        """
+        if not self.search_parameters.get('use_metrics', True):
+            return None
+        return self.metrics.export(self.root_folder / 'output', step=step)
+
+    def stream_news(self):
+        """
+        Streaming version of search_news -> get_news_listing -> get_news_html -> parse_each_news.
+        Raw rows are yielded as soon as they are parsed and pages are not kept in memory.
+
+        Articles are parsed in this process, ``workers`` above 1 is refused instead of being ignored.
+
+        :return: generator of raw rows.
+        """
+        if int(self.search_parameters.get('workers', 1)) > 1:
+            raise ValueError("streaming parses the articles as they arrive and does not use workers, "
+                             "run with streaming or with workers but not both")
+        self._set_default_search_parameters()
+        return stream_news(self, window=int(self.search_parameters.get('stream_window', 32)))
+
     def extraction_manager(self):
         """
         Function that initialize every step.
@@ -686,34 +1295,132 @@ class NewsDataExtractor:
         self.save_final_data()
 
 
-def initialize_step_1(user_input):
+def initialize_step_1(user_input, artifact_path=None):
     """
     Function that only collect data from websites.
 
     :param user_input:
-    :return:
+    :param artifact_path: when given, the rows are written to this Parquet artifact and its reference is returned.
+        With ``streaming``, every row goes to the file as soon as it is parsed, the rows are never held together.
+    :return: rows, or the reference of the artifact.
     """
     logging.info(f"Initializing Class")
+    started_at = time.perf_counter()
+    bot_class = NewsDataExtractor(search_parameters=user_input)
+    # The reference travels to step 2 with the user inputs, the pages themselves stay on disk.
+    bot_class.search_parameters['page_archive'] = bot_class.page_archive_reference()
+    if bot_class.search_parameters.get('streaming', False):
+        logging.info('initializing streaming functions 1 to 4')
+        collected_data = bot_class.stream_news()
+        if artifact_path is None:
+            collected_data = list(collected_data)
+    else:
+        logging.info('initializing function 1 - Search News')
+        bot_class.search_news()
+        logging.info('initializing function 2 - Get URLs from Listings')
+        bot_class.get_news_listing()
+        logging.info('initializing function 3 - Get HTML from each news')
+        bot_class.get_news_html()
+        logging.info('initializing function 4 - Extract raw data')
+        collected_data = bot_class.parse_each_news()
+    if artifact_path is not None:
+        # pyarrow is only imported by the steps that write the artifact.
+        from news_data_extractor.source.artifacts import write_rows_artifact
+
+        collected_data = write_rows_artifact(collected_data, artifact_path)
+    bot_class.metrics.record_stage('initialize_step_1', time.perf_counter() - started_at,
+                                   rows_out=collected_data['rows'] if artifact_path is not None
+                                   else len(collected_data))
+    bot_class.save_metrics('step_1')
+    bot_class.close()
+    return collected_data
+
+
+def initialize_step_1_plan(user_input):
+    """
+    Function that only searches the websites and splits the listed news into ``shards`` (4) shards, by ``shard_by``
+    ('source', the default, or 'url' hash), for the workers of step_1_shard.
+
+    :param user_input:
+    :return: entries of every shard, see sharding.shard_listing.
+    """
+    started_at = time.perf_counter()
     bot_class = NewsDataExtractor(search_parameters=user_input)
     logging.info('initializing function 1 - Search News')
     bot_class.search_news()
     logging.info('initializing function 2 - Get URLs from Listings')
     bot_class.get_news_listing()
+    listing = {source: config.get('listing_results', []) for source, config in bot_class.source_parameters.items()}
+    shards = shard_listing(listing, int(user_input.get('shards', 4)), shard_by=user_input.get('shard_by', 'source'))
+    logging.info(f"[Shards] {sum(len(urls) for urls in listing.values())} news split in {len(shards)} shards.")
+    bot_class.metrics.record_stage('initialize_step_1_plan', time.perf_counter() - started_at,
+                                   rows_out=sum(len(entries) for entries in shards))
+    bot_class.save_metrics('step_1_plan')
+    bot_class.close()
+    return shards
+
+
+def initialize_step_1_shard(user_input, entries):
+    """
+    Function that only collect data from the news of one shard of initialize_step_1_plan.
+
+    :param user_input: search parameters of the plan, with the ``shard`` number.
+    :param entries: entries of the shard.
+    :return:
+    """
+    started_at = time.perf_counter()
+    bot_class = NewsDataExtractor(search_parameters=user_input)
+    bot_class.search_parameters['page_archive'] = bot_class.page_archive_reference()
+    # Read by step_1_merge, which adds the articles of the shard to the article store of the run.
+    bot_class.search_parameters['shard_article_store'] = (str(bot_class.article_store.path)
+                                                          if bot_class.article_store is not None else None)
+    bot_class.load_listing(shard_sources(entries))
     logging.info('initializing function 3 - Get HTML from each news')
     bot_class.get_news_html()
     logging.info('initializing function 4 - Extract raw data')
     collected_data = bot_class.parse_each_news()
+    bot_class.metrics.record_stage('initialize_step_1_shard', time.perf_counter() - started_at,
+                                   rows_in=len(entries), rows_out=len(collected_data))
+    bot_class.save_metrics(f"step_1_shard_{user_input.get('shard')}")
+    bot_class.close()
     return collected_data
 
 
+def merge_shard_article_stores(user_input, paths: list):
+    """
+    Function that adds the article stores of the shards of a run to the article store used by step 2.
+
+    :param user_input: search parameters of the plan.
+    :param paths: ``shard_article_store`` of every shard, None for a shard without a store.
+    :return:
+    """
+    bot_class = NewsDataExtractor(search_parameters=dict(user_input))
+    if bot_class.article_store is not None:
+        for path in paths:
+            if path is None:
+                continue
+            if Path(path).exists():
+                bot_class.article_store.merge_from(path)
+            else:
+                # A shard run on another machine, its articles are downloaded again by the next run.
+                logging.warning(f"[Shards] Article store {path} is not on this machine, not merged.")
+    bot_class.close()
+
+
 def initialize_step_2(user_input, extracted_data):
     """
     Function that just clean the data collected in step 1.
 
     :param user_input:
-    :param source_parameters:
+    :param extracted_data: rows of step 1, or the reference of the artifact they were written to.
     :return:
     """
+    # pyarrow is only imported by the step that reads the artifact.
+    from news_data_extractor.source.artifacts import is_artifact_reference, read_rows_artifact
+
+    started_at = time.perf_counter()
+    if is_artifact_reference(extracted_data):
+        extracted_data = read_rows_artifact(extracted_data)
     print('initializing class')
     bot_class = NewsDataExtractor(search_parameters=user_input,
                                   extracted_data=extracted_data)
@@ -724,6 +1431,10 @@ def initialize_step_2(user_input, extracted_data):
     bot_class.filter_data()
     logging.info('initializing function 7 - Save Final Data')
     final_df, processed_raw_data = bot_class.save_final_data()
+    bot_class.metrics.record_stage('initialize_step_2', time.perf_counter() - started_at,
+                                   rows_in=len(extracted_data), rows_out=0 if final_df is None else len(final_df))
+    bot_class.save_metrics('step_2')
+    bot_class.close()
     print(final_df)
     return final_df, processed_raw_data
 
@@ -0,0 +1,297 @@
+import datetime
+import functools
+import json
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+
+# Upper bounds, in seconds, of the request latency histogram.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+METRIC_PREFIX = 'news'
+
+
+def track_stage(name: str, rows_in=None, rows_out=None):
+    """
+    Decorator recording the duration of a ``NewsDataExtractor`` stage in ``self.metrics``, and profiling it
+    when the extractor has a ``profiler``.
+
+    :param name: stage name in the exported metrics.
+    :param rows_in: function of the extractor returning the rows the stage receives, called before the stage.
+    :param rows_out: function of the extractor returning the rows the stage produced, called after the stage.
+    :return:
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            count_in = rows_in(self) if rows_in is not None else None
+            started_at = time.perf_counter()
+            if self.profiler is None:
+                result = method(self, *args, **kwargs)
+            else:
+                with self.profiler.stage(name):
+                    result = method(self, *args, **kwargs)
+            self.metrics.record_stage(name, time.perf_counter() - started_at, rows_in=count_in,
+                                      rows_out=rows_out(self) if rows_out is not None else None)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def _label_value(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels: dict) -> str:
+    return '{' + ','.join(f'{key}="{_label_value(value)}"' for key, value in labels.items()) + '}'
+
+
+class RunMetrics:
+    """
+    Measures of one extractor run: stage durations and rows, request latency histograms, downloaded bytes,
+    missing columns when parsing, articles pruned by date and embedding throughput.
+
+    Requests are recorded by ``HttpClient`` from the fetch threads, so every update holds a lock. ``export``
+    writes a JSON report and a Prometheus text file (node exporter textfile collector format).
+    """
+
+    def __init__(self, run_id: str = None, buckets: tuple = LATENCY_BUCKETS):
+        self.run_id = run_id
+        self.buckets = tuple(buckets)
+        self.started_at = time.time()
+        self.stages = {}
+        self.requests = {}
+        self.parsed_rows = Counter()
+        self.parse_misses = defaultdict(Counter)
+        self.pruned = Counter()
+        self.embeddings = {'generated': 0, 'seconds': 0.0, 'from_store': 0}
+        self._lock = threading.Lock()
+
+    def record_stage(self, name: str, seconds: float, rows_in: int = None, rows_out: int = None):
+        """
+        Function responsible for adding one call of a stage, repeated calls add up.
+
+        :param name:
+        :param seconds:
+        :param rows_in:
+        :param rows_out:
+        :return:
+        """
+        with self._lock:
+            stage = self.stages.setdefault(name, {'calls': 0, 'seconds': 0.0, 'rows_in': None, 'rows_out': None})
+            stage['calls'] += 1
+            stage['seconds'] += seconds
+            if rows_in is not None:
+                stage['rows_in'] = (stage['rows_in'] or 0) + rows_in
+            if rows_out is not None:
+                stage['rows_out'] = (stage['rows_out'] or 0) + rows_out
+        logging.info(f"[Metrics] {name} took {seconds:.2f}s | rows in {rows_in} | rows out {rows_out}")
+
+    def record_request(self, source: str, resource_type: str, result):
+        """
+        Function responsible for adding one request of ``HttpClient.get``.
+        Answers served from the cache are counted apart, they would only flatten the latency histogram.
+
+        :param source:
+        :param resource_type: 'search', 'article', 'image' or None.
+        :param result: FetchResult
+        :return:
+        """
+        key = (source or 'unknown', resource_type or 'other')
+        size = len(result.content) if result.content is not None else 0
+        with self._lock:
+            requests = self.requests.get(key)
+            if requests is None:
+                requests = {'count': 0, 'seconds': 0.0, 'bytes': 0, 'cache_hits': 0, 'cache_bytes': 0,
+                            'attempts': 0, 'status_codes': Counter(), 'buckets': [0] * (len(self.buckets) + 1)}
+                self.requests[key] = requests
+            requests['status_codes'][str(result.status_code)] += 1
+            if result.from_cache and result.attempts == 0:
+                requests['cache_hits'] += 1
+                requests['cache_bytes'] += size
+                return
+            requests['count'] += 1
+            requests['seconds'] += result.elapsed
+            requests['bytes'] += size
+            requests['attempts'] += result.attempts
+            position = len(self.buckets)
+            for bucket_position, bound in enumerate(self.buckets):
+                if result.elapsed <= bound:
+                    position = bucket_position
+                    break
+            requests['buckets'][position] += 1
+
+    def record_parsed_rows(self, source: str, rows: list, columns: list):
+        """
+        Function responsible for counting, per column of ``extraction_steps``, the rows where nothing was found.
+
+        :param source:
+        :param rows: rows returned by the extraction plan of the source.
+        :param columns: column names of the extraction steps.
+        :return:
+        """
+        with self._lock:
+            self.parsed_rows[source] += len(rows)
+            for row in rows:
+                for column in columns:
+                    if row.get(column) is None:
+                        self.parse_misses[source][column] += 1
+
+    def record_pruned(self, stage: str, source: str, reason: str, count: int):
+        """
+        Function responsible for counting articles dropped because they are older than ``max_months``.
+
+        :param stage: stage that dropped them.
+        :param source:
+        :param reason: 'url_date', 'listing_date' or 'article_date'.
+        :param count:
+        :return:
+        """
+        with self._lock:
+            self.pruned[(stage, source or 'unknown', reason)] += count
+
+    def record_embeddings(self, generated: int, seconds: float, from_store: int = 0):
+        """
+        Function responsible for adding embeddings generated by the model, and the ones read from the store.
+
+        :param generated:
+        :param seconds: time spent generating them.
+        :param from_store:
+        :return:
+        """
+        with self._lock:
+            self.embeddings['generated'] += generated
+            self.embeddings['seconds'] += seconds
+            self.embeddings['from_store'] += from_store
+
+    def _cumulative_buckets(self, counts: list) -> dict:
+        buckets = {}
+        total = 0
+        for bound, count in zip([*self.buckets, '+Inf'], counts):
+            total += count
+            buckets[str(bound)] = total
+        return buckets
+
+    def to_dict(self) -> dict:
+        """
+        Function responsible for returning every measure as plain JSON values.
+
+        :return:
+        """
+        with self._lock:
+            requests = defaultdict(dict)
+            for (source, resource_type), values in sorted(self.requests.items()):
+                requests[source][resource_type] = {
+                    'count': values['count'], 'seconds': values['seconds'], 'bytes': values['bytes'],
+                    'attempts': values['attempts'], 'cache_hits': values['cache_hits'],
+                    'cache_bytes': values['cache_bytes'], 'status_codes': dict(values['status_codes']),
+                    'latency_buckets': self._cumulative_buckets(values['buckets'])}
+            pruned = defaultdict(lambda: defaultdict(dict))
+            for (stage, source, reason), count in sorted(self.pruned.items()):
+                pruned[stage][source][reason] = count
+            generated, seconds = self.embeddings['generated'], self.embeddings['seconds']
+            return {
+                'run_id': self.run_id,
+                'started_at': datetime.datetime.fromtimestamp(self.started_at).isoformat(timespec='seconds'),
+                'stages': {name: dict(stage) for name, stage in self.stages.items()},
+                'requests': dict(requests),
+                'parse': {source: {'rows': rows, 'misses': dict(self.parse_misses[source])}
+                          for source, rows in sorted(self.parsed_rows.items())},
+                'pruned': {stage: {source: dict(reasons) for source, reasons in sources.items()}
+                           for stage, sources in pruned.items()},
+                'embeddings': {**self.embeddings,
+                               'per_second': generated / seconds if seconds > 0 else None},
+            }
+
+    def to_prometheus(self, step: str) -> str:
+        """
+        Function responsible for writing every measure in the Prometheus text format.
+
+        :param step: value of the ``step`` label of every sample, so the files of both steps can be scraped together.
+        :return:
+        """
+        report = self.to_dict()
+        metrics = {}
+
+        def add(name, kind, help_text, labels, value, suffix=''):
+            metric = metrics.setdefault(name, {'kind': kind, 'help': help_text, 'samples': []})
+            metric['samples'].append((suffix, labels, value))
+
+        add('run_info', 'gauge', 'Run of the extractor.', {'step': step, 'run_id': report['run_id']}, 1)
+        for name, stage in report['stages'].items():
+            labels = {'step': step, 'stage': name}
+            add('stage_duration_seconds', 'gauge', 'Wall time of the stage.', labels, stage['seconds'])
+            add('stage_calls', 'gauge', 'Times the stage ran.', labels, stage['calls'])
+            if stage['rows_in'] is not None:
+                add('stage_rows_in', 'gauge', 'Rows received by the stage.', labels, stage['rows_in'])
+            if stage['rows_out'] is not None:
+                add('stage_rows_out', 'gauge', 'Rows produced by the stage.', labels, stage['rows_out'])
+
+        for source, resource_types in report['requests'].items():
+            for resource_type, values in resource_types.items():
+                labels = {'step': step, 'source': source, 'resource_type': resource_type}
+                help_text = 'Latency of the requests not served by the cache, retries included.'
+                for bound, count in values['latency_buckets'].items():
+                    add('request_duration_seconds', 'histogram', help_text, {**labels, 'le': bound}, count,
+                        suffix='_bucket')
+                add('request_duration_seconds', 'histogram', help_text, labels, values['seconds'], suffix='_sum')
+                add('request_duration_seconds', 'histogram', help_text, labels, values['count'], suffix='_count')
+                add('downloaded_bytes_total', 'counter', 'Bytes downloaded.', labels, values['bytes'])
+                add('cache_hits_total', 'counter', 'Requests served by the http cache.', labels,
+                    values['cache_hits'])
+                for status_code, count in values['status_codes'].items():
+                    add('responses_total', 'counter', 'Answers per status code, None without answer.',
+                        {**labels, 'status_code': status_code}, count)
+
+        for source, parse in report['parse'].items():
+            add('parsed_rows_total', 'counter', 'Rows extracted from article pages.',
+                {'step': step, 'source': source}, parse['rows'])
+            for column, misses in parse['misses'].items():
+                add('parse_misses_total', 'counter', 'Rows where a column of the extraction steps was not found.',
+                    {'step': step, 'source': source, 'column': column}, misses)
+
+        for stage, sources in report['pruned'].items():
+            for source, reasons in sources.items():
+                for reason, count in reasons.items():
+                    add('pruned_articles_total', 'counter', 'Articles dropped for being older than max_months.',
+                        {'step': step, 'stage': stage, 'source': source, 'reason': reason}, count)
+
+        embeddings = report['embeddings']
+        add('embeddings_generated_total', 'counter', 'Embeddings computed by the model.', {'step': step},
+            embeddings['generated'])
+        add('embedding_seconds_total', 'counter', 'Time spent computing embeddings.', {'step': step},
+            embeddings['seconds'])
+        add('embeddings_from_store_total', 'counter', 'Embeddings read from the embedding store.',
+            {'step': step}, embeddings['from_store'])
+
+        lines = []
+        for name, metric in metrics.items():
+            full_name = f"{METRIC_PREFIX}_{name}"
+            lines.append(f"# HELP {full_name} {metric['help']}")
+            lines.append(f"# TYPE {full_name} {metric['kind']}")
+            for suffix, labels, value in metric['samples']:
+                lines.append(f"{full_name}{suffix}{_labels(labels)} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def export(self, folder, step: str) -> dict:
+        """
+        Function responsible for writing ``metrics_<step>.json`` and ``metrics_<step>.prom`` to folder.
+
+        :param folder:
+        :param step: 'step_1', 'step_2'...
+        :return: paths of both files.
+        """
+        folder = Path(folder)
+        folder.mkdir(parents=True, exist_ok=True)
+        paths = {'json': folder / f"metrics_{step}.json", 'prometheus': folder / f"metrics_{step}.prom"}
+        paths['json'].write_text(json.dumps({'step': step, **self.to_dict()}, indent=2), encoding='utf-8')
+        # Written aside and renamed, a collector never reads half a file.
+        temporary_path = paths['prometheus'].with_suffix('.prom.tmp')
+        temporary_path.write_text(self.to_prometheus(step), encoding='utf-8')
+        temporary_path.replace(paths['prometheus'])
+        logging.info(f"[Metrics] Saved to {paths['json']} and {paths['prometheus']}")
+        return {kind: str(path) for kind, path in paths.items()}
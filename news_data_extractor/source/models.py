@@ -0,0 +1,70 @@
+import logging
+import subprocess
+import sys
+import threading
+import time
+
+SPACY_MODEL_NAME = 'en_core_web_sm'
+
+# Doc.vector only needs the token vectors written by tok2vec, the other pipes don't change it.
+EMBEDDING_EXCLUDED_PIPES = ('tagger', 'parser', 'attribute_ruler', 'lemmatizer', 'ner', 'senter')
+
+_loaded_models = {}
+_registry_lock = threading.Lock()
+
+
+def _load_spacy(name: str, exclude: tuple):
+    import spacy
+
+    try:
+        return spacy.load(name, exclude=list(exclude))
+    except OSError:
+        logging.info(f"Downloading spacy model {name}.")
+        subprocess.run([sys.executable, '-m', 'spacy', 'download', name], check=False)
+        return spacy.load(name, exclude=list(exclude))
+
+
+def get_spacy_model(name: str = SPACY_MODEL_NAME, exclude: tuple = EMBEDDING_EXCLUDED_PIPES):
+    """
+    Function responsible for returning a process-wide spaCy pipeline, loading it on first use.
+
+    Pipelines are cached per (name, excluded pipes), so every stage asking for the same pipes shares one
+    instance and the model is downloaded at most once per process.
+
+    :param name:
+    :param exclude: pipes that are not loaded at all.
+    :return:
+    """
+    key = ('spacy', name, tuple(sorted(exclude)))
+    with _registry_lock:
+        if key not in _loaded_models:
+            started_at = time.perf_counter()
+            _loaded_models[key] = _load_spacy(name, tuple(exclude))
+            logging.info(f"[Models] Loaded spacy {name} without {list(exclude)} in "
+                         f"{time.perf_counter() - started_at:.2f}s")
+        return _loaded_models[key]
+
+
+def spacy_model_version(name: str = SPACY_MODEL_NAME) -> str:
+    """
+    Function responsible for returning the installed version of a spaCy model package without loading it.
+
+    :param name:
+    :return:
+    """
+    from importlib import metadata
+
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return get_spacy_model(name).meta.get('version', 'unknown')
+
+
+def loaded_models() -> list:
+    """
+    Returns the keys of the models already loaded in this process.
+
+    :return:
+    """
+    with _registry_lock:
+        return list(_loaded_models.keys())
@@ -0,0 +1,344 @@
+import contextlib
+import datetime
+import hashlib
+import json
+import logging
+import mmap
+import os
+import threading
+import zlib
+from pathlib import Path
+
+import click
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+ARCHIVE_FILE = 'pages.gz'
+INDEX_FILE = 'pages.idx.jsonl'
+LOCK_FILE = 'pages.lock'
+# prune writes the kept records to these files before switching them in.
+PRUNED_SUFFIX = '.pruned'
+
+# wbits for zlib to write and read gzip members.
+GZIP_WBITS = 31
+
+
+@contextlib.contextmanager
+def _file_lock(path):
+    """Exclusive lock shared by the processes using the same archive."""
+    with open(path, 'a+b') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class PageArchive:
+    """
+    Append-only archive of raw pages, in the spirit of a WARC file.
+
+    Every page body is written as its own gzip member at the end of ``pages.gz`` (so ``zcat pages.gz`` still
+    prints every page), and ``pages.idx.jsonl`` keeps one line per record with its url, source, status, run
+    and the offset / length of the member. Records are read back through a memory map: the compressed bytes
+    are handed to zlib as a slice of the map, without copying them first.
+
+    Processes writing to the same folder hold ``pages.lock`` while they repair the archive on open and while they
+    append, so a repair never cuts a page another process is writing. Readers open the archive ``read_only`` and
+    never change it. ``prune`` keeps the last runs or the newest pages within a size, it rewrites the archive and
+    moves the pages: only run it when no other process uses the folder.
+    """
+
+    def __init__(self, folder, compression_level: int = 6, read_only: bool = False):
+        """
+        :param folder:
+        :param compression_level: zlib level, 1 is the fastest and 9 the smallest.
+        :param read_only: never write nor repair, for processes reading an archive another one writes.
+        """
+        self.folder = Path(folder)
+        self.read_only = read_only
+        self.path = self.folder / ARCHIVE_FILE
+        self.index_path = self.folder / INDEX_FILE
+        self.lock_path = self.folder / LOCK_FILE
+        self.compression_level = compression_level
+        self.records = []
+        self.latest = {}
+        self._lock = threading.Lock()
+        self._map = None
+        self._mapped_size = 0
+        if read_only:
+            self._load_index()
+        else:
+            self.folder.mkdir(parents=True, exist_ok=True)
+            with _file_lock(self.lock_path):
+                self._finish_prune()
+                self._load_index()
+                self._repair()
+
+    def _load_index(self):
+        self.records = []
+        self.latest = {}
+        self._invalid_lines = 0
+        if not self.index_path.exists():
+            return
+        with open(self.index_path, 'r', encoding='utf-8') as index_file:
+            for line in index_file:
+                if line.strip() == '':
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Last line of an interrupted append.
+                    self._invalid_lines += 1
+                    continue
+                self.records.append(record)
+                self.latest[record['url']] = record
+
+    def _repair(self):
+        """
+        Function responsible for dropping the bytes an interrupted append left after the last indexed record.
+
+        :return:
+        """
+        end = max((record['offset'] + record['length'] for record in self.records), default=0)
+        if self.path.exists() and self.path.stat().st_size > end:
+            with open(self.path, 'r+b') as archive_file:
+                archive_file.truncate(end)
+        if self._invalid_lines > 0:
+            with open(self.index_path, 'w', encoding='utf-8') as index_file:
+                for record in self.records:
+                    index_file.write(json.dumps(record) + '\n')
+            self._invalid_lines = 0
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def size(self) -> int:
+        return self.path.stat().st_size if self.path.exists() else 0
+
+    def append(self, url: str, body: bytes, source: str = None, status_code: int = None, run_id: str = None) -> dict:
+        """
+        Function responsible for compressing a page at the end of the archive.
+
+        :param url:
+        :param body: raw page bytes.
+        :param source:
+        :param status_code:
+        :param run_id: groups the pages downloaded by the same run.
+        :return: reference of the record, accepted by ``read``.
+        """
+        if self.read_only:
+            raise ValueError(f"Page archive {self.folder} was opened read only")
+        compressor = zlib.compressobj(self.compression_level, zlib.DEFLATED, GZIP_WBITS)
+        member = compressor.compress(body) + compressor.flush()
+        with self._lock, _file_lock(self.lock_path):
+            with open(self.path, 'ab') as archive_file:
+                offset = archive_file.tell()
+                archive_file.write(member)
+            record = {'url': url, 'source': source, 'status_code': status_code, 'run_id': run_id,
+                      'offset': offset, 'length': len(member), 'size': len(body),
+                      'sha256': hashlib.sha256(body).hexdigest(),
+                      'archived_at': datetime.datetime.now().isoformat(timespec='seconds')}
+            with open(self.index_path, 'a', encoding='utf-8') as index_file:
+                index_file.write(json.dumps(record) + '\n')
+            self.records.append(record)
+            self.latest[url] = record
+        return {'offset': offset, 'length': len(member)}
+
+    def _mapped(self, end: int):
+        if self._map is None or end > self._mapped_size:
+            if self._map is not None:
+                self._map.close()
+            with open(self.path, 'rb') as archive_file:
+                self._map = mmap.mmap(archive_file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._mapped_size = len(self._map)
+        return self._map
+
+    def read(self, reference: dict) -> bytes:
+        """
+        Function responsible for returning the page of a record.
+
+        :param reference: dict with the ``offset`` and ``length`` of the record.
+        :return: raw page bytes.
+        """
+        offset, length = reference['offset'], reference['length']
+        with self._lock:
+            archive_map = self._mapped(offset + length)
+            with memoryview(archive_map) as view, view[offset:offset + length] as member:
+                return zlib.decompress(member, GZIP_WBITS)
+
+    def read_url(self, url: str):
+        """
+        Function responsible for returning the last archived page of an url.
+
+        :param url:
+        :return: raw page bytes or None.
+        """
+        record = self.latest.get(url)
+        return None if record is None else self.read(record)
+
+    def iter_records(self, run_id: str = None, source: str = None):
+        """
+        Function responsible for replaying archived pages in the order they were written.
+
+        :param run_id: only the pages of this run.
+        :param source: only the pages of this source.
+        :return: generator of (record, page bytes)
+        """
+        for record in list(self.records):
+            if run_id is not None and record['run_id'] != run_id:
+                continue
+            if source is not None and record['source'] != source:
+                continue
+            yield record, self.read(record)
+
+    def run_ids(self) -> list:
+        return list(dict.fromkeys(record['run_id'] for record in self.records))
+
+    def _pruned_path(self, path: Path) -> Path:
+        return path.with_name(f"{path.name}{PRUNED_SUFFIX}")
+
+    def _finish_prune(self):
+        """
+        Function responsible for completing or undoing a prune that was interrupted. The archive is switched
+        before the index: a pruned index left alone means the archive was already switched.
+
+        :return:
+        """
+        pruned_index = self._pruned_path(self.index_path)
+        pruned_archive = self._pruned_path(self.path)
+        if pruned_archive.exists():
+            pruned_archive.unlink()
+            pruned_index.unlink(missing_ok=True)
+        elif pruned_index.exists():
+            os.replace(pruned_index, self.index_path)
+
+    def prune(self, keep_runs: int = None, max_bytes: int = None) -> int:
+        """
+        Function responsible for dropping the oldest pages: the runs before the last ``keep_runs`` ones, then the
+        oldest pages until the archive fits in ``max_bytes``. The kept pages are copied without being compressed
+        again, their offsets change.
+
+        :param keep_runs: runs kept, every run when None.
+        :param max_bytes: compressed size kept, no limit when None.
+        :return: number of pages dropped.
+        """
+        if self.read_only:
+            raise ValueError(f"Page archive {self.folder} was opened read only")
+        with self._lock, _file_lock(self.lock_path):
+            # Pages appended by other processes since this one opened the archive are pruned too.
+            self._load_index()
+            kept = self.records
+            if keep_runs is not None:
+                kept_runs = set(self.run_ids()[-keep_runs:]) if keep_runs > 0 else set()
+                kept = [record for record in kept if record['run_id'] in kept_runs]
+            if max_bytes is not None:
+                total = 0
+                newest = []
+                for record in reversed(kept):
+                    total += record['length']
+                    if total > max_bytes:
+                        break
+                    newest.append(record)
+                kept = newest[::-1]
+            dropped = len(self.records) - len(kept)
+            if dropped == 0:
+                return 0
+            pruned_archive = self._pruned_path(self.path)
+            pruned_index = self._pruned_path(self.index_path)
+            pruned_records = []
+            with open(self.path, 'rb') as archive_file, open(pruned_archive, 'wb') as pruned_file:
+                for record in kept:
+                    archive_file.seek(record['offset'])
+                    pruned_records.append(dict(record, offset=pruned_file.tell()))
+                    pruned_file.write(archive_file.read(record['length']))
+                pruned_file.flush()
+                os.fsync(pruned_file.fileno())
+            with open(pruned_index, 'w', encoding='utf-8') as index_file:
+                for record in pruned_records:
+                    index_file.write(json.dumps(record) + '\n')
+                index_file.flush()
+                os.fsync(index_file.fileno())
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+                self._mapped_size = 0
+            os.replace(pruned_archive, self.path)
+            os.replace(pruned_index, self.index_path)
+            self.records = pruned_records
+            self.latest = {record['url']: record for record in pruned_records}
+        logging.info(f"[PageArchive] Pruned {dropped} pages of {self.folder}, {len(pruned_records)} kept "
+                     f"({self.size} bytes).")
+        return dropped
+
+    def close(self):
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+                self._mapped_size = 0
+
+    def reset(self):
+        self.close()
+        for path in (self.path, self.index_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        self.records = []
+        self.latest = {}
+
+
+@click.group()
+def cli():
+    """Maintenance commands for the page archive."""
+
+
+@cli.command()
+@click.argument('folder', type=click.Path(exists=True, file_okay=False))
+def info(folder):
+    """Show the number of pages and runs of the archive in FOLDER."""
+    archive = PageArchive(folder, read_only=True)
+    raw_size = sum(record['size'] for record in archive.records)
+    click.echo(f"pages={len(archive)} urls={len(archive.latest)} runs={len(archive.run_ids())} "
+               f"compressed_bytes={archive.size} raw_bytes={raw_size}")
+
+
+@cli.command()
+@click.argument('folder', type=click.Path(exists=True, file_okay=False))
+@click.argument('url')
+def show(folder, url):
+    """Print the last archived page of URL."""
+    page = PageArchive(folder, read_only=True).read_url(url)
+    if page is None:
+        raise click.ClickException(f"{url} is not archived")
+    click.echo(page.decode('utf-8', errors='replace'))
+
+
+@cli.command()
+@click.argument('folder', type=click.Path(exists=True, file_okay=False))
+@click.option('--keep-runs', type=int, help='Runs kept, the last ones.')
+@click.option('--max-mb', type=float, help='Compressed size kept, the newest pages.')
+def prune(folder, keep_runs, max_mb):
+    """Drop the oldest pages of the archive in FOLDER, while no run uses it."""
+    archive = PageArchive(folder)
+    dropped = archive.prune(keep_runs=keep_runs, max_bytes=int(max_mb * 1024 * 1024) if max_mb is not None else None)
+    click.echo(f"dropped={dropped} pages={len(archive)} compressed_bytes={archive.size}")
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,135 @@
+import logging
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from news_data_extractor.source.date_parser import DateParser
+from news_data_extractor.source.extraction_plan import compile_plans
+from news_data_extractor.source.models import get_spacy_model
+from news_data_extractor.source.page_archive import PageArchive
+from news_data_extractor.source.text_normalization import normalize_raw_rows
+
+# State of a worker process, filled once by _init_worker and reused by every chunk it receives.
+_worker = {}
+
+
+def _init_worker(sources_config: dict, archive_folder):
+    _worker['plans'] = compile_plans(sources_config)
+    _worker['archive'] = PageArchive(archive_folder, read_only=True) if archive_folder is not None else None
+    _worker['date_parser'] = DateParser()
+
+
+def _error(stage, job, error):
+    return {'stage': stage, 'url': job.get('url'), 'error': f"{type(error).__name__}: {error}"}
+
+
+def _parse_chunk(jobs: list) -> tuple:
+    rows, errors = [], []
+    for job in jobs:
+        try:
+            html = job.get('html')
+            if job.get('archive_ref') is not None:
+                html = _worker['archive'].read(job['archive_ref'])
+            rows.append(_worker['plans'][job['source']].parse_article(job['url'], html))
+        except Exception as error:
+            rows.append(None)
+            errors.append(_error('parse', job, error))
+    return rows, errors
+
+
+def _normalize_chunk(rows: list) -> tuple:
+    date_parser = _worker['date_parser']
+    counts_before = {source: Counter(counts) for source, counts in date_parser.counts.items()}
+    hits_before = {source: Counter(hits) for source, hits in date_parser.format_hits.items()}
+    formatted_rows, errors = normalize_raw_rows(rows, date_parser)
+    # Only what this chunk added, the parent adds it to its own DateParser.
+    date_stats = {'counts': {source: counts - counts_before.get(source, Counter())
+                             for source, counts in date_parser.counts.items()},
+                  'format_hits': {source: hits - hits_before.get(source, Counter())
+                                  for source, hits in date_parser.format_hits.items()}}
+    return formatted_rows, errors, date_stats
+
+
+def _embed_chunk(texts: list) -> list:
+    nlp = get_spacy_model()
+    return [doc.vector for doc in nlp.pipe(texts, batch_size=64)]
+
+
+def _chunks(items: list, chunk_size: int) -> list:
+    return [items[start:start + chunk_size] for start in range(0, len(items), chunk_size)]
+
+
+class ProcessPool:
+    """
+    Process pool for the CPU-bound stages: article parsing, row normalization and embeddings.
+
+    Every worker compiles the extraction plans and opens the page archive once, and loads the spaCy model the
+    first time it embeds, so a chunk only carries archive references or rows. Work is split in chunks that are
+    sent with ``executor.map``, results come back in the order of the input whatever worker finished first.
+    Exceptions raised by one row are returned as errors next to the results.
+    """
+
+    def __init__(self, sources_config: dict, archive_folder=None, workers: int = 2, chunk_size: int = 16):
+        """
+        :param sources_config: ``_get_sources()``, compiled in every worker.
+        :param archive_folder: PageArchive folder the workers read the pages from.
+        :param workers: number of processes.
+        :param chunk_size: articles or rows sent to a worker at once.
+        """
+        self.workers = max(1, int(workers))
+        self.chunk_size = max(1, int(chunk_size))
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                            initargs=(sources_config, archive_folder))
+
+    def _map(self, function, items: list) -> list:
+        return list(self.executor.map(function, _chunks(items, self.chunk_size)))
+
+    def parse_articles(self, jobs: list) -> tuple:
+        """
+        Function responsible for parsing articles in the workers.
+
+        :param jobs: dicts with ``source``, ``url`` and the ``archive_ref`` (or ``html``) of the page.
+        :return: (one row or None per job, in the order of ``jobs``, list of errors)
+        """
+        started_at = time.perf_counter()
+        rows, errors = [], []
+        for chunk_rows, chunk_errors in self._map(_parse_chunk, jobs):
+            rows.extend(chunk_rows)
+            errors.extend(chunk_errors)
+        logging.info(f"[ProcessPool] Parsed {len(jobs)} articles with {self.workers} workers in "
+                     f"{time.perf_counter() - started_at:.2f}s")
+        return rows, errors
+
+    def normalize_rows(self, rows: list, date_parser: DateParser = None) -> tuple:
+        """
+        Function responsible for normalizing rows in the workers.
+
+        :param rows: raw rows.
+        :param date_parser: receives the date counts and matched formats of the workers.
+        :return: (normalized rows in the order of ``rows``, list of errors)
+        """
+        formatted_rows, errors = [], []
+        for chunk_rows, chunk_errors, date_stats in self._map(_normalize_chunk, rows):
+            formatted_rows.extend(chunk_rows)
+            errors.extend(chunk_errors)
+            if date_parser is not None:
+                for source, counts in date_stats['counts'].items():
+                    date_parser.counts[source].update(counts)
+                for source, hits in date_stats['format_hits'].items():
+                    date_parser.format_hits[source].update(hits)
+        return formatted_rows, errors
+
+    def embed_texts(self, texts: list) -> list:
+        """
+        Function responsible for computing spaCy vectors in the workers.
+
+        :param texts:
+        :return: one vector per text, in the order of ``texts``.
+        """
+        vectors = []
+        for chunk_vectors in self._map(_embed_chunk, texts):
+            vectors.extend(chunk_vectors)
+        return vectors
+
+    def close(self):
+        self.executor.shutdown(wait=True)
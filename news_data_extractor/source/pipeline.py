@@ -0,0 +1,139 @@
+import collections
+import logging
+
+# Urls remembered to skip the articles listed again by another query or search page of the same run.
+MAX_SEEN_URLS = 100000
+
+
+def iter_search_pages(extractor, jobs: list = None):
+    """
+    Function responsible for yielding the search page of every source as soon as it is downloaded.
+
+    :param extractor: NewsDataExtractor
+    :param jobs: search jobs, the first page of every source and query when None.
+    :return: generator of (job, response)
+    """
+    if jobs is None:
+        jobs = extractor.search_jobs()
+    for job, response in extractor.fetch_engine.iter_fetch(jobs):
+        logging.info(f"[Request] {job['source']} page {job.get('page', 1)} | {response['status_code']} | "
+                     f"{response['elapsed']:.2f}s")
+        yield job, response
+
+
+def iter_article_jobs(extractor, search_pages, max_seen_urls: int = MAX_SEEN_URLS):
+    """
+    Function responsible for turning search pages into article download jobs, skipping repeated urls and the
+    articles older than ``max_months`` (see ``NewsDataExtractor.prune_listing``). With ``max_search_pages``
+    above 1, the next search pages of a source are requested until one has no article recent enough, like
+    ``NewsDataExtractor.get_news_listing``.
+
+    :param extractor:
+    :param search_pages: generator of (job, response)
+    :param max_seen_urls: repeated urls are skipped among the last ``max_seen_urls`` listed ones.
+    :return: generator of jobs for the fetch engine.
+    """
+    max_search_pages = int(extractor.search_parameters.get('max_search_pages', 1))
+    seen_urls = collections.OrderedDict()
+    while search_pages is not None:
+        next_jobs = []
+        for search_job, response in search_pages:
+            source = search_job['source']
+            if response['status_code'] != 200 or response['html'] is None:
+                continue
+            listing_dates = {}
+            for url, date_text in extractor.extraction_plans[source].parse_listing_entries(response['html']):
+                if listing_dates.get(url) is None:
+                    listing_dates[url] = date_text
+            del response
+            valid_urls = extractor.valid_listing_urls(source, list(listing_dates))
+            kept_urls = extractor.prune_listing(source, [(url, listing_dates[url]) for url in valid_urls],
+                                                cutoff=extractor.listing_cutoff(search_job['queries']))
+            extractor.record_query_urls(search_job['queries'], kept_urls)
+            # A page without any recent article ends the paging, the next ones are older.
+            page = search_job.get('page', 1)
+            if page < max_search_pages and len(kept_urls) != 0:
+                next_job = extractor.next_search_page_job(source, {
+                    'url': search_job.get('search_url', search_job['url']), 'page': page,
+                    'queries': search_job['queries']})
+                if next_job is not None:
+                    next_jobs.append(next_job)
+            for url in kept_urls:
+                if url in seen_urls:
+                    seen_urls.move_to_end(url)
+                else:
+                    seen_urls[url] = None
+                    if len(seen_urls) > max_seen_urls:
+                        seen_urls.popitem(last=False)
+                    yield {'source': source, 'url': url, 'options': {'resource_type': 'article'}}
+        search_pages = iter_search_pages(extractor, next_jobs) if len(next_jobs) != 0 else None
+
+
+def iter_parsed_rows(extractor, article_jobs, window: int = 32):
+    """
+    Function responsible for downloading and parsing articles, the page is archived and released right after
+    parsing. Articles of the article store are neither downloaded again while fresh nor parsed again when
+    their page did not change.
+
+    :param extractor:
+    :param article_jobs:
+    :param window: maximum number of articles downloaded but not parsed yet.
+    :return: generator of raw rows.
+    """
+    only_changed = extractor.search_parameters.get('only_changed_articles', False)
+
+    def jobs_to_fetch():
+        # Articles downloaded by a recent run are taken from the article store, without any request. They go
+        # through the fetch engine as answered jobs, so they are yielded one at a time like downloaded pages.
+        for article_job in article_jobs:
+            stored_row, _ = extractor.stored_article(article_job['source'], article_job['url'])
+            if stored_row is None:
+                yield article_job
+            elif not only_changed:
+                yield dict(article_job, result={'stored_row': stored_row})
+
+    for job, response in extractor.fetch_engine.iter_fetch(jobs_to_fetch(), window=window):
+        if 'stored_row' in response:
+            yield response['stored_row']
+            continue
+        logging.info(f"[Request NEWS] {job['source']} | {response['status_code']} | {response['elapsed']:.2f}s")
+        if response['status_code'] != 200 or response['html'] is None:
+            continue
+        stored_row, content_hash = extractor.stored_article(job['source'], job['url'], response['html'])
+        if stored_row is not None:
+            del response
+            if not only_changed:
+                yield stored_row
+            continue
+        if extractor.page_archive is not None:
+            extractor.archive_page(job['source'], job['url'], response)
+        plan = extractor.extraction_plans[job['source']]
+        try:
+            row = plan.parse_article(job['url'], response['html'])
+        except Exception as error:
+            # A malformed page is reported like in parse_each_news, the other articles go on.
+            extractor._row_error('parse', job['url'], error)
+            continue
+        finally:
+            del response
+        if row is not None and extractor.keep_parsed_row(job['source'], {'url': job['url'],
+                                                                         'content_hash': content_hash}, row):
+            extractor.metrics.record_parsed_rows(job['source'], [row], plan.column_names)
+            yield row
+
+
+def stream_news(extractor, window: int = 32):
+    """
+    Function responsible for chaining search -> listing -> fetch -> parse as generators, the raw rows of step 1.
+
+    Every stage pulls from the previous one, so at most ``window`` pages are held in memory whatever the number
+    of articles, and the first rows are ready before the last page is fetched.
+
+    :param extractor: NewsDataExtractor
+    :param window:
+    :return: generator of raw rows.
+    """
+    extractor.source_parameters = extractor._get_sources(only_active=True)
+    search_pages = iter_search_pages(extractor)
+    article_jobs = iter_article_jobs(extractor, search_pages)
+    return iter_parsed_rows(extractor, article_jobs, window=window)
@@ -0,0 +1,204 @@
+import contextlib
+import cProfile
+import heapq
+import io
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+PROFILE_ENVIRONMENT_VARIABLE = 'NEWS_PROFILE'
+SLOW_URL_ENVIRONMENT_VARIABLE = 'NEWS_PROFILE_SLOW_URL_SECONDS'
+PROFILE_MODES = ('cprofile', 'tracemalloc', 'slow_urls')
+
+# Allocations of the profilers themselves are left out of the tracemalloc reports.
+PROFILER_TRACE_FILTERS = [tracemalloc.Filter(False, path) for path in (
+    cProfile.__file__, pstats.__file__, tracemalloc.__file__, __file__, '<frozen importlib._bootstrap*>')]
+
+
+def _parse_modes(value) -> list:
+    if value is True:
+        return list(PROFILE_MODES)
+    if value is None or value is False:
+        return []
+    if isinstance(value, str):
+        value = [mode.strip() for mode in value.split(',')]
+    modes = []
+    for mode in value:
+        mode = str(mode).strip().lower()
+        if mode in ('1', 'true', 'all'):
+            return list(PROFILE_MODES)
+        if mode in PROFILE_MODES:
+            modes.append(mode)
+        elif mode not in ('', '0', 'false'):
+            logging.warning(f"[Profiling] Unknown mode {mode}, expected one of {PROFILE_MODES}")
+    return modes
+
+
+def profiling_options(payload: dict = None, environ=None):
+    """
+    Function responsible for reading the profiling switches of a work item payload or of the environment.
+
+    The payload takes ``"profile": true``, ``"profile": "cprofile,tracemalloc"`` or
+    ``"profile": {"modes": [...], "slow_url_seconds": 2, "top": 25}``. Without it, ``NEWS_PROFILE`` is read
+    with the same values as the string form and ``NEWS_PROFILE_SLOW_URL_SECONDS`` sets the slow url threshold.
+
+    :param payload:
+    :param environ: defaults to os.environ.
+    :return: dict with ``modes``, ``slow_url_seconds`` and ``top``, None when profiling is off.
+    """
+    environ = os.environ if environ is None else environ
+    value = (payload or {}).get('profile')
+    options = dict(value) if isinstance(value, dict) else {'modes': value}
+    if value is None:
+        options = {'modes': environ.get(PROFILE_ENVIRONMENT_VARIABLE)}
+        if environ.get(SLOW_URL_ENVIRONMENT_VARIABLE):
+            options['slow_url_seconds'] = float(environ[SLOW_URL_ENVIRONMENT_VARIABLE])
+    modes = _parse_modes(options.get('modes', True))
+    if len(modes) == 0:
+        return None
+    return {'modes': modes, 'slow_url_seconds': float(options.get('slow_url_seconds', 2.0)),
+            'top': int(options.get('top', 25))}
+
+
+class Profiler:
+    """
+    Opt-in profiling of an extractor run, every file is written to one folder per run.
+
+    - ``cprofile``: one cProfile per stage, ``<stage>.prof`` (for snakeviz / pstats) and ``<stage>.txt`` with the
+      functions of highest cumulative time. Only the thread running the stage is profiled, the fetch threads and
+      worker processes are not.
+    - ``tracemalloc``: allocations are traced from the creation of the profiler, ``<stage>.tracemalloc.txt`` lists
+      the top allocators at the end of the stage, what the stage added and its peak.
+    - ``slow_urls``: requests slower than ``slow_url_seconds``, the ``top`` slowest are kept in ``slow_urls.json``.
+
+    Extractors without profiling have ``profiler = None`` and only pay for that check.
+    """
+
+    def __init__(self, folder, modes: list = PROFILE_MODES, slow_url_seconds: float = 2.0, top: int = 25):
+        """
+        :param folder: where the profiles are written.
+        :param modes: any of PROFILE_MODES.
+        :param slow_url_seconds: requests slower than this are sampled.
+        :param top: lines kept in every report and slow urls kept.
+        """
+        self.folder = Path(folder)
+        self.modes = set(modes)
+        self.slow_url_seconds = slow_url_seconds
+        self.top = top
+        self.slow_urls = []
+        self.slow_url_count = 0
+        self._lock = threading.Lock()
+        self._active_stage = None
+        self.folder.mkdir(parents=True, exist_ok=True)
+        if 'tracemalloc' in self.modes and not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+
+    @classmethod
+    def from_options(cls, options: dict, folder):
+        """
+        Function responsible for creating a profiler from ``profiling_options``.
+
+        :param options:
+        :param folder:
+        :return: None when options is None.
+        """
+        if options is None:
+            return None
+        profiler = cls(folder=folder, modes=options['modes'], slow_url_seconds=options['slow_url_seconds'],
+                       top=options['top'])
+        logging.info(f"[Profiling] {options['modes']} written to {folder}")
+        return profiler
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        """
+        Context manager profiling the code run inside it under the name of a stage.
+
+        :param name:
+        :return:
+        """
+        # A stage called from another one is part of the outer profile.
+        if self._active_stage is not None:
+            yield
+            return
+        self._active_stage = name
+        profile = cProfile.Profile() if 'cprofile' in self.modes else None
+        snapshot_before = None
+        if 'tracemalloc' in self.modes and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            snapshot_before = tracemalloc.take_snapshot()
+        started_at = time.perf_counter()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            elapsed = time.perf_counter() - started_at
+            self._active_stage = None
+            if profile is not None:
+                self._save_profile(name, profile, elapsed)
+            if snapshot_before is not None:
+                self._save_allocations(name, snapshot_before)
+
+    def _save_profile(self, name, profile, elapsed):
+        profile.dump_stats(str(self.folder / f"{name}.prof"))
+        report = io.StringIO()
+        report.write(f"{name}: {elapsed:.3f}s\n")
+        pstats.Stats(profile, stream=report).sort_stats('cumulative').print_stats(self.top)
+        (self.folder / f"{name}.txt").write_text(report.getvalue(), encoding='utf-8')
+
+    def _save_allocations(self, name, snapshot_before):
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces(PROFILER_TRACE_FILTERS)
+        snapshot_before = snapshot_before.filter_traces(PROFILER_TRACE_FILTERS)
+        lines = [f"{name}: traced {current / 1024 / 1024:.1f} MB at the end, peak {peak / 1024 / 1024:.1f} MB", '',
+                 f"Top {self.top} allocators at the end of the stage:"]
+        lines.extend(str(statistic) for statistic in snapshot.statistics('lineno')[:self.top])
+        lines.extend(['', f"Top {self.top} changes during the stage:"])
+        lines.extend(str(statistic) for statistic in snapshot.compare_to(snapshot_before, 'lineno')[:self.top])
+        (self.folder / f"{name}.tracemalloc.txt").write_text('\n'.join(lines) + '\n', encoding='utf-8')
+
+    def record_request(self, source: str, resource_type: str, result):
+        """
+        Function responsible for sampling a request of ``HttpClient.get`` when it is slow.
+
+        :param source:
+        :param resource_type:
+        :param result: FetchResult
+        :return:
+        """
+        if 'slow_urls' not in self.modes or result.elapsed < self.slow_url_seconds:
+            return
+        sample = (result.elapsed, result.url, {
+            'seconds': result.elapsed, 'url': result.url, 'source': source, 'resource_type': resource_type,
+            'status_code': result.status_code, 'attempts': result.attempts, 'error': result.error,
+            'bytes': len(result.content) if result.content is not None else 0})
+        with self._lock:
+            self.slow_url_count += 1
+            if len(self.slow_urls) < self.top:
+                heapq.heappush(self.slow_urls, sample)
+            else:
+                heapq.heappushpop(self.slow_urls, sample)
+
+    def save(self):
+        """
+        Function responsible for writing the slow urls and stopping the allocation tracing.
+
+        :return:
+        """
+        if 'slow_urls' in self.modes:
+            with self._lock:
+                samples = [sample for _, _, sample in sorted(self.slow_urls, reverse=True)]
+            report = {'slow_url_seconds': self.slow_url_seconds, 'slow_requests': self.slow_url_count,
+                      'slowest': samples}
+            (self.folder / 'slow_urls.json').write_text(json.dumps(report, indent=2), encoding='utf-8')
+        if 'tracemalloc' in self.modes and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        logging.info(f"[Profiling] Profiles saved to {self.folder}")
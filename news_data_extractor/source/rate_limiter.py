@@ -0,0 +1,217 @@
+import datetime
+import email.utils
+import logging
+import threading
+import time
+
+DEFAULT_RATE_LIMIT = {
+    'requests_per_second': 4.0,
+    'burst': 4,
+    'initial_concurrency': 2,
+    'min_concurrency': 1,
+    'latency_factor': 3.0,
+    'latency_floor': 0.25,
+    'max_retry_after': 300,
+}
+
+THROTTLE_STATUS_CODES = {429, 503}
+
+# Lower goes first: search pages decide what is downloaded next, images are only needed at the end.
+PRIORITIES = {'search': 0, 'article': 1, None: 1, 'image': 2}
+
+
+def parse_retry_after(value, now: float = None):
+    """
+    Function responsible for reading a Retry-After header, in seconds or as an HTTP date.
+
+    :param value:
+    :param now: current time.time(), for HTTP dates.
+    :return: seconds to wait, None when the header is missing or unreadable.
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, retry_at.timestamp() - (time.time() if now is None else now))
+
+
+class _DomainState:
+    def __init__(self, settings: dict, max_concurrency: int):
+        self.settings = settings
+        self.max_rate = float(settings['requests_per_second'])
+        self.rate = self.max_rate
+        self.burst = max(1.0, float(settings['burst']))
+        self.tokens = self.burst
+        self.refilled_at = time.monotonic()
+        self.min_concurrency = max(1, int(settings['min_concurrency']))
+        self.max_concurrency = max(self.min_concurrency, int(max_concurrency))
+        self.limit = float(min(self.max_concurrency, max(self.min_concurrency, settings['initial_concurrency'])))
+        self.in_flight = 0
+        self.waiting = {}
+        self.resume_at = 0.0
+        self.latency = None
+        self.best_latency = None
+        self.stats = {'requests': 0, 'throttled': 0, 'slow': 0, 'errors': 0, 'waited_seconds': 0.0}
+
+    def refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+
+    def blocked_by_priority(self, priority: int) -> bool:
+        return any(count > 0 for other, count in self.waiting.items() if other < priority)
+
+    def seconds_until_ready(self, now: float):
+        """Seconds until a token or the end of a Retry-After, None when only a release can unblock."""
+        if self.in_flight >= int(self.limit):
+            return None
+        if now < self.resume_at:
+            return self.resume_at - now
+        if self.tokens < 1:
+            return (1 - self.tokens) / self.rate
+        return 0.0
+
+
+class RateLimiter:
+    """
+    Politeness scheduler shared by every request of an extractor, with one state per source (or per domain for
+    urls of unknown sources).
+
+    - A token bucket (``requests_per_second``, ``burst``) spaces the requests of a source.
+    - An adaptive concurrency limit between ``min_concurrency`` and the ``max_concurrency`` of the source (AIMD):
+      every answer in time adds ``1 / limit``, so one more request in flight per round of successes. A 429 or 503
+      halves the limit and the rate. Answers slower than ``latency_factor`` times the best latency seen (and
+      ``latency_floor``) remove ``1 / limit``. The rate climbs back to ``requests_per_second`` the same way.
+    - ``Retry-After`` (seconds or date, at most ``max_retry_after``) stops every request of the source until then.
+    - Search pages go before article pages and article pages before images when they wait for the same source.
+
+    Settings come from the ``rate_limit`` entry of each source in ``NewsDataExtractor._get_sources()``, missing
+    keys fall back to ``DEFAULT_RATE_LIMIT``. When ``shares`` processes request the same sources at the same time
+    (shards of step 1 split by url), each one gets ``1 / shares`` of the rate, burst and concurrency of a source.
+    """
+
+    def __init__(self, sources_config: dict = None, shares: int = 1):
+        self.sources_config = sources_config or {}
+        self.shares = max(1, int(shares))
+        self._domains = {}
+        self._condition = threading.Condition()
+
+    @classmethod
+    def from_sources(cls, sources_config: dict, shares: int = 1):
+        return cls(sources_config=sources_config, shares=shares)
+
+    def settings_for(self, key: str) -> dict:
+        """
+        Function responsible for merging the rate limit settings of a source with the defaults.
+
+        :param key: source name, or domain of an unknown source.
+        :return:
+        """
+        settings = dict(DEFAULT_RATE_LIMIT)
+        settings.update(self.sources_config.get(key, {}).get('rate_limit', {}))
+        if self.shares > 1:
+            settings['requests_per_second'] = float(settings['requests_per_second']) / self.shares
+            settings['burst'] = max(1, int(settings['burst']) // self.shares)
+        return settings
+
+    def _domain(self, key: str) -> _DomainState:
+        domain = self._domains.get(key)
+        if domain is None:
+            max_concurrency = max(1, int(self.sources_config.get(key, {}).get('max_concurrency', 4)) // self.shares)
+            domain = _DomainState(self.settings_for(key), max_concurrency)
+            self._domains[key] = domain
+        return domain
+
+    def acquire(self, key: str, resource_type: str = None) -> float:
+        """
+        Function responsible for waiting until a request to the source is allowed, and counting it in flight.
+        Every ``acquire`` must be followed by one ``release``.
+
+        :param key: source name, or domain of an unknown source.
+        :param resource_type: 'search', 'article' or 'image', gives the priority of the request.
+        :return: seconds waited.
+        """
+        priority = PRIORITIES.get(resource_type, 1)
+        started_at = time.monotonic()
+        with self._condition:
+            domain = self._domain(key)
+            domain.waiting[priority] = domain.waiting.get(priority, 0) + 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    domain.refill(now)
+                    wait_seconds = domain.seconds_until_ready(now)
+                    if wait_seconds == 0.0 and not domain.blocked_by_priority(priority):
+                        domain.tokens -= 1
+                        domain.in_flight += 1
+                        break
+                    self._condition.wait(timeout=wait_seconds if wait_seconds else None)
+            finally:
+                domain.waiting[priority] -= 1
+            waited = time.monotonic() - started_at
+            domain.stats['requests'] += 1
+            domain.stats['waited_seconds'] += waited
+            # A request of higher priority just left the queue, the others may go.
+            self._condition.notify_all()
+        return waited
+
+    def release(self, key: str, status_code=None, elapsed: float = 0.0, retry_after=None):
+        """
+        Function responsible for ending a request and adapting the pace of the source to its answer.
+
+        :param key:
+        :param status_code: None when no answer was received.
+        :param elapsed: seconds taken by the request.
+        :param retry_after: value of the Retry-After header.
+        :return:
+        """
+        with self._condition:
+            domain = self._domain(key)
+            domain.in_flight -= 1
+            if status_code in THROTTLE_STATUS_CODES:
+                domain.stats['throttled'] += 1
+                domain.limit = max(domain.min_concurrency, domain.limit / 2)
+                domain.rate = max(domain.max_rate / 16, domain.rate / 2)
+                delay = parse_retry_after(retry_after)
+                if delay is not None:
+                    delay = min(delay, float(domain.settings['max_retry_after']))
+                    domain.resume_at = max(domain.resume_at, time.monotonic() + delay)
+                logging.warning(f"[RateLimiter] {key} answered {status_code}, concurrency {domain.limit:.1f}, "
+                                f"{domain.rate:.2f} req/s, retry after {delay}")
+            elif status_code is None:
+                domain.stats['errors'] += 1
+                domain.limit = max(domain.min_concurrency, domain.limit - 1 / domain.limit)
+            else:
+                domain.latency = elapsed if domain.latency is None else 0.8 * domain.latency + 0.2 * elapsed
+                domain.best_latency = (domain.latency if domain.best_latency is None
+                                       else min(domain.best_latency, domain.latency))
+                slow_latency = max(float(domain.settings['latency_floor']),
+                                   float(domain.settings['latency_factor']) * domain.best_latency)
+                if domain.latency > slow_latency:
+                    domain.stats['slow'] += 1
+                    domain.limit = max(domain.min_concurrency, domain.limit - 1 / domain.limit)
+                else:
+                    domain.limit = min(domain.max_concurrency, domain.limit + 1 / domain.limit)
+                    domain.rate = min(domain.max_rate, domain.rate + domain.max_rate / 10)
+            self._condition.notify_all()
+
+    def stats(self) -> dict:
+        """
+        Requests, throttled answers, slow answers and time waited per source, with the current pace.
+
+        :return:
+        """
+        with self._condition:
+            return {key: {**domain.stats, 'waited_seconds': round(domain.stats['waited_seconds'], 2),
+                          'concurrency': round(domain.limit, 2), 'requests_per_second': round(domain.rate, 2)}
+                    for key, domain in self._domains.items()}
+
+    def log_summary(self):
+        for key, domain_stats in self.stats().items():
+            logging.info(f"[RateLimiter] {key} | {domain_stats}")
@@ -0,0 +1,180 @@
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import click
+
+from news_data_extractor.source.article_store import canonical_url
+
+SHARD_BY = ('url', 'source')
+
+ROOT_FOLDER = Path(__file__).resolve().parent.parent.parent
+
+
+def shard_listing(listing: dict, shards: int, shard_by: str = 'source') -> list:
+    """
+    Function responsible for splitting the listed urls of step 1 into shards downloaded and parsed by separate
+    workers. ``'source'`` keeps every source on one shard and puts the sources with the most urls on the emptiest
+    shards, so a website is only requested by one worker at its configured rate. ``'url'`` spreads the urls by the
+    sha256 of their canonical url, every shard then requests every website at ``1 / shards`` of its rate.
+
+    :param listing: dict source -> urls, in listing order.
+    :param shards: number of shards wanted, empty shards are dropped.
+    :param shard_by: 'url' or 'source'.
+    :return: one list of [source, url, position] per shard, position is the place of the url in the listing.
+    """
+    if shard_by not in SHARD_BY:
+        raise ValueError(f"shard_by must be one of {SHARD_BY}, not {shard_by}")
+    entries = []
+    for source, urls in listing.items():
+        for url in urls:
+            entries.append([source, url, len(entries)])
+    buckets = [[] for _ in range(max(1, int(shards)))]
+    if shard_by == 'url':
+        for entry in entries:
+            digest = hashlib.sha256(canonical_url(entry[1]).encode('utf-8')).digest()
+            buckets[int.from_bytes(digest[:8], 'big') % len(buckets)].append(entry)
+    else:
+        source_entries = {}
+        for entry in entries:
+            source_entries.setdefault(entry[0], []).append(entry)
+        for entries_of_source in sorted(source_entries.values(), key=len, reverse=True):
+            min(buckets, key=len).extend(entries_of_source)
+    buckets = [bucket for bucket in buckets if len(bucket) != 0]
+    # A run without any listed url still has one shard, so its step 2 runs.
+    return buckets if len(buckets) != 0 else [[]]
+
+
+def shard_sources(entries: list) -> dict:
+    """
+    Function responsible for turning the entries of a shard back into a listing.
+
+    :param entries: [source, url, position] of ``shard_listing``.
+    :return: dict source -> urls.
+    """
+    listing = {}
+    for source, url, _ in entries:
+        listing.setdefault(source, []).append(url)
+    return listing
+
+
+def merge_shard_rows(shards: list) -> list:
+    """
+    Function responsible for combining the rows of every shard of a run, each article once and in the order of
+    the listing, so the result is the one a single worker gives.
+
+    :param shards: (entries, rows) of every shard, entries as given by ``shard_listing``.
+    :return: merged rows.
+    """
+    positions = {canonical_url(url): position for entries, _ in shards for _, url, position in entries}
+    merged = {}
+    duplicates = 0
+    for _, rows in shards:
+        for row in rows:
+            key = canonical_url(row['url'])
+            if key in merged:
+                duplicates += 1
+            else:
+                merged[key] = row
+    if duplicates != 0:
+        logging.info(f"[Shards] Dropped {duplicates} rows found by several shards.")
+    return sorted(merged.values(), key=lambda row: positions.get(canonical_url(row['url']), len(positions)))
+
+
+def read_work_items(path) -> list:
+    """
+    Function responsible for reading a work items file of the file adapter, with the paths of their files
+    made absolute so the items can be given to another step.
+
+    :param path:
+    :return:
+    """
+    path = Path(path)
+    items = json.loads(path.read_text(encoding='utf-8'))
+    for item in items:
+        item['files'] = {name: str((path.parent / file_path).resolve())
+                         for name, file_path in (item.get('files') or {}).items()}
+    return items
+
+
+def write_work_items(path, items: list):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(items, indent=2), encoding='utf-8')
+
+
+def start_task(task: str, folder: Path, items: list):
+    """
+    Function responsible for running one task of tasks.py in a new process, with the file work item adapter.
+
+    :param task: step_1, step_1_shard, step_1_merge or step_2.
+    :param folder: where the input and output work items and the robot logs are written.
+    :param items: input work items.
+    :return: (process, path of the output work items).
+    """
+    write_work_items(folder / 'input.json', items)
+    environment = dict(os.environ, RC_WORKITEM_ADAPTER='FileAdapter',
+                       RC_WORKITEM_INPUT_PATH=str(folder / 'input.json'),
+                       RC_WORKITEM_OUTPUT_PATH=str(folder / 'output.json'))
+    process = subprocess.Popen([sys.executable, '-m', 'robocorp.tasks', 'run', 'tasks.py', '-t', task,
+                                '-o', str(folder / 'logs')], cwd=str(ROOT_FOLDER), env=environment)
+    return process, folder / 'output.json'
+
+
+def run_tasks(task: str, folder: Path, item_groups: list) -> list:
+    """
+    Function responsible for running a task once per group of items, every run in its own process at the same
+    time, like workers of a Control Room step.
+
+    :param task:
+    :param folder:
+    :param item_groups: input work items of every process.
+    :return: output work items of every process, in order.
+    """
+    started_at = time.perf_counter()
+    runs = [start_task(task, folder / f"{task}_{number}", items) for number, items in enumerate(item_groups)]
+    outputs = []
+    for process, output_path in runs:
+        if process.wait() != 0:
+            raise click.ClickException(f"{task} failed, see {output_path.parent / 'logs'}")
+        outputs.extend(read_work_items(output_path) if output_path.exists() else [])
+    click.echo(f"{task}: {len(runs)} processes, {len(outputs)} output items, "
+               f"{time.perf_counter() - started_at:.1f}s")
+    return outputs
+
+
+@click.group()
+def cli():
+    """Local runs of the sharded step 1."""
+
+
+@cli.command('run-local')
+@click.option('--payload', type=click.Path(exists=True, dir_okay=False),
+              default=str(ROOT_FOLDER / 'devdata' / 'env.json'), help='JSON input of step_1.')
+@click.option('--shards', default=4, show_default=True)
+@click.option('--shard-by', type=click.Choice(SHARD_BY), default='source', show_default=True)
+@click.option('--workers', default=2, show_default=True, help='Processes running step_1_shard at the same time.')
+@click.option('--folder', type=click.Path(file_okay=False), default=str(ROOT_FOLDER / 'output' / 'local_run'),
+              show_default=True, help='Work items and robot logs of every task.')
+def run_local(payload, shards, shard_by, workers, folder):
+    """
+    Run step_1, step_1_shard in several processes, step_1_merge and step_2 with the file work item adapter,
+    passing the output items of every task to the next one.
+    """
+    folder = Path(folder).resolve()
+    user_input = json.loads(Path(payload).read_text(encoding='utf-8'))
+    user_input.update({'shards': shards, 'shard_by': shard_by})
+    shard_items = run_tasks('step_1', folder, [[{'payload': user_input, 'files': {}}]])
+    worker_items = [shard_items[worker::workers] for worker in range(workers) if len(shard_items[worker::workers]) != 0]
+    shard_results = run_tasks('step_1_shard', folder, worker_items)
+    merged_items = run_tasks('step_1_merge', folder, [shard_results])
+    run_tasks('step_2', folder, [merged_items])
+
+
+if __name__ == '__main__':
+    cli()
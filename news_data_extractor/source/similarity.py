@@ -0,0 +1,83 @@
+import numpy as np
+
+
+def build_embedding_matrix(embeddings) -> np.ndarray:
+    """
+    Function responsible for stacking embeddings into one contiguous, L2 normalized float32 matrix.
+
+    Rows with a zero vector stay at zero and are reported as NaN by ``score_queries``, the same result
+    ``NewsDataExtractor.nlp_cosine_similarity`` gives for them.
+
+    :param embeddings: list of 1-D vectors or a 2-D array.
+    :return: array of shape (n_embeddings, dimension).
+    """
+    if len(embeddings) == 0:
+        return np.zeros((0, 0), dtype=np.float32)
+    matrix = np.array(np.vstack(embeddings), dtype=np.float32, order='C')
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+
+def score_queries(matrix: np.ndarray, query_matrix: np.ndarray) -> np.ndarray:
+    """
+    Function responsible for computing the cosine similarity of every row against every query.
+
+    Both matrices must come from ``build_embedding_matrix``, so scoring is a single matrix product.
+
+    :param matrix: normalized embeddings, shape (n, d).
+    :param query_matrix: normalized query embeddings, shape (q, d).
+    :return: array of shape (n, q).
+    """
+    scores = matrix @ query_matrix.T
+    zero_rows = ~matrix.any(axis=1)
+    zero_queries = ~query_matrix.any(axis=1)
+    if zero_rows.any() or zero_queries.any():
+        scores[zero_rows, :] = np.nan
+        scores[:, zero_queries] = np.nan
+    return scores
+
+
+def combine_query_scores(scores: np.ndarray) -> np.ndarray:
+    """
+    Function responsible for reducing (n, q) scores to one score per row, the best query wins.
+
+    :param scores:
+    :return:
+    """
+    if scores.ndim == 1:
+        return scores
+    return np.fmax.reduce(scores, axis=1)
+
+
+def closest_mask(scores: np.ndarray, max_percentage: float = 0.1) -> np.ndarray:
+    """
+    Function responsible for selecting the rows within ``max_percentage`` of the best score.
+
+    :param scores: one score per row, NaN is never selected.
+    :param max_percentage:
+    :return: boolean mask.
+    """
+    if scores.size == 0 or np.isnan(scores).all():
+        return np.zeros(scores.shape, dtype=bool)
+    cutoff = np.nanmax(scores) * (1 - max_percentage)
+    with np.errstate(invalid='ignore'):
+        return scores >= cutoff
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Function responsible for returning the indices of the ``k`` best scores, best first.
+
+    Uses ``argpartition`` so only the selected rows are sorted.
+
+    :param scores:
+    :param k:
+    :return:
+    """
+    scores = np.where(np.isnan(scores), -np.inf, scores)
+    k = min(int(k), scores.shape[0])
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
@@ -0,0 +1,147 @@
+import logging
+import re
+
+import numpy as np
+import pandas as pd
+from bs4 import BeautifulSoup
+
+TEXT_COLUMNS = ('title', 'description', 'full_text', 'authors')
+
+# Only values with a tag or an entity need the html parser.
+MARKUP = re.compile(r'[<&]')
+WHITESPACE = re.compile(r'\s+')
+
+MONETARY_PATTERN = re.compile('|'.join([
+    r'\$\d+',  # Matches dollar amounts like $100
+    r'€\d+',  # Matches euro amounts like €100
+    r'£\d+',  # Matches pound amounts like £100
+    r'\d+\s?(?:dollars|USD|euros|pounds)',  # Matches written forms like "100 dollars"
+    r'\d+\s?(?:cents|pennies)',  # Matches small units like "50 cents"
+    r'\d+\s?₹',  # Matches rupee amounts like ₹100
+    r'¥\d+',  # Matches yen amounts like ¥100
+    r'\d+\s?(?:yen|RMB|yuan)',  # Matches written forms like "100 yen"
+]), re.IGNORECASE)
+
+# Same amounts as MONETARY_PATTERN, with the number, its scale and the currency captured.
+AMOUNT_PATTERN = re.compile(
+    r'(?P<symbol>[$€£¥])(?P<symbol_amount>\d[\d,]*(?:\.\d+)?)(?:\s?(?P<scale>million|billion|thousand|bn|m|k)\b)?'
+    r'|(?P<word_amount>\d[\d,]*(?:\.\d+)?)\s?(?P<word_scale>million |billion |thousand )?'
+    r'(?P<word>dollars|USD|euros|pounds|cents|pennies|₹|yen|RMB|yuan)',
+    re.IGNORECASE)
+
+CURRENCIES = {'$': 'USD', 'dollars': 'USD', 'usd': 'USD', 'cents': 'USD', '€': 'EUR', 'euros': 'EUR',
+              '£': 'GBP', 'pounds': 'GBP', 'pennies': 'GBP', '¥': 'JPY', 'yen': 'JPY', '₹': 'INR',
+              'rmb': 'CNY', 'yuan': 'CNY'}
+SCALES = {'thousand': 1e3, 'k': 1e3, 'million': 1e6, 'm': 1e6, 'billion': 1e9, 'bn': 1e9}
+SUBUNITS = {'cents', 'pennies'}
+
+
+def _strip_tags(text):
+    return BeautifulSoup(text, "html.parser").get_text()
+
+
+def clean_text_column(values) -> pd.Series:
+    """
+    Function responsible for removing HTML tags and extra spaces from a whole column.
+
+    Only the values containing ``<`` or ``&`` are parsed with BeautifulSoup, whitespace is collapsed with
+    one regex pass over the column. Values that are not strings are kept as they are.
+
+    :param values:
+    :return:
+    """
+    column = pd.Series(values, dtype=object)
+    is_text = column.map(type) == str
+    texts = column[is_text]
+    if len(texts) == 0:
+        return column
+    has_markup = texts.str.contains(MARKUP)
+    texts = texts.where(~has_markup, texts[has_markup].map(_strip_tags))
+    column[is_text] = texts.str.replace(WHITESPACE, ' ', regex=True).str.strip()
+    return column
+
+
+def _amount(match: pd.Series):
+    if isinstance(match['symbol'], str):
+        number, scale, currency = match['symbol_amount'], match['scale'], match['symbol']
+    else:
+        number, scale, currency = match['word_amount'], match['word_scale'], match['word']
+    amount = float(number.replace(',', ''))
+    if isinstance(scale, str):
+        amount *= SCALES[scale.strip().lower()]
+    currency = currency.lower()
+    if currency in SUBUNITS:
+        amount /= 100
+    return amount, CURRENCIES[currency]
+
+
+def monetary_columns(titles, descriptions) -> pd.DataFrame:
+    """
+    Function responsible for finding monetary values in the title or, when it has none, the description.
+
+    :param titles: cleaned titles.
+    :param descriptions: cleaned descriptions.
+    :return: DataFrame with ``contains_monetary``, ``monetary_amount`` (float) and ``monetary_currency``
+        (ISO code) columns.
+    """
+    titles = pd.Series(titles, dtype=object)
+    descriptions = pd.Series(descriptions, dtype=object)
+    in_title = titles.str.contains(MONETARY_PATTERN, na=False).astype(bool)
+    in_description = descriptions.str.contains(MONETARY_PATTERN, na=False).astype(bool)
+    result = pd.DataFrame({'contains_monetary': in_title | in_description,
+                           'monetary_amount': np.nan, 'monetary_currency': None}, index=titles.index)
+    result['monetary_currency'] = result['monetary_currency'].astype(object)
+
+    monetary_texts = titles.where(in_title, descriptions)[result['contains_monetary']]
+    if len(monetary_texts) != 0:
+        matches = monetary_texts.str.extract(AMOUNT_PATTERN).dropna(how='all')
+        for position, match in matches.iterrows():
+            result.at[position, 'monetary_amount'], result.at[position, 'monetary_currency'] = _amount(match)
+    return result
+
+
+def _normalize_columns(rows: list, date_parser) -> list:
+    # Every column is normalized at once, the dates with the format learned for each source.
+    dates = date_parser.parse_column([row.get('date') for row in rows], [row.get('source') for row in rows])
+    texts = {column: clean_text_column([row.get(column) for row in rows]) for column in TEXT_COLUMNS}
+    monetary = monetary_columns(texts['title'], texts['description'])
+    formatted_rows = []
+    for position, (row, formatted_date) in enumerate(zip(rows, dates)):
+        # Copies, the raw rows stay untouched when a column fails and the rows are normalized one by one.
+        row = dict(row, date=formatted_date)
+        for column in TEXT_COLUMNS:
+            row[column] = texts[column].iat[position]
+        row['contains_monetary'] = bool(monetary['contains_monetary'].iat[position])
+        # Filled by download_images, a separate concurrent stage.
+        row['picture_path'] = None
+        amount = monetary['monetary_amount'].iat[position]
+        row['monetary_amount'] = None if pd.isna(amount) else float(amount)
+        row['monetary_currency'] = monetary['monetary_currency'].iat[position]
+        formatted_rows.append(row)
+    return formatted_rows
+
+
+def normalize_raw_rows(rows: list, date_parser) -> tuple:
+    """
+    Function responsible to normalize every column of raw rows: dates, texts and monetary info.
+    Rows without title are dropped. When a value breaks the column-wise pass, the rows are normalized one by one
+    and the rows that fail are reported instead of stopping the batch.
+
+    :param rows: raw rows of ``parse_each_news``.
+    :param date_parser: DateParser keeping the formats learned for each source.
+    :return: (normalized rows, list of errors with the url of the row and the message)
+    """
+    rows = [row for row in rows if row.get('title') is not None]
+    try:
+        return _normalize_columns(rows, date_parser), []
+    except Exception as error:
+        logging.warning(f"[Normalize] {len(rows)} rows normalized one by one | {type(error).__name__}: {error}")
+    formatted_rows = []
+    errors = []
+    for row in rows:
+        try:
+            formatted_rows.extend(_normalize_columns([row], date_parser))
+        except Exception as error:
+            # Logged by the caller, which also gets the errors of the worker processes.
+            errors.append({'stage': 'normalize', 'url': row.get('url'), 'error': f"{type(error).__name__}: {error}"})
+    return formatted_rows, errors
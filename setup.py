@@ -14,7 +14,6 @@ REQUIRED_PKGS = [
     'pyarrow',
     'requests',
     'spacy',
-    'sentence-transformers',
     'openpyxl',
 ]
 EXTRAS_REQUIRE = {
@@ -1,10 +1,16 @@
 
 import json
+import uuid
+from pathlib import Path
 from robocorp import workitems
 from robocorp.tasks import task
 from robocorp.tasks import task
 from robocorp import workitems
 import news_data_extractor.source.main as rpa_main_file
+from news_data_extractor.source.artifacts import is_artifact_reference, read_rows_artifact, write_rows_artifact
+from news_data_extractor.source.exporters import export_rows
+from news_data_extractor.source.profiling import profiling_options
+from news_data_extractor.source.sharding import merge_shard_rows
 
 
 @task
@@ -18,13 +24,86 @@ def step_1():
     except:
         user_input = {"text_phrase": "Olympic Paris", "news_category": "Sports", "max_months": 2}
 
-    updated_parameters = rpa_main_file.initialize_step_1(user_input=user_input)
-    processed_raw_data = {"result_step_1": updated_parameters, "user_inputs": user_input}
+    # Profiling switches come from the payload or the NEWS_PROFILE environment variable.
+    profile = profiling_options(user_input)
+    if profile is not None:
+        user_input['profile'] = profile
+    if user_input.get('shards') is not None:
+        # Search only, the news are split in one output work item per shard for the workers of step_1_shard.
+        shards = rpa_main_file.initialize_step_1_plan(user_input=user_input)
+        plan_id = uuid.uuid4().hex
+        for number, entries in enumerate(shards):
+            workitems.outputs.create({"s1_shard": {"plan_id": plan_id, "shard": number, "shards": len(shards),
+                                                   "entries": entries, "user_inputs": user_input}})
+        return
+    # The rows go to a Parquet file attached to the work item, the payload only carries its reference.
+    artifact = rpa_main_file.initialize_step_1(user_input=user_input, artifact_path='output/step_1_rows.parquet')
+    processed_raw_data = {"result_step_1": artifact, "user_inputs": user_input}
     json_object = json.dumps(processed_raw_data)
     with open('output/step_1_content.json', 'w', encoding='utf-8') as outfile:
         outfile.write(json_object)
     output_json = {"s1_results": processed_raw_data}
-    workitems.outputs.create(output_json)
+    workitems.outputs.create(output_json, files=[artifact['path']])
+
+
+def _forward_item(item):
+    """Passes an input work item and its files unchanged to the next step, for runs without shards."""
+    folder = Path('output') / 'step_1_items' / str(item.id)
+    folder.mkdir(parents=True, exist_ok=True)
+    files = [item.get_file(name, path=folder / name) for name in item.files]
+    workitems.outputs.create(item.payload, files=files)
+
+
+@task
+def step_1_shard():
+    # Every worker of the step takes shards until the queue is empty, several workers download in parallel.
+    for item in workitems.inputs:
+        shard = item.payload.get('s1_shard') if isinstance(item.payload, dict) else None
+        if shard is None:
+            _forward_item(item)
+            continue
+        user_input = dict(shard['user_inputs'], shard=shard['shard'], shards=shard['shards'])
+        collected_data = rpa_main_file.initialize_step_1_shard(user_input=user_input, entries=shard['entries'])
+        artifact = write_rows_artifact(collected_data,
+                                       f"output/step_1_rows_{shard['plan_id']}_{shard['shard']}.parquet")
+        shard_results = {key: shard[key] for key in ('plan_id', 'shard', 'shards', 'entries', 'user_inputs')}
+        shard_results['result_step_1'] = artifact
+        shard_results['article_store'] = user_input.get('shard_article_store')
+        workitems.outputs.create({"s1_shard_results": shard_results}, files=[artifact['path']])
+
+
+@task
+def step_1_merge():
+    # The shards of a run are merged by the item completing them: one worker has to run this step.
+    pending_plans = {}
+    merged_plans = set()
+    for item in workitems.inputs:
+        shard = item.payload.get('s1_shard_results') if isinstance(item.payload, dict) else None
+        if shard is None:
+            _forward_item(item)
+            continue
+        if shard['plan_id'] in merged_plans or shard['shard'] in pending_plans.get(shard['plan_id'], {}):
+            print(f"Shard {shard['shard']} of {shard['plan_id']} received twice, skipped.")
+            continue
+        plan = pending_plans.setdefault(shard['plan_id'], {})
+        artifact = shard['result_step_1']
+        artifact_path = Path('output') / 'step_1_items' / shard['plan_id'] / artifact['file_name']
+        artifact_path.parent.mkdir(parents=True, exist_ok=True)
+        artifact['path'] = str(item.get_file(artifact['file_name'], path=artifact_path))
+        plan[shard['shard']] = (shard['entries'], artifact, shard.get('article_store'))
+        if len(plan) < shard['shards']:
+            continue
+        collected_data = merge_shard_rows([(entries, read_rows_artifact(artifact))
+                                           for entries, artifact, _ in (plan[number] for number in sorted(plan))])
+        rpa_main_file.merge_shard_article_stores(shard['user_inputs'],
+                                                 [plan[number][2] for number in sorted(plan)])
+        merged_artifact = write_rows_artifact(collected_data, f"output/step_1_rows_{shard['plan_id']}.parquet")
+        processed_raw_data = {"result_step_1": merged_artifact, "user_inputs": shard['user_inputs']}
+        workitems.outputs.create({"s1_results": processed_raw_data}, files=[merged_artifact['path']])
+        del pending_plans[shard['plan_id']]
+        merged_plans.add(shard['plan_id'])
+    for plan_id, plan in pending_plans.items():
+        print(f"Run {plan_id} is missing shards, received {sorted(plan)}.")
 
 
 @task
@@ -32,14 +111,22 @@ def step_2():
     loaded_content = workitems.inputs.current.payload['s1_results']
     step_1_results = loaded_content['result_step_1']
     step_1_inputs = loaded_content['user_inputs']
+    # Step 2 keeps the switches of step 1, its own payload or environment can turn profiling on.
+    profile = profiling_options(workitems.inputs.current.payload)
+    if profile is not None:
+        step_1_inputs['profile'] = profile
+    if is_artifact_reference(step_1_results):
+        artifact_path = Path('output') / 'step_2_inputs' / step_1_results['file_name']
+        artifact_path.parent.mkdir(parents=True, exist_ok=True)
+        step_1_results['path'] = str(workitems.inputs.current.get_file(step_1_results['file_name'],
+                                                                       path=artifact_path))
     df_created, processed_raw_data = rpa_main_file.initialize_step_2(user_input=step_1_inputs,
                                                  extracted_data=step_1_results)
     print(df_created)
     if df_created is not None and not df_created.empty:
         print(df_created)
-        json_object = json.dumps({"results":str(processed_raw_data)})
-        with open('output/results.json', 'w', encoding='utf-8') as outfile:
-            outfile.write(json_object)
+        # Every normalized row as {"results": [row, ...]}, written row by row without the embeddings.
+        export_rows(processed_raw_data, 'output', 'results', ['json'])
 
 
 
@@ -54,7 +141,12 @@ def step_1_2():
     except:
         user_input = {"text_phrase": "Olympic Paris", "news_category": "Sports", "max_months": 2}
 
-    updated_parameters = rpa_main_file.initialize_step_1(user_input=user_input)
+    profile = profiling_options(user_input)
+    if profile is not None:
+        user_input['profile'] = profile
+    # A streamed step 1 writes its rows to the artifact as they are parsed instead of keeping them for step 2.
+    artifact_path = 'output/step_1_rows.parquet' if user_input.get('streaming', False) else None
+    updated_parameters = rpa_main_file.initialize_step_1(user_input=user_input, artifact_path=artifact_path)
 
     step_1_results = updated_parameters
     step_1_inputs = user_input
@@ -63,6 +155,5 @@ def step_1_2():
     print(df_created)
     if df_created is not None and not df_created.empty:
         print(df_created)
-        json_object = json.dumps({"results":str(processed_raw_data)})
-        with open('output/results.json', 'w', encoding='utf-8') as outfile:
-            outfile.write(json_object)
+        # Every normalized row as {"results": [row, ...]}, written row by row without the embeddings.
+        export_rows(processed_raw_data, 'output', 'results', ['json'])